@@ -0,0 +1,33 @@
+"""Общее для тестов middleware наблюдения (профилирование, метрики,
+журнал медленных запросов)"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from catalog.models import Cheese, CheeseType
+
+User = get_user_model()
+
+
+def middleware_first(path):
+    """MIDDLEWARE проекта с path в начале списка"""
+    return [path, *settings.MIDDLEWARE]
+
+
+class CatalogTestCase(TestCase):
+    """Менеджер и CHEESES сыров одного типа; поля сыра - cheese_data()"""
+
+    CHEESES = 3
+
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        self.cheese_type = CheeseType.objects.create(name="Мягкий")
+        self.cheeses = [Cheese.objects.create(**self.cheese_data(index))
+                        for index in range(self.CHEESES)]
+
+    def cheese_data(self, index):
+        return {"name": f"Сыр {index}", "price": 100, "weight": 1,
+                "cheese_type": self.cheese_type,
+                "production_date": "2024-01-01"}
@@ -0,0 +1,312 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import (Batch, BatchItem, Cheese, CheeseType, PriceList,
+                            PriceTier)
+
+User = get_user_model()
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username="admin", password="pass",
+                                 role="admin")
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        User.objects.create_user(username="other", password="pass",
+                                 role="sales_manager")
+        self.cheese_type = CheeseType.objects.create(name="Мягкий")
+        self.cheeses = [
+            Cheese.objects.create(
+                sku=f"S-{index}",
+                name=f"Сыр {index:02d}",
+                price=100 + index,
+                price_small_opt=70,
+                min_qty_small_opt=5,
+                weight=1,
+                cheese_type=self.cheese_type,
+                in_stock=index % 2 == 0,
+                production_date="2024-01-01",
+            )
+            for index in range(12)
+        ]
+
+    def _send(self, method, url, data=None):
+        return getattr(self.client, method)(
+            url, json.dumps(data), content_type="application/json")
+
+
+class TestCheeseApi(ApiTestCase):
+    def test_list_pages_by_cursor_with_sparse_fields(self):
+        url = reverse("api_cheeses")
+        # версия каталога для ключа кэша и одна страница .values()
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                url, {"fields": "sku,price", "limit": 5})
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = response.json()
+        self.assertEqual(data["results"][0], {"sku": "S-0",
+                                              "price": "100.00"})
+        self.assertIsNone(data["previous"])
+
+        seen = [row["sku"] for row in data["results"]]
+        while data["next"]:
+            data = self.client.get(url, {"fields": "sku", "limit": 5,
+                                         "cursor": data["next"]}).json()
+            seen += [row["sku"] for row in data["results"]]
+        self.assertEqual(seen, [f"S-{index}" for index in range(12)])
+
+    def test_list_filters_and_sorting(self):
+        data = self.client.get(reverse("api_cheeses"), {
+            "in_stock": "false", "order_by": "-price", "fields": "id"}
+        ).json()
+        self.assertEqual([row["id"] for row in data["results"]],
+                         [cheese.id for cheese in self.cheeses[::-2]])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse("api_cheeses"),
+                                   {"fields": "name,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.json()["error"])
+
+    def test_detail_and_missing(self):
+        cheese = self.cheeses[0]
+        data = self.client.get(
+            reverse("api_cheese_detail", args=[cheese.id])).json()
+        self.assertEqual(data["cheese_type_name"], "Мягкий")
+        self.assertEqual(data["production_date"], "2024-01-01")
+        response = self.client.get(
+            reverse("api_cheese_detail", args=[cheese.id + 1000]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_follow_roles(self):
+        url = reverse("api_cheese_detail", args=[self.cheeses[0].id])
+        self.assertEqual(self._send("patch", url, {"price": 1}).status_code,
+                         403)
+
+        self.client.login(username="manager", password="pass")
+        self.assertEqual(self._send("patch", url, {"price": 1}).status_code,
+                         403)
+
+        self.client.login(username="admin", password="pass")
+        response = self._send("patch", url, {"price": "123.45"})
+        self.assertEqual(response.json()["price"], "123.45")
+        response = self._send("patch", url, {"price": "дорого"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("price", response.json()["errors"])
+
+        response = self._send("post", reverse("api_cheeses"), {
+            "sku": "N-1", "name": "Новый", "price": 10, "weight": 1,
+            "cheese_type": self.cheese_type.id, "in_stock": True,
+            "production_date": "2024-05-01"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["sku"], "N-1")
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Cheese.objects.filter(id=self.cheeses[0].id)
+                         .exists())
+
+    def test_method_not_allowed(self):
+        response = self.client.delete(reverse("api_cheese_types"))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response["Allow"], "GET")
+
+
+class TestCheeseSuggestions(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("api_cheese_suggestions")
+        for name in ["Сливочный бри", "Бри де Мо", "Брынза"]:
+            Cheese.objects.create(name=name, price=200, weight=1,
+                                  cheese_type=self.cheese_type,
+                                  production_date="2024-01-01")
+
+    def _names(self, **params):
+        response = self.client.get(self.url, params)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_requires_login(self):
+        response = self.client.get(self.url, {"q": "сыр"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_in_stock_matches_with_prefix_first(self):
+        self.client.login(username="manager", password="pass")
+        self.assertEqual(self._names(q="бри"), ["Бри де Мо", "Сливочный бри"])
+        self.assertEqual(self._names(q="бр"), ["Бри де Мо", "Брынза"])
+        self.assertEqual(self._names(q="сыр", limit=3),
+                         ["Сыр 00", "Сыр 02", "Сыр 04"])
+        self.assertEqual(self._names(q=" "), [])
+        response = self.client.get(self.url, {"q": "сыр", "limit": 1000})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tiers_follow_batch_price_list(self):
+        self.client.login(username="manager", password="pass")
+        with self.assertNumQueries(4):  # сессия, пользователь, сыры, уровни
+            rows = self.client.get(self.url, {"q": "сыр 00"}).json()[
+                "results"]
+        self.assertEqual(rows, [{
+            "id": self.cheeses[0].id, "sku": "S-0", "name": "Сыр 00",
+            "price": "100.00", "tiers": [{"min_qty": 5, "price": "70.00"}],
+        }])
+
+        price_list = PriceList.objects.create(name="Опт")
+        PriceTier.objects.create(cheese=self.cheeses[0], min_qty=50,
+                                 price=60, price_list=price_list)
+        batch = Batch.objects.create(manager=self.manager,
+                                     price_list=price_list)
+        rows = self.client.get(self.url, {"q": "сыр 00",
+                                          "batch": batch.id}).json()[
+            "results"]
+        self.assertEqual(rows[0]["tiers"], [
+            {"min_qty": 5, "price": "70.00"},
+            {"min_qty": 50, "price": "60.00"}])
+
+        self.client.login(username="other", password="pass")
+        response = self.client.get(self.url, {"q": "сыр",
+                                              "batch": batch.id})
+        self.assertEqual(response.status_code, 403)
+
+
+class TestBatchApi(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.login(username="manager", password="pass")
+
+    def test_anonymous_gets_json_403(self):
+        self.client.logout()
+        response = self.client.get(reverse("api_batches"))
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("error", response.json())
+
+    def test_batch_lifecycle(self):
+        response = self.client.post(reverse("api_batches"))
+        self.assertEqual(response.status_code, 201)
+        batch_id = response.json()["id"]
+        items_url = reverse("api_batch_items", args=[batch_id])
+
+        data = self._send("post", items_url, {"items": [
+            {"sku": "S-0", "quantity": 3},
+            {"cheese_id": self.cheeses[1].id, "quantity": 1},
+            {"sku": "S-0", "quantity": 2},
+        ]}).json()
+        self.assertEqual(
+            [(item["sku"], item["quantity"], item["unit_price"])
+             for item in data["items"]],
+            [("S-0", 5, "70.00"), ("S-1", 1, "101.00")])
+        self.assertEqual(data["total_price"], "451.00")
+        self.assertEqual(data["total_base_price"], "601.00")
+
+        item_id = data["items"][1]["id"]
+        data = self._send("patch", reverse("api_batch_item_detail",
+                                           args=[item_id]),
+                          {"quantity": 5}).json()
+        self.assertEqual(data["items"][1]["total_price"], "350.00")
+
+        response = self.client.delete(reverse("api_batch_item_detail",
+                                              args=[item_id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(BatchItem.objects.filter(batch_id=batch_id)
+                         .count(), 1)
+
+    def test_invalid_items_save_nothing(self):
+        batch = Batch.objects.create(manager=self.manager)
+        response = self._send(
+            "post", reverse("api_batch_items", args=[batch.id]),
+            {"items": [{"sku": "S-0", "quantity": 1},
+                       {"sku": "S-404", "quantity": 1},
+                       {"sku": "S-1", "quantity": 0}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()["errors"]), ["1", "2"])
+        self.assertFalse(batch.items.exists())
+
+    def test_boolean_quantity_is_rejected(self):
+        batch = Batch.objects.create(manager=self.manager)
+        response = self._send(
+            "post", reverse("api_batch_items", args=[batch.id]),
+            {"items": [{"sku": "S-0", "quantity": True},
+                       {"cheese_id": True, "quantity": 1}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()["errors"]), ["0", "1"])
+
+        item = BatchItem.objects.create(batch=batch, cheese=self.cheeses[0],
+                                        quantity=5)
+        response = self._send("patch", reverse("api_batch_item_detail",
+                                               args=[item.id]),
+                              {"quantity": True})
+        self.assertEqual(response.status_code, 400)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 5)
+
+    def test_list_has_totals_and_constant_queries(self):
+        for _ in range(3):
+            batch = Batch.objects.create(manager=self.manager)
+            BatchItem.objects.create(batch=batch, cheese=self.cheeses[0],
+                                     quantity=5)
+        # сессия, пользователь, партии с суммами
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse("api_batches")).json()
+        self.assertEqual([row["discount_percent"]
+                          for row in data["results"]], ["30.00"] * 3)
+
+    def test_batch_with_price_list(self):
+        price_list = PriceList.objects.create(name="Ресторан")
+        PriceTier.objects.create(cheese=self.cheeses[0], min_qty=3,
+                                 price=65, price_list=price_list)
+        response = self._send("post", reverse("api_batches"),
+                              {"price_list_id": price_list.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["price_list_id"], price_list.id)
+
+        data = self._send("post", reverse("api_batch_items", args=[
+            response.json()["id"]]), {"items": [
+                {"sku": "S-0", "quantity": 3}]}).json()
+        self.assertEqual(data["items"][0]["unit_price"], "65.00")
+
+        response = self._send("post", reverse("api_batches"),
+                              {"price_list_id": price_list.id + 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reprice(self):
+        batch = Batch.objects.create(manager=self.manager)
+        BatchItem.objects.create(batch=batch, cheese=self.cheeses[0],
+                                 quantity=5)
+        self.cheeses[0].price_small_opt = 60
+        self.cheeses[0].save()
+        url = reverse("api_batch_detail", args=[batch.id])
+        self.assertEqual(self.client.get(url).json()["total_price"],
+                         "350.00")
+
+        data = self._send("post", reverse("api_batch_reprice",
+                                          args=[batch.id])).json()
+        self.assertEqual(data["total_price"], "300.00")
+        self.assertEqual((data["items"][0]["tier_min_qty"],
+                          data["items"][0]["unit_price"]),
+                         (5, "60.00"))
+
+    def test_foreign_batch_is_forbidden(self):
+        batch = Batch.objects.create(
+            manager=User.objects.get(username="other"))
+        response = self.client.get(reverse("api_batch_detail",
+                                           args=[batch.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+class TestCheeseApiCache(ApiTestCase):
+    def test_anonymous_list_is_cached_until_catalog_changes(self):
+        url = reverse("api_cheeses")
+        first = self.client.get(url, {"fields": "name"}).json()
+        # Только версия каталога: ответ из кэша
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {"fields": "name"})
+                             .json(), first)
+
+        self.cheeses[0].name = "Переименованный"
+        self.cheeses[0].save()
+        data = self.client.get(url, {"fields": "name"}).json()
+        self.assertIn({"name": "Переименованный"}, data["results"])
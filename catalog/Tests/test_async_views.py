@@ -0,0 +1,110 @@
+"""Асинхронные представления проходят те же тесты, что и синхронные.
+
+Модуль сам служит URLconf: в нём маршруты с catalog.async_views.
+"""
+
+from io import StringIO
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from catalog import async_views
+from catalog.Tests import (test_batches, test_cache, test_conditional,
+                           test_content, test_queries)
+from catalog.decorators import QueryBudgetExceeded, query_budget
+from catalog.models import Cheese, CheeseType
+from catalog.urls import catalog_urlpatterns
+
+urlpatterns = catalog_urlpatterns(async_views)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncBatchTests(test_batches.BatchTests):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncCatalogPageCacheTests(test_cache.TestCatalogPageCache):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncConditionalGetTests(test_conditional.TestConditionalGet):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncCheeseSortingTests(test_content.TestCheeseSorting):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncCheesePaginationTests(test_content.TestCheesePagination):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncQueryBudgetTests(test_queries.TestQueryBudgets):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        self.cheese = Cheese.objects.create(
+            name="Чеддер",
+            price=100,
+            weight=1,
+            cheese_type=cheese_type,
+            production_date="2024-01-01",
+        )
+
+    def test_read_pages_are_async(self):
+        for url in [reverse("cheese_list"),
+                    reverse("cheese_detail", args=[self.cheese.id]),
+                    reverse("batch_list"),
+                    reverse("batch_detail", args=[1])]:
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url).func))
+
+    async def test_async_client_renders_catalog(self):
+        response = await self.async_client.get(reverse("cheese_list"))
+        self.assertContains(response, "Чеддер")
+
+        response = await self.async_client.get(
+            reverse("cheese_detail", args=[self.cheese.id]))
+        self.assertContains(response, "Чеддер")
+
+    async def test_missing_cheese_returns_404(self):
+        response = await self.async_client.get(
+            reverse("cheese_detail", args=[self.cheese.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    async def test_async_query_budget_counts_orm_queries(self):
+        @query_budget(1)
+        async def view(request):
+            await CheeseType.objects.acount()
+            await Cheese.objects.acount()
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            await view(None)
+
+
+class TestLoadTest(LiveServerTestCase):
+    databases = {"default", settings.CATALOG_READ_DATABASE}
+
+    def test_reports_throughput_and_latency(self):
+        out = StringIO()
+        call_command("load_test", self.live_server_url, self.live_server_url,
+                     duration=0.3, concurrency=2, path=["/about/"],
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn("ошибок 0", output)
+        self.assertIn("p99", output)
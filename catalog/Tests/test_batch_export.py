@@ -0,0 +1,143 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.importexport import BATCH_FIELDS, batch_lines, openpyxl
+from catalog.models import Batch, BatchItem, Cheese, CheeseType
+
+User = get_user_model()
+
+
+class TestBatchExport(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin")
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        User.objects.create_user(
+            username="other", password="pass", role="sales_manager")
+        cheese_type = CheeseType.objects.create(name="Мягкий")
+        self.cheese = Cheese.objects.create(
+            sku="B-1",
+            name="Бринза",
+            price=100,
+            price_small_opt=70,
+            min_qty_small_opt=5,
+            price_big_opt=50,
+            min_qty_big_opt=10,
+            weight=100,
+            cheese_type=cheese_type,
+            in_stock=True,
+            production_date="2023-01-01",
+        )
+        self.january = self._batch(datetime(2024, 1, 15, 12), [3, 12])
+        self.february = self._batch(datetime(2024, 2, 1, 9), [6])
+
+    def _batch(self, created_at, quantities):
+        batch = Batch.objects.create(manager=self.manager)
+        Batch.objects.filter(id=batch.id).update(
+            created_at=timezone.make_aware(created_at))
+        for quantity in quantities:
+            BatchItem.objects.create(batch=batch, cheese=self.cheese,
+                                     quantity=quantity)
+        return batch
+
+    def test_sql_prices_match_batch_pricing(self):
+        items = {item.id: item for item in BatchItem.objects.all()}
+        for item in BatchItem.objects.with_prices():
+            expected = items[item.id]
+            self.assertEqual(item.line_base_total, expected.total_base_price)
+            self.assertEqual(item.line_total, expected.total_price)
+            self.assertEqual(item.line_discount_percent,
+                             expected.discount_percent)
+
+    def test_lines_are_filtered_by_date_range(self):
+        lines = list(batch_lines(start=date(2024, 1, 1),
+                                 end=date(2024, 1, 31)))
+        self.assertEqual([line[0] for line in lines],
+                         [self.january.id, self.january.id])
+        line = dict(zip(BATCH_FIELDS, lines[1]))
+        self.assertEqual(line["manager"], "manager")
+        self.assertEqual(line["sku"], "B-1")
+        self.assertEqual(line["quantity"], 12)
+        self.assertEqual(line["tier_min_qty"], 10)
+        self.assertEqual(line["unit_price"], Decimal("50.00"))
+        self.assertEqual(line["discount_percent"], Decimal("50.00"))
+        self.assertEqual(line["total_base_price"], Decimal("1200.00"))
+        self.assertEqual(line["total_price"], Decimal("600.00"))
+
+        # Конец периода включается целиком
+        lines = list(batch_lines(end=date(2024, 2, 1)))
+        self.assertEqual(len(lines), 3)
+
+    def test_export_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(batch_lines())), 3)
+
+    def test_admin_streams_csv(self):
+        self.client.login(username="admin", password="pass")
+        response = self.client.get(reverse("batch_export"),
+                                   {"start": "2024-02-01"})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(
+            b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], BATCH_FIELDS)
+        self.assertEqual(rows[1][0], str(self.february.id))
+        self.assertEqual(rows[1][1], "2024-02-01 09:00:00")
+        self.assertEqual(rows[1][7:], ["5", "100.00", "70.00",
+                                       "30.00", "600.00", "420.00"])
+        self.assertEqual(len(rows), 2)
+
+    def test_only_admin_exports_all_batches(self):
+        self.client.login(username="manager", password="pass")
+        response = self.client.get(reverse("batch_export"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_range_is_rejected(self):
+        self.client.login(username="admin", password="pass")
+        response = self.client.get(reverse("batch_export"),
+                                   {"start": "2024-02-01",
+                                    "end": "2024-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_manager_exports_only_own_batch(self):
+        url = reverse("batch_export_one", args=[self.january.id])
+        self.client.login(username="other", password="pass")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username="manager", password="pass")
+        content = b"".join(self.client.get(url).streaming_content)
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+    @skipUnless(openpyxl, "openpyxl не установлен")
+    def test_xlsx_export(self):
+        self.client.login(username="admin", password="pass")
+        response = self.client.get(reverse("batch_export"),
+                                   {"format": "xlsx"})
+        workbook = openpyxl.load_workbook(
+            io.BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(list(rows[0]), BATCH_FIELDS)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1], datetime(2024, 1, 15, 12))
+        self.assertEqual(rows[2][-1], 600)
+
+    def test_command_writes_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "batches.csv")
+            call_command("export_batches", path, start=date(2024, 1, 1),
+                         end=date(2024, 1, 31), stderr=StringIO())
+            with open(path, encoding="utf-8") as stream:
+                rows = list(csv.reader(stream))
+        self.assertEqual(len(rows), 3)
@@ -1,7 +1,14 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from catalog.models import Cheese, CheeseType, Batch, BatchItem
+from catalog.pricing import price_batch
 from decimal import Decimal
 
 User = get_user_model()
@@ -118,3 +125,385 @@ class BatchTests(TestCase):
         self.assertAlmostEqual(
             float(discount_percent), float(expected_discount), places=2
         )
+
+    def test_batch_detail_prices_in_single_items_query(self):
+        for quantity in (3, 7, 12):
+            BatchItem.objects.create(
+                batch=self.batch, cheese=self.cheese, quantity=quantity
+            )
+        url = reverse("batch_detail", args=[self.batch.id])
+
+        # сессия, пользователь, партия с менеджером, позиции с сырами
+        with self.assertNumQueries(4):
+            response = self.manager_client.get(url)
+
+        pricing = response.context["pricing"]
+        self.assertEqual(
+            [line.unit_price for line in pricing.lines], [100, 70, 50]
+        )
+        self.assertEqual(pricing.total_base_price, 100 * 22)
+        self.assertEqual(pricing.total_price, 100 * 3 + 70 * 7 + 50 * 12)
+        self.assertEqual(pricing.total_discount_amount,
+                         pricing.total_base_price - pricing.total_price)
+
+    def test_with_totals_matches_python_pricing(self):
+        BatchItem.objects.create(
+            batch=self.batch, cheese=self.cheese, quantity=3
+        )
+        BatchItem.objects.create(
+            batch=self.batch, cheese=self.cheese, quantity=12
+        )
+        empty_batch = Batch.objects.create(manager=self.manager)
+
+        batch = Batch.objects.with_totals().get(id=self.batch.id)
+        pricing = batch.pricing
+        self.assertEqual(batch.computed_total_base, pricing.total_base_price)
+        self.assertEqual(batch.computed_total_price, pricing.total_price)
+        self.assertEqual(batch.computed_discount_percent,
+                         pricing.total_discount_percent)
+
+        empty = Batch.objects.with_totals().get(id=empty_batch.id)
+        self.assertEqual(empty.computed_total_base, 0)
+        self.assertEqual(empty.computed_discount_percent, 0)
+
+    def test_batch_list_query_count_is_constant(self):
+        for _ in range(5):
+            batch = Batch.objects.create(manager=self.manager)
+            BatchItem.objects.create(batch=batch, cheese=self.cheese,
+                                     quantity=7)
+
+        # сессия, пользователь, список партий с суммами
+        with self.assertNumQueries(3):
+            response = self.manager_client.get(reverse("batch_list"))
+        self.assertContains(response, "30.00 %", count=5)
+
+
+class TestBatchBulkEdit(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        User.objects.create_user(
+            username="other", password="pass", role="sales_manager")
+        cheese_type = CheeseType.objects.create(name="Мягкий")
+        self.cheeses = [
+            Cheese.objects.create(
+                sku=f"S-{index}",
+                name=f"Сыр {index}",
+                price=100,
+                weight=1,
+                cheese_type=cheese_type,
+                production_date="2024-01-01",
+            )
+            for index in range(5)
+        ]
+        self.batch = Batch.objects.create(manager=self.manager)
+        self.url = reverse("batch_bulk_edit", args=[self.batch.id])
+        self.client.login(username="manager", password="pass")
+
+    def _post(self, lines="", items=(), deleted=()):
+        data = {"lines": lines, "lines-TOTAL_FORMS": len(items),
+                "lines-INITIAL_FORMS": len(items)}
+        for index, item in enumerate(items):
+            data[f"lines-{index}-item"] = item.id
+            data[f"lines-{index}-quantity"] = item.quantity
+            if item in deleted:
+                data[f"lines-{index}-DELETE"] = "on"
+        return self.client.post(self.url, data)
+
+    def test_pasted_lines_are_added_and_merged(self):
+        existing = BatchItem.objects.create(batch=self.batch,
+                                            cheese=self.cheeses[0],
+                                            quantity=2)
+        response = self._post("S-0, 3\nS-1;4\nS-2\t5\nS-1 6\n",
+                              items=[existing])
+        self.assertRedirects(
+            response, reverse("batch_detail", args=[self.batch.id]))
+        self.assertEqual(
+            list(self.batch.items.order_by("id")
+                 .values_list("cheese__sku", "quantity")),
+            [("S-0", 5), ("S-1", 10), ("S-2", 5)],
+        )
+
+    def test_invalid_lines_save_nothing(self):
+        response = self._post("S-0, 3\nS-404, 1\nбез количества\n")
+        self.assertContains(response, "неизвестный артикул S-404")
+        self.assertContains(response, "Строка 3")
+        self.assertFalse(self.batch.items.exists())
+
+    def test_quantities_are_updated_and_items_deleted(self):
+        items = [BatchItem.objects.create(batch=self.batch, cheese=cheese,
+                                          quantity=1)
+                 for cheese in self.cheeses]
+        for item in items:
+            item.quantity = 9
+        self._post(items=items, deleted=items[:2])
+        self.assertEqual(
+            list(self.batch.items.values_list("quantity", flat=True)),
+            [9, 9, 9])
+
+    def test_query_count_does_not_grow_with_lines(self):
+        items = [BatchItem.objects.create(batch=self.batch, cheese=cheese,
+                                          quantity=1)
+                 for cheese in self.cheeses[:2]]
+        lines = "".join(f"S-{index}, 2\n" for index in range(5))
+        # сессия, пользователь, партия, позиции, сыры по артикулам,
+        # точка сохранения: блокировка, позиции, новые сыры, оптовые
+        # уровни, UPDATE, INSERT, два UPDATE итогов партии
+        with self.assertNumQueries(15):
+            self._post(lines, items=items)
+        self.assertEqual(self.batch.items.count(), 5)
+
+    def test_foreign_items_are_rejected(self):
+        other = Batch.objects.create(manager=User.objects.get(
+            username="other"))
+        foreign = BatchItem.objects.create(batch=other,
+                                           cheese=self.cheeses[0],
+                                           quantity=1)
+        response = self._post(items=[foreign], deleted=[foreign])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BatchItem.objects.filter(id=foreign.id).exists())
+
+        self.client.login(username="other", password="pass")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_add_item_page_does_not_list_catalog(self):
+        for index in range(50):
+            Cheese.objects.create(
+                name=f"Гауда {index}", price=100, weight=1,
+                cheese_type_id=self.cheeses[0].cheese_type_id,
+                production_date="2024-01-01")
+        url = reverse("batch_add_item", args=[self.batch.id])
+        # сессия, пользователь, партия - от размера каталога не зависит
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertNotContains(response, "<option")
+        self.assertContains(response, reverse("api_cheese_suggestions"))
+
+        response = self.client.post(url, {"cheese": 10 ** 6, "quantity": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.batch.items.exists())
+
+    def test_item_edit_shows_selected_cheese(self):
+        item = BatchItem.objects.create(batch=self.batch,
+                                        cheese=self.cheeses[0], quantity=2)
+        response = self.client.get(reverse("batch_item_edit",
+                                           args=[item.id]))
+        self.assertContains(response, f'value="{self.cheeses[0].id}"')
+        self.assertContains(response, f'value="{self.cheeses[0].name}"')
+
+    def test_single_add_merges_same_cheese(self):
+        url = reverse("batch_add_item", args=[self.batch.id])
+        for quantity in (3, 4):
+            self.client.post(url, {"cheese": self.cheeses[0].id,
+                                   "quantity": quantity})
+        self.assertEqual(
+            list(self.batch.items.values_list("quantity", flat=True)), [7])
+
+
+class TestStoredBatchTotals(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        cheese_type = CheeseType.objects.create(name="Мягкий")
+        self.cheese = Cheese.objects.create(
+            sku="B-1",
+            name="Бринза",
+            price=100,
+            price_small_opt=70,
+            min_qty_small_opt=5,
+            weight=1,
+            cheese_type=cheese_type,
+            production_date="2023-01-01",
+        )
+        self.batch = Batch.objects.create(manager=self.manager)
+
+    def _totals(self):
+        self.batch.refresh_from_db()
+        return (self.batch.total_base, self.batch.total_price,
+                self.batch.discount_percent)
+
+    def test_item_changes_update_totals(self):
+        item = BatchItem.objects.create(batch=self.batch,
+                                        cheese=self.cheese, quantity=5)
+        # Загруженная партия позиции обновляется и в памяти
+        self.assertEqual(self.batch.total_price, 350)
+        self.assertEqual(self._totals(), (500, 350, 30))
+
+        item.quantity = 2
+        item.save()
+        self.assertEqual(self._totals(), (200, 200, 0))
+
+        item.delete()
+        self.assertEqual(self._totals(), (0, 0, 0))
+
+    def test_cheese_price_change_keeps_snapshot(self):
+        item = BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                        quantity=5)
+        self.assertEqual((item.tier_min_qty, item.base_price,
+                          item.unit_price), (5, 100, 70))
+        self.cheese.price = 120
+        self.cheese.price_small_opt = 50
+        with CaptureQueriesContext(connection) as queries:
+            self.cheese.save()
+        self.assertFalse([query for query in queries.captured_queries
+                          if "catalog_batch" in query["sql"]])
+        self.assertEqual(self._totals(), (500, 350, 30))
+        self.assertEqual(price_batch(self.batch).total_price, 350)
+
+    def test_resave_without_changes_keeps_snapshot(self):
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=5)
+        self.cheese.price = 200
+        self.cheese.price_small_opt = None
+        self.cheese.save()
+
+        # Как форма правки позиции: загрузка и сохранение без изменений
+        item = BatchItem.objects.get(batch=self.batch)
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual((item.tier_min_qty, item.base_price,
+                          item.unit_price), (5, 100, 70))
+        self.assertEqual(self._totals(), (500, 350, 30))
+
+        # Новое количество - новый снимок по текущим ценам
+        item.quantity = 6
+        item.save()
+        self.assertEqual((item.tier_min_qty, item.base_price,
+                          item.unit_price), (None, 200, 200))
+        self.assertEqual(self._totals(), (1200, 1200, 0))
+
+    def test_edit_form_without_changes_keeps_snapshot(self):
+        item = BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                        quantity=5)
+        self.cheese.price = 200
+        self.cheese.save()
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            reverse("batch_item_edit", args=[item.id]),
+            {"cheese": self.cheese.id, "quantity": 5})
+        self.assertEqual(response.status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual((item.base_price, item.unit_price), (100, 70))
+        self.assertEqual(self._totals(), (500, 350, 30))
+
+    def test_reprice_uses_current_prices(self):
+        other = Batch.objects.create(manager=self.manager)
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=5)
+        BatchItem.objects.create(batch=other, cheese=self.cheese,
+                                 quantity=5)
+        self.cheese.price_small_opt = 50
+        self.cheese.save()
+
+        self.batch.reprice()
+        self.assertEqual(self.batch.total_price, 250)
+        self.assertEqual(self._totals(), (500, 250, 50))
+        item = self.batch.items.get()
+        self.assertEqual((item.tier_min_qty, item.unit_price), (5, 50))
+        # Другие партии не пересчитываются
+        other.refresh_from_db()
+        self.assertEqual(other.total_price, 350)
+
+    def test_quantity_change_takes_current_price(self):
+        item = BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                        quantity=2)
+        self.cheese.price_small_opt = 50
+        self.cheese.save()
+        item.quantity = 5
+        item.save(update_fields=["quantity"])
+        item.refresh_from_db()
+        self.assertEqual((item.tier_min_qty, item.unit_price), (5, 50))
+        self.assertEqual(self._totals(), (500, 250, 50))
+
+    def test_reprice_view(self):
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=5)
+        self.cheese.price_small_opt = 50
+        self.cheese.save()
+        url = reverse("batch_reprice", args=[self.batch.id])
+        self.client.login(username="manager", password="pass")
+        self.assertEqual(self.client.get(url).status_code, 405)
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse("batch_detail",
+                                               args=[self.batch.id]))
+        self.assertEqual(self._totals(), (500, 250, 50))
+
+        User.objects.create_user(username="other", password="pass",
+                                 role="sales_manager")
+        self.client.login(username="other", password="pass")
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+    def test_edit_to_cheese_already_in_batch_merges_lines(self):
+        other = Cheese.objects.create(
+            name="Фета", price=10, weight=1,
+            cheese_type=self.cheese.cheese_type,
+            production_date="2023-01-01")
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=3)
+        item = BatchItem.objects.create(batch=self.batch, cheese=other,
+                                        quantity=2)
+        self.client.login(username="manager", password="pass")
+        response = self.client.post(
+            reverse("batch_item_edit", args=[item.id]),
+            {"cheese": self.cheese.id, "quantity": 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(self.batch.items.values_list("cheese_id", "quantity")),
+            [(self.cheese.id, 5)])
+        self.assertEqual(self._totals(), (500, 350, 30))
+
+    def test_deleting_cheese_updates_totals(self):
+        other = Cheese.objects.create(
+            name="Фета", price=10, weight=1,
+            cheese_type=self.cheese.cheese_type,
+            production_date="2023-01-01")
+        second = Batch.objects.create(manager=self.manager)
+        for batch in (self.batch, second):
+            BatchItem.objects.create(batch=batch, cheese=self.cheese,
+                                     quantity=1)
+        BatchItem.objects.create(batch=self.batch, cheese=other, quantity=1)
+        self.cheese.delete()
+        self.assertEqual(self._totals(), (10, 10, 0))
+        second.refresh_from_db()
+        self.assertEqual(second.total_price, 0)
+
+    def test_items_are_fast_deleted(self):
+        # Без сигналов удаления позиции партии или сыра удаляются одним
+        # DELETE, без загрузки в память
+        collector = Collector(using="default")
+        self.assertTrue(collector.can_fast_delete(BatchItem.objects.all()))
+
+    def test_item_delete_view_updates_totals(self):
+        item = BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                        quantity=5)
+        self.client.login(username="manager", password="pass")
+        response = self.client.post(reverse("batch_item_delete",
+                                            args=[item.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._totals(), (0, 0, 0))
+
+    def test_batch_list_reads_stored_totals(self):
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=5)
+        self.client.login(username="manager", password="pass")
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("batch_list"))
+        self.assertContains(response, "30.00 %")
+
+    def test_command_repairs_drift(self):
+        BatchItem.objects.create(batch=self.batch, cheese=self.cheese,
+                                 quantity=5)
+        Batch.objects.filter(id=self.batch.id).update(total_price=1)
+
+        out, err = StringIO(), StringIO()
+        call_command("check_batch_totals", stdout=out, stderr=err)
+        self.assertIn("с расхождениями: 1", out.getvalue())
+        self.assertIn(f"Партия #{self.batch.id}", err.getvalue())
+        self.assertEqual(self._totals()[1], 1)
+
+        call_command("check_batch_totals", fix=True, stdout=out,
+                     stderr=err)
+        self.assertEqual(self._totals(), (500, 350, 30))
+        out = StringIO()
+        call_command("check_batch_totals", stdout=out)
+        self.assertIn("с расхождениями: 0", out.getvalue())
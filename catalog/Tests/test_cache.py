@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Cheese, CheeseType
+
+User = get_user_model()
+
+
+class TestCatalogPageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cheese_type = CheeseType.objects.create(name="Твердый")
+        self.cheese = Cheese.objects.create(
+            name="Чеддер",
+            price=100,
+            weight=1,
+            cheese_type=self.cheese_type,
+            production_date="2024-01-01",
+        )
+
+    def test_anonymous_pages_are_cached(self):
+        for url in [reverse("cheese_list"),
+                    reverse("cheese_detail", args=[self.cheese.id]),
+                    reverse("about")]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                # Остаётся только чтение версии каталога или даты сыра
+                with self.assertNumQueries(0 if url == reverse("about")
+                                           else 1):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+
+    def test_equivalent_filters_share_cache_entry(self):
+        self.client.get(reverse("cheese_list"), {"q": "Чед"})
+        with self.assertNumQueries(1):
+            self.client.get(reverse("cheese_list"),
+                            {"q": " Чед ", "utm_source": "mail",
+                             "order_by": "unknown"})
+
+    def test_cheese_change_invalidates_list_and_detail(self):
+        detail_url = reverse("cheese_detail", args=[self.cheese.id])
+        self.client.get(reverse("cheese_list"))
+        self.client.get(detail_url)
+
+        self.cheese.name = "Чеддер выдержанный"
+        self.cheese.save()
+
+        self.assertContains(self.client.get(reverse("cheese_list")),
+                            "Чеддер выдержанный")
+        self.assertContains(self.client.get(detail_url),
+                            "Чеддер выдержанный")
+
+    def test_cheese_type_change_invalidates_its_cheeses(self):
+        detail_url = reverse("cheese_detail", args=[self.cheese.id])
+        self.client.get(detail_url)
+
+        self.cheese_type.name = "Полутвердый"
+        self.cheese_type.save()
+
+        self.assertContains(self.client.get(detail_url), "Полутвердый")
+
+    def test_detail_key_follows_cheese_change_time(self):
+        detail_url = reverse("cheese_detail", args=[self.cheese.id])
+        etag = self.client.get(detail_url)["ETag"]
+
+        # Другой воркер со своим LocMemCache: из его кэша старую
+        # страницу никто не удалял
+        Cheese.objects.filter(id=self.cheese.id).update(
+            name="Гауда", updated_at=timezone.now())
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Гауда")
+        response = self.client.get(detail_url,
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_deleted_cheese_disappears_from_list(self):
+        self.client.get(reverse("cheese_list"))
+        self.cheese.delete()
+        self.assertNotContains(self.client.get(reverse("cheese_list")),
+                               "Чеддер")
+
+    def test_logged_in_users_bypass_cache(self):
+        User.objects.create_user(username="admin", password="pass",
+                                 role="admin")
+        self.client.login(username="admin", password="pass")
+        self.client.get(reverse("cheese_list"))
+
+        # Изменение в обход сигналов: вошедший пользователь его видит
+        Cheese.objects.filter(id=self.cheese.id).update(name="Гауда")
+        response = self.client.get(reverse("cheese_list"))
+        self.assertContains(response, "Гауда")
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import CatalogVersion, Cheese, CheeseType
+
+User = get_user_model()
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        self.cheese_type = CheeseType.objects.create(name="Твердый")
+        self.cheese = Cheese.objects.create(
+            name="Чеддер",
+            price=100,
+            weight=1,
+            cheese_type=self.cheese_type,
+            production_date="2024-01-01",
+        )
+        self.list_url = reverse("cheese_list")
+        self.detail_url = reverse("cheese_detail", args=[self.cheese.id])
+
+    def test_unchanged_pages_return_304(self):
+        for url in [self.list_url, self.detail_url]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header("ETag"))
+                self.assertTrue(response.has_header("Last-Modified"))
+
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        url, headers={"if-none-match": response["ETag"]})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.detail_url)
+        response = self.client.get(
+            self.detail_url,
+            headers={"if-modified-since": response["Last-Modified"]},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_produce_new_etag(self):
+        list_etag = self.client.get(self.list_url)["ETag"]
+        detail_etag = self.client.get(self.detail_url)["ETag"]
+        version = CatalogVersion.current().version
+
+        self.cheese_type.name = "Полутвердый"
+        self.cheese_type.save()
+
+        self.assertEqual(CatalogVersion.current().version, version + 1)
+        response = self.client.get(self.list_url,
+                                   headers={"if-none-match": list_etag})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.detail_url,
+                                   headers={"if-none-match": detail_etag})
+        self.assertContains(response, "Полутвердый")
+
+    def test_etag_depends_on_user(self):
+        anonymous_etag = self.client.get(self.list_url)["ETag"]
+        User.objects.create_user(username="user", password="pass")
+        self.client.login(username="user", password="pass")
+
+        response = self.client.get(self.list_url,
+                                   headers={"if-none-match": anonymous_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], anonymous_etag)
+
+    def test_missing_cheese_is_404(self):
+        response = self.client.get(reverse("cheese_detail", args=[999]))
+        self.assertEqual(response.status_code, 404)
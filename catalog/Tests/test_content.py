@@ -1,4 +1,7 @@
-from django.test import TestCase
+import base64
+import json
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from catalog.models import Cheese, CheeseType
 
@@ -41,6 +44,9 @@ class TestCheeseSorting(TestCase):
         # Создание типов сыра
         cheese_type1 = CheeseType.objects.create(name="Твердый")
         cheese_type2 = CheeseType.objects.create(name="Мягкий")
+        # На PostgreSQL последовательности id не откатываются между тестами
+        self.hard_type_id = cheese_type1.id
+        self.soft_type_id = cheese_type2.id
 
         # Создание нескольких сыра с разными аттрибутами для теста
         Cheese.objects.create(
@@ -92,11 +98,31 @@ class TestCheeseSorting(TestCase):
         self.assertEqual(cheeses[1].name, "Гауда")
         self.assertEqual(cheeses[2].name, "Чеддер")
 
+    def test_sort_by_production_date_desc(self):
+        response = self.client.get(
+            reverse("cheese_list") + "?order_by=-production_date")
+        cheeses = response.context["cheeses"]
+        # При равных датах более новые записи (по id) идут первыми
+        self.assertEqual([cheese.name for cheese in cheeses],
+                         ["Бри", "Гауда", "Чеддер"])
+
+    def test_unknown_sort_falls_back_to_name(self):
+        for order_by in ["cheese_type__name", "password", "-id"]:
+            with self.subTest(order_by=order_by):
+                response = self.client.get(
+                    reverse("cheese_list"), {"order_by": order_by})
+                self.assertEqual(response.status_code, 200)
+                # Страница может прийти из кэша, поэтому смотрим на HTML
+                content = response.content.decode()
+                positions = [content.index(f">{name}</a>")
+                             for name in ["Бри", "Гауда", "Чеддер"]]
+                self.assertEqual(positions, sorted(positions))
+
     def test_filter_by_cheese_type(self):
         # Фильтрация по типу сыра (например, "Твердый")
         response = self.client.get(
-            reverse("cheese_list") + "?type=1"
-        )  # 1 - это ID типа "Твердый"
+            reverse("cheese_list") + f"?type={self.hard_type_id}"
+        )
         cheeses = response.context["cheeses"]
 
         # Проверяем, что фильтруются только сыры типа "Твердый"
@@ -104,13 +130,111 @@ class TestCheeseSorting(TestCase):
         self.assertTrue(all(cheese.cheese_type.name ==
                             "Твердый" for cheese in cheeses))
 
+    def test_invalid_cheese_type_is_ignored(self):
+        for value in ["9" * 30, str(2 ** 63), "²", "0"]:
+            with self.subTest(value=value):
+                response = self.client.get(reverse("cheese_list"),
+                                           {"type": value})
+                # Фильтр отброшен: все сыры (страница может быть из кэша)
+                for name in ["Бри", "Гауда", "Чеддер"]:
+                    self.assertContains(response, f">{name}</a>")
+                response = self.client.get(reverse("api_cheeses"),
+                                           {"type": value})
+                self.assertEqual(response.status_code, 200)
+
     def test_filter_by_cheese_type_mixed(self):
         # Фильтрация по типу сыра (например, "Мягкий")
         response = self.client.get(
-            reverse("cheese_list") + "?type=2"
-        )  # 2 - это ID типа "Мягкий"
+            reverse("cheese_list") + f"?type={self.soft_type_id}"
+        )
         cheeses = response.context["cheeses"]
 
         # Проверяем, что фильтруется только 1 сыр с типом "Мягкий"
         self.assertEqual(len(cheeses), 1)
         self.assertEqual(cheeses[0].name, "Бри")
+
+
+@override_settings(CATALOG_PAGE_SIZE=2)
+class TestCheesePagination(TestCase):
+    def setUp(self):
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        # Две пары с одинаковой ценой проверяют сортировку по id
+        for name, price in [("Бри", 150), ("Гауда", 120), ("Чеддер", 100),
+                            ("Эдам", 120), ("Маасдам", 100)]:
+            Cheese.objects.create(
+                name=name,
+                price=price,
+                weight=1,
+                cheese_type=cheese_type,
+                in_stock=name != "Эдам",
+                production_date="2024-01-01",
+            )
+
+    def _names(self, response):
+        return [cheese.name for cheese in response.context["cheeses"]]
+
+    def test_walk_pages_forward_and_back(self):
+        url = reverse("cheese_list") + "?order_by=price"
+        response = self.client.get(url)
+        self.assertEqual(self._names(response), ["Чеддер", "Маасдам"])
+        page = response.context["page"]
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.count)
+
+        response = self.client.get(url, {"order_by": "price",
+                                         "cursor": page.next_cursor})
+        self.assertEqual(self._names(response), ["Гауда", "Эдам"])
+        second = response.context["page"]
+
+        response = self.client.get(url, {"order_by": "price",
+                                         "cursor": second.next_cursor})
+        self.assertEqual(self._names(response), ["Бри"])
+        self.assertFalse(response.context["page"].has_next())
+
+        response = self.client.get(url, {"order_by": "price",
+                                         "cursor": second.previous_cursor})
+        self.assertEqual(self._names(response), ["Чеддер", "Маасдам"])
+
+    def test_descending_order_and_count(self):
+        response = self.client.get(reverse("cheese_list"),
+                                   {"order_by": "-price", "count": "1"})
+        self.assertEqual(self._names(response), ["Бри", "Эдам"])
+        self.assertEqual(response.context["page"].count, 5)
+        self.assertContains(response, "Найдено: 5")
+
+        cursor = response.context["page"].next_cursor
+        response = self.client.get(reverse("cheese_list"),
+                                   {"order_by": "-price", "cursor": cursor})
+        self.assertEqual(self._names(response), ["Гауда", "Маасдам"])
+
+    def test_filters_are_kept_in_page_links(self):
+        response = self.client.get(reverse("cheese_list"),
+                                   {"in_stock": "true", "q": "д"})
+        self.assertEqual(self._names(response), ["Гауда", "Маасдам"])
+        self.assertContains(response, "in_stock=true")
+        self.assertContains(response, "q=%D0%B4")
+
+        cursor = response.context["page"].next_cursor
+        response = self.client.get(reverse("cheese_list"),
+                                   {"in_stock": "true", "q": "д",
+                                    "cursor": cursor})
+        self.assertEqual(self._names(response), ["Чеддер"])
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse("cheese_list"),
+                                   {"cursor": "не-курсор"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._names(response), ["Бри", "Гауда"])
+
+    def test_cursor_with_null_values_shows_first_page(self):
+        for values in ([None, 1], ["Бри", None], [["Бри"], 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(
+                {"d": "next", "v": values}).encode()).decode()
+            with self.subTest(values=values):
+                response = self.client.get(reverse("cheese_list"),
+                                           {"cursor": cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self._names(response), ["Бри", "Гауда"])
+                response = self.client.get(reverse("api_cheeses"),
+                                           {"cursor": cursor})
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,203 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.importexport import import_cheeses
+from catalog.models import Batch, BatchItem, CatalogVersion, Cheese, CheeseType
+
+User = get_user_model()
+
+HEADER = ("sku,name,price,price_small_opt,min_qty_small_opt,price_big_opt,"
+          "min_qty_big_opt,weight,cheese_type,in_stock,production_date\n")
+
+
+class TestCheeseImport(TestCase):
+    def setUp(self):
+        self.hard = CheeseType.objects.create(name="Твердый")
+        self.soft = CheeseType.objects.create(name="Мягкий")
+
+    def _import(self, text, file_format="csv", **options):
+        return import_cheeses(StringIO(text), file_format, **options)
+
+    def test_csv_rows_are_created_and_then_updated_by_sku(self):
+        result = self._import(
+            HEADER
+            + "A-1,Пармезан,900,800,10,,,1000,Твердый,true,2024-01-01\n"
+            + "A-2,Бри,500,,,,,250,Мягкий,0,2024-02-01\n"
+        )
+        self.assertEqual((result.created, result.updated), (2, 0))
+        brie = Cheese.objects.get(sku="A-2")
+        self.assertEqual(brie.cheese_type, self.soft)
+        self.assertFalse(brie.in_stock)
+        self.assertIsNone(brie.price_small_opt)
+
+        result = self._import(
+            HEADER + "A-2,Бри де Мо,550,,,,,250,Мягкий,1,2024-02-01\n")
+        self.assertEqual((result.created, result.updated), (0, 1))
+        brie.refresh_from_db()
+        self.assertEqual(brie.name, "Бри де Мо")
+        self.assertEqual(brie.price, Decimal("550"))
+        self.assertTrue(brie.in_stock)
+        self.assertEqual(Cheese.objects.count(), 2)
+        # Оптовые поля переносятся в общие уровни и при импорте
+        parmesan = Cheese.objects.get(sku="A-1")
+        self.assertEqual(list(parmesan.price_tiers.values_list(
+            "min_qty", "price")), [(10, Decimal("800"))])
+        self.assertFalse(brie.price_tiers.exists())
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        result = self._import(
+            HEADER
+            + ",Без артикула,100,,,,,1,Твердый,true,2024-01-01\n"
+            + "B-1,Гауда,дорого,,,,,1,Твердый,true,2024-01-01\n"
+            + "B-2,Эдам,100,,,,,1,Плавленый,true,2024-01-01\n"
+            + "B-3,Фета,100,,,,,1,Мягкий,может быть,2024-01-01\n"
+            + "B-4,Чеддер,100,,,,,1,Твердый,true,2024-01-01\n"
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.error_count, 4)
+        self.assertEqual([(line, sorted(errors))
+                          for line, errors in result.errors],
+                         [(2, ["sku"]), (3, ["price"]),
+                          (4, ["cheese_type"]), (5, ["in_stock"])])
+        self.assertEqual(list(Cheese.objects.values_list("sku", flat=True)),
+                         ["B-4"])
+
+    def test_unknown_types_can_be_created(self):
+        result = self._import(
+            HEADER + "C-1,Сулугуни,300,,,,,1,Рассольный,true,2024-01-01\n",
+            create_types=True,
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Cheese.objects.get().cheese_type.name, "Рассольный")
+
+    def test_ambiguous_type_name_is_rejected(self):
+        CheeseType.objects.create(name="Мягкий")
+        result = self._import(
+            HEADER + "D-1,Бри,500,,,,,250,Мягкий,1,2024-02-01\n",
+            create_types=True,
+        )
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.errors, [(2, {"cheese_type": [
+            "Несколько типов сыра с названием Мягкий"]})])
+        self.assertEqual(CheeseType.objects.filter(name="Мягкий").count(), 2)
+
+    def test_jsonl_rows(self):
+        lines = [
+            json.dumps({"sku": "J-1", "name": "Моцарелла", "price": 350.5,
+                        "weight": 125, "cheese_type": "Мягкий",
+                        "in_stock": False, "production_date": "2024-03-01"},
+                       ensure_ascii=False),
+            "{не json",
+        ]
+        result = self._import("\n".join(lines) + "\n", "jsonl")
+        self.assertEqual((result.created, result.error_count), (1, 1))
+        cheese = Cheese.objects.get(sku="J-1")
+        self.assertEqual(cheese.price, Decimal("350.50"))
+        self.assertFalse(cheese.in_stock)
+
+    def test_rows_are_written_in_batches(self):
+        rows = "".join(
+            f"D-{index},Сыр {index},100,,,,,1,Твердый,true,2024-01-01\n"
+            for index in range(100)
+        )
+        version = CatalogVersion.current().version
+        # Без запросов на каждую строку: 4 пачки по 25 строк (у сыров
+        # без опта уровни только удаляются, без INSERT)
+        with self.assertNumQueries(4 * 6 + 1):
+            result = self._import(HEADER + rows, chunk_size=25)
+        self.assertEqual(result.created, 100)
+        self.assertGreater(CatalogVersion.current().version, version)
+
+    def test_price_updates_keep_batch_prices(self):
+        self._import(HEADER + "F-1,Бри,100,,,,,1,Мягкий,1,2024-02-01\n")
+        batch = Batch.objects.create(manager=User.objects.create_user(
+            username="manager", password="pass", role="sales_manager"))
+        BatchItem.objects.create(batch=batch, cheese=Cheese.objects.get(),
+                                 quantity=2)
+
+        # Позиция хранит цену на момент добавления
+        self._import(HEADER + "F-1,Бри,150,,,,,1,Мягкий,1,2024-02-01\n")
+        batch.refresh_from_db()
+        self.assertEqual(batch.total_price, Decimal("200"))
+        batch.reprice()
+        self.assertEqual(batch.total_price, Decimal("300"))
+
+    def test_command_reads_file_and_reports_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cheeses.csv")
+            with open(path, "w", encoding="utf-8") as stream:
+                stream.write(
+                    HEADER
+                    + "E-1,Маасдам,400,,,,,1,Твердый,true,2024-01-01\n"
+                    + "E-2,Рокфор,400,,,,,1,Голубой,true,2024-01-01\n"
+                )
+            out, err = StringIO(), StringIO()
+            call_command("import_cheeses", path, stdout=out, stderr=err)
+        self.assertIn("Добавлено: 1", out.getvalue())
+        self.assertIn("Строка 3", err.getvalue())
+
+
+class TestCheeseImportExportViews(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="admin", password="pass",
+                                 role="admin")
+        User.objects.create_user(username="manager", password="pass",
+                                 role="sales_manager")
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        Cheese.objects.create(
+            sku="X-1",
+            name="Чеддер",
+            price=100,
+            weight=1,
+            cheese_type=cheese_type,
+            in_stock=True,
+            production_date="2024-01-01",
+        )
+
+    def test_only_admin_can_import(self):
+        self.client.login(username="manager", password="pass")
+        response = self.client.get(reverse("cheese_import"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_upload_imports_rows(self):
+        self.client.login(username="admin", password="pass")
+        upload = SimpleUploadedFile(
+            "cheeses.csv",
+            (HEADER + "X-2,Гауда,200,,,,,1,Твердый,true,2024-01-01\n"
+             + "X-3,Бри,200,,,,,1,Мягкий,true,2024-01-01\n").encode(),
+        )
+        response = self.client.post(reverse("cheese_import"),
+                                    {"file": upload})
+        self.assertContains(response, "Добавлено: 1")
+        self.assertContains(response, "Неизвестный тип сыра: Мягкий")
+        self.assertTrue(Cheese.objects.filter(sku="X-2").exists())
+
+    def test_export_streams_csv_that_imports_back(self):
+        self.client.login(username="admin", password="pass")
+        response = self.client.get(reverse("cheese_export"))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertTrue(content.startswith("sku,name,price"))
+        self.assertIn("X-1,Чеддер,100.00", content)
+
+        result = import_cheeses(StringIO(content), "csv")
+        self.assertEqual((result.created, result.updated,
+                          result.error_count), (0, 1, 0))
+
+    def test_export_jsonl(self):
+        self.client.login(username="admin", password="pass")
+        response = self.client.get(reverse("cheese_export"),
+                                   {"format": "jsonl"})
+        rows = [json.loads(line) for line in
+                b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]["sku"], "X-1")
+        self.assertEqual(rows[0]["cheese_type"], "Твердый")
@@ -0,0 +1,140 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import skipIf
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from catalog.batch_items import update_batch_items
+from catalog.metrics import METRICS_AVAILABLE, _install_query_counter
+from catalog.models import Batch
+from catalog.Tests.base import CatalogTestCase, middleware_first
+
+if METRICS_AVAILABLE:
+    from prometheus_client import REGISTRY
+
+METRICS_MIDDLEWARE = middleware_first("catalog.metrics.MetricsMiddleware")
+
+# Два воркера записывают по обращению к кэшу в общий каталог
+WORKER_SCRIPT = """
+import django
+django.setup()
+from catalog.metrics import record_cache
+record_cache("about", hit=True)
+"""
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@skipIf(not METRICS_AVAILABLE, "prometheus_client не установлен")
+@override_settings(PROMETHEUS_METRICS=True, MIDDLEWARE=METRICS_MIDDLEWARE)
+class TestMetrics(CatalogTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def cheese_data(self, index):
+        return {**super().cheese_data(index), "in_stock": index > 0}
+
+    def test_request_is_recorded_by_url_name(self):
+        labels = {"url_name": "cheese_list", "method": "GET"}
+        before = (
+            _sample("catalog_request_duration_seconds_count", **labels),
+            _sample("catalog_responses_total", status="200", **labels),
+            _sample("catalog_request_db_queries_sum",
+                    url_name="cheese_list"),
+        )
+        self.client.force_login(self.manager)
+        self.client.get(reverse("cheese_list"))
+        self.client.get("/нет-такой-страницы/")
+
+        self.assertEqual(
+            _sample("catalog_request_duration_seconds_count", **labels),
+            before[0] + 1)
+        self.assertEqual(
+            _sample("catalog_responses_total", status="200", **labels),
+            before[1] + 1)
+        self.assertGreater(
+            _sample("catalog_request_db_queries_sum", url_name="cheese_list"),
+            before[2])
+        self.assertGreater(_sample("catalog_responses_total",
+                                   url_name="unmatched", method="GET",
+                                   status="404"), 0)
+
+    async def test_async_requests_count_queries(self):
+        before = _sample("catalog_request_db_queries_sum",
+                         url_name="cheese_list")
+        # Соединение теста открыто раньше, чем асинхронный клиент создаст
+        # middleware в потоке цикла событий; на сервере наоборот
+        await sync_to_async(_install_query_counter)()
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get(reverse("cheese_list"))
+        self.assertEqual(response.status_code, 200)
+        # Запросы из потока sync_to_async тоже засчитаны
+        self.assertGreater(_sample("catalog_request_db_queries_sum",
+                                   url_name="cheese_list"), before)
+
+    def test_page_cache_hits_and_misses(self):
+        before = {result: _sample("catalog_page_cache_requests_total",
+                                  page="cheese_list", result=result)
+                  for result in ("hit", "miss")}
+        self.client.get(reverse("cheese_list"))
+        self.client.get(reverse("cheese_list"))
+        for result in ("hit", "miss"):
+            self.assertEqual(
+                _sample("catalog_page_cache_requests_total",
+                        page="cheese_list", result=result),
+                before[result] + 1)
+
+    def test_batch_lines_are_counted_after_commit(self):
+        batch = Batch.objects.create(manager=self.manager)
+        before = _sample("catalog_batch_lines_total", action="added")
+        with self.captureOnCommitCallbacks(execute=True):
+            update_batch_items(batch, added={self.cheeses[0].id: 2,
+                                             self.cheeses[1].id: 1})
+        self.assertEqual(_sample("catalog_batch_lines_total",
+                                 action="added"), before + 2)
+
+    def test_metrics_page(self):
+        Batch.objects.create(manager=self.manager)
+        self.client.get(reverse("about"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn('catalog_request_duration_seconds_bucket{le="0.005",'
+                      'method="GET",url_name="about"}', content)
+        self.assertIn('catalog_cheeses{in_stock="true"} 2.0', content)
+        self.assertIn('catalog_cheeses{in_stock="false"} 1.0', content)
+        self.assertIn("catalog_recent_batches 1.0", content)
+
+    @override_settings(PROMETHEUS_METRICS=False)
+    def test_metrics_page_is_disabled_by_default(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_workers_are_aggregated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory,
+                   "DJANGO_SETTINGS_MODULE": "cheese_shop.settings"}
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", WORKER_SCRIPT],
+                               env=env, cwd=settings.BASE_DIR, check=True)
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+            try:
+                response = self.client.get(reverse("metrics"))
+            finally:
+                del os.environ["PROMETHEUS_MULTIPROC_DIR"]
+        content = response.content.decode()
+        self.assertIn('catalog_page_cache_requests_total{page="about",'
+                      'result="hit"} 2.0', content)
+        # Счётчики этого процесса в каталог не писались
+        self.assertNotIn('url_name="metrics"', content)
+        self.assertIn("catalog_recent_batches 0.0", content)
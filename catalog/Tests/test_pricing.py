@@ -0,0 +1,108 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.batch_items import update_batch_items
+from catalog.models import (Batch, BatchItem, Cheese, CheeseType, PriceList,
+                            PriceTier)
+
+User = get_user_model()
+
+
+class TestPriceTiers(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        self.cheese_type = CheeseType.objects.create(name="Твердый")
+        self.cheese = self._cheese("Гауда", price_small_opt=90,
+                                   min_qty_small_opt=10, price_big_opt=80,
+                                   min_qty_big_opt=50)
+        self.price_list = PriceList.objects.create(name="Ресторан")
+        for min_qty, price in [(20, 85), (100, 70), (500, 60)]:
+            PriceTier.objects.create(cheese=self.cheese, min_qty=min_qty,
+                                     price=price, price_list=self.price_list)
+
+    def _cheese(self, name, **tiers):
+        return Cheese.objects.create(
+            name=name, price=100, weight=1, cheese_type=self.cheese_type,
+            production_date="2024-01-01", **tiers)
+
+    def _general(self, cheese):
+        return list(cheese.price_tiers.filter(price_list=None)
+                    .order_by("min_qty").values_list("min_qty", "price"))
+
+    def test_cheese_fields_are_synced_to_general_tiers(self):
+        self.assertEqual(self._general(self.cheese), [(10, 90), (50, 80)])
+
+        self.cheese.price_big_opt = None
+        self.cheese.min_qty_small_opt = 5
+        self.cheese.save()
+        self.assertEqual(self._general(self.cheese), [(5, 90)])
+        # Уровни прайс-листов не трогаются
+        self.assertEqual(self.price_list.tiers.count(), 3)
+
+    def test_lookup_prefers_price_list_and_falls_back(self):
+        general = PriceTier.objects.for_batch(
+            Batch.objects.create(manager=self.manager).id)
+        own = PriceTier.objects.for_batch(
+            Batch.objects.create(manager=self.manager,
+                                 price_list=self.price_list).id)
+        cases = [
+            (1, None, None),
+            (10, (10, 90), (10, 90)),
+            (20, (10, 90), (20, 85)),
+            (60, (50, 80), (20, 85)),
+            (100, (50, 80), (100, 70)),
+            (1000, (50, 80), (500, 60)),
+        ]
+        for quantity, expected_general, expected_own in cases:
+            with self.subTest(quantity=quantity):
+                self.assertEqual(general.lookup(self.cheese.id, quantity),
+                                 expected_general)
+                self.assertEqual(own.lookup(self.cheese.id, quantity),
+                                 expected_own)
+
+    def test_resolve_whole_batch_in_one_query(self):
+        cheeses = [self._cheese(f"Сыр {index}", price_small_opt=90,
+                                min_qty_small_opt=index % 7 + 1)
+                   for index in range(20)] + [self.cheese]
+        batch = Batch.objects.create(manager=self.manager,
+                                     price_list=self.price_list)
+        tiers = PriceTier.objects.for_batch(batch.id)
+        lines = [(cheese.id, quantity) for cheese in cheeses
+                 for quantity in range(1, 1001, 21)]
+        with self.assertNumQueries(1):
+            resolved = tiers.resolve(lines)
+        self.assertEqual(len(resolved), len(lines))
+        for line in lines[::37] + lines[-48:]:
+            self.assertEqual(resolved[line], tiers.lookup(*line))
+
+    def test_items_and_reprice_use_batch_price_list(self):
+        batch = Batch.objects.create(manager=self.manager,
+                                     price_list=self.price_list)
+        item = BatchItem.objects.create(batch=batch, cheese=self.cheese,
+                                        quantity=120)
+        update_batch_items(batch, added={self.cheese.id: 380})
+        item.refresh_from_db()
+        self.assertEqual((item.quantity, item.tier_min_qty, item.unit_price),
+                         (500, 500, 60))
+
+        PriceTier.objects.filter(price_list=self.price_list,
+                                 min_qty=500).update(price=55)
+        batch.reprice()
+        item.refresh_from_db()
+        self.assertEqual((item.tier_min_qty, item.unit_price), (500, 55))
+        self.assertEqual(batch.total_price, Decimal("27500"))
+        self.assertEqual(batch.total_base, Decimal("50000"))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_price_tiers", cheeses=60, lines=50,
+                     tiers=3, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Запрос на позицию: запросов 50", output)
+        self.assertIn("Вся партия (resolve): запросов 1,", output)
+        self.assertFalse(PriceList.objects.filter(name="benchmark").exists())
@@ -0,0 +1,120 @@
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+
+from catalog import profiling
+from catalog.models import Batch, BatchItem
+from catalog.Tests.base import CatalogTestCase, middleware_first
+
+PROFILING_MIDDLEWARE = middleware_first(
+    "catalog.profiling.RequestProfilingMiddleware")
+
+
+def _server_timing(response):
+    """{метрика: длительность в мс} из заголовка Server-Timing"""
+    metrics = {}
+    for metric in response["Server-Timing"].split(", "):
+        name, duration = metric.split(";")[:2]
+        metrics[name] = float(duration.removeprefix("dur="))
+    return metrics
+
+
+@override_settings(MIDDLEWARE=PROFILING_MIDDLEWARE)
+class TestRequestProfiling(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.batch = Batch.objects.create(manager=self.manager)
+        for index, cheese in enumerate(self.cheeses):
+            BatchItem.objects.create(batch=self.batch, cheese=cheese,
+                                     quantity=index + 1)
+        self.client.force_login(self.manager)
+        self.url = reverse("batch_detail", args=[self.batch.id])
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs("catalog.profiling", "INFO") as logs:
+            with self.assertNumQueries(4) as queries:
+                response = self.client.get(self.url)
+        metrics = _server_timing(response)
+        self.assertEqual(set(metrics), {"db", "template", "view", "total"})
+        self.assertIn('desc="4 SQL"', response["Server-Timing"])
+        self.assertGreater(metrics["template"], 0)
+        self.assertLessEqual(metrics["db"] + metrics["template"],
+                             metrics["total"] + 0.1)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "batch_detail")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["queries"], len(queries))
+        self.assertNotIn("profile", record)
+
+    def test_sampled_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING_SAMPLE_RATE=1.0,
+                              PROFILING_URL_NAMES=["batch_detail"],
+                              PROFILING_DIR=directory), \
+                self.assertLogs("catalog.profiling", "INFO") as logs:
+            self.client.get(self.url)
+            self.client.get(reverse("batch_list"))
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].startswith("batch_detail-"))
+            stats = pstats.Stats(os.path.join(directory, files[0]))
+        self.assertTrue(stats.total_calls)
+        records = [json.loads(record.getMessage())
+                   for record in logs.records]
+        self.assertTrue(records[0]["profile"].endswith(".prof"))
+        self.assertNotIn("profile", records[1])
+
+    def test_sampling_off_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profiles")
+            with self.settings(PROFILING_SAMPLE_RATE=0.0,
+                               PROFILING_DIR=path), \
+                    self.assertLogs("catalog.profiling", "INFO"):
+                self.client.get(self.url)
+            self.assertFalse(os.path.exists(path))
+
+    def test_one_profile_at_a_time(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING_SAMPLE_RATE=1.0,
+                              PROFILING_DIR=directory), \
+                self.assertLogs("catalog.profiling", "INFO") as logs:
+            # Другой запрос процесса уже профилируется
+            with profiling._profiling:
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(os.listdir(directory), [])
+            # Освободившаяся блокировка снова даёт снять профиль
+            self.client.get(self.url)
+            self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertNotIn("profile", json.loads(logs.records[0].getMessage()))
+
+    def test_profiler_that_cannot_start_does_not_fail_request(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING_SAMPLE_RATE=1.0,
+                              PROFILING_DIR=directory), \
+                mock.patch.object(cProfile.Profile, "enable",
+                                  side_effect=ValueError(
+                                      "Another profiling tool is already "
+                                      "active")), \
+                self.assertLogs("catalog.profiling", "INFO") as logs:
+            response = self.client.get(self.url)
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Профилировщик уже запущен", logs.output[0])
+        self.assertFalse(profiling._profiling.locked())
+
+    async def test_async_requests_are_measured(self):
+        await self.async_client.aforce_login(self.manager)
+        with self.assertLogs("catalog.profiling", "INFO") as logs:
+            response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(_server_timing(response)["template"], 0)
+        self.assertGreaterEqual(
+            json.loads(logs.records[0].getMessage())["queries"], 4)
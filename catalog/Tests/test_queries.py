@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.decorators import QueryBudgetExceeded, query_budget
+from catalog.models import (Batch, BatchItem, Cheese, CheeseType, PriceList,
+                            PriceTier)
+from catalog.sorting import CATALOG_SORT_OPTIONS
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class TestQueryBudgets(TestCase):
+    """Страницы укладываются в бюджет запросов при любом объёме данных"""
+
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager"
+        )
+        # Название прайс-листа выводится на странице партии
+        self.batch = Batch.objects.create(
+            manager=self.manager,
+            price_list=PriceList.objects.create(name="Опт"))
+        for type_index in range(3):
+            cheese_type = CheeseType.objects.create(
+                name=f"Тип {type_index}")
+            for cheese_index in range(5):
+                cheese = Cheese.objects.create(
+                    name=f"Сыр {type_index}-{cheese_index}",
+                    price=100,
+                    price_small_opt=90,
+                    min_qty_small_opt=5,
+                    weight=1,
+                    cheese_type=cheese_type,
+                    production_date="2024-01-01",
+                )
+                BatchItem.objects.create(batch=self.batch, cheese=cheese,
+                                         quantity=cheese_index + 1)
+        self.cheese = cheese
+        for _ in range(5):
+            Batch.objects.create(manager=self.manager)
+        self.client.login(username="manager", password="pass")
+
+    def test_catalog_pages(self):
+        for url in [
+            reverse("cheese_list"),
+            reverse("cheese_list") + "?order_by=price&count=1",
+            reverse("cheese_detail", args=[self.cheese.id]),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_batch_pages(self):
+        for url in [
+            reverse("batch_list"),
+            reverse("batch_detail", args=[self.batch.id]),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_exceeded_budget_raises(self):
+        @query_budget(1)
+        def view(request):
+            list(CheeseType.objects.all())
+            list(Cheese.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(RequestFactory().get("/"))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeded_budget_logs_warning(self):
+        @query_budget(0)
+        def view(request):
+            list(CheeseType.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs("catalog.decorators", "WARNING"):
+            view(RequestFactory().get("/"))
+
+
+class TestExplainCatalogIndexes(TestCase):
+    def test_command_reports_plans_and_rolls_back(self):
+        out = StringIO()
+        call_command("explain_catalog_indexes", cheeses=200, batches=10,
+                     repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Партии менеджера, новые сверху", output)
+        if connection.vendor == "sqlite":
+            # PostgreSQL на 10 партиях честно выбирает Seq Scan
+            self.assertIn("batch_manager_created_idx", output)
+        self.assertFalse(Cheese.objects.exists())
+        self.assertFalse(Batch.objects.exists())
+
+
+class TestSeedAndBenchmarkViews(TestCase):
+    def _seed(self):
+        call_command("seed_catalog", cheese_types=3, cheeses=60,
+                     price_lists=2, users=3, batches=20, max_lines=10,
+                     stdout=StringIO())
+
+    def test_seed_is_repeatable_and_consistent(self):
+        self._seed()
+        self._seed()
+        self.assertEqual(Cheese.objects.count(), 120)
+        names = list(CheeseType.objects.values_list("name", flat=True))
+        self.assertEqual(len(names), 6)
+        self.assertEqual(len(set(names)), 6)
+        self.assertEqual(PriceList.objects.count(), 4)
+        self.assertEqual(User.objects.filter(role="sales_manager").count(), 6)
+        self.assertEqual(Batch.objects.count(), 40)
+        self.assertTrue(PriceTier.objects.filter(price_list=None).exists())
+        self.assertTrue(Batch.objects.exclude(price_list=None).exists())
+        out = StringIO()
+        call_command("check_batch_totals", stdout=out, stderr=StringIO())
+        self.assertIn("с расхождениями: 0", out.getvalue())
+
+    def test_benchmark_writes_json_and_compares(self):
+        self._seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "views.json")
+            call_command("benchmark_views", requests=2, warmup=0,
+                         output=path, stdout=StringIO())
+            with open(path, encoding="utf-8") as stream:
+                data = json.load(stream)
+            out = StringIO()
+            call_command("benchmark_views", requests=1, warmup=0,
+                         scenario=["batch_"], baseline=path,
+                         output=os.path.join(directory, "new.json"),
+                         stdout=out)
+
+        scenarios = data["scenarios"]
+        # Каждая сортировка (и сортировка по умолчанию) с каждым фильтром
+        catalog = [name for name in scenarios
+                   if name.startswith("cheese_list:")]
+        self.assertEqual(len(catalog), (len(CATALOG_SORT_OPTIONS) + 1) * 5)
+        for name in ["cheese_detail", "batch_list", "batch_detail",
+                     "batch_add_item"]:
+            self.assertEqual(scenarios[name]["count"], 2)
+            self.assertEqual(scenarios[name]["errors"], 0)
+            self.assertIsInstance(scenarios[name]["queries"], int)
+        self.assertEqual(data["meta"]["rows"]["cheeses"], 60)
+        self.assertIn("batch_detail: p50", out.getvalue())
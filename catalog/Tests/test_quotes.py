@@ -0,0 +1,140 @@
+import csv
+import io
+import random
+from decimal import Decimal
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Batch, Cheese, CheeseType, PriceList, PriceTier
+from catalog.pricing import discount_percent
+from catalog.quotes import QUOTES_AVAILABLE, QuoteTable, quote_chunks
+
+User = get_user_model()
+
+
+@skipIf(not QUOTES_AVAILABLE, "numpy не установлен")
+class TestQuoteTable(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username="manager", password="pass", role="sales_manager")
+        self.cheese_type = CheeseType.objects.create(name="Твердый")
+        self.price_list = PriceList.objects.create(name="Ресторан")
+        rng = random.Random(0)
+        cheeses = []
+        for index in range(30):
+            price = Decimal(rng.randint(0, 99999)).scaleb(-2)
+            tiers = {}
+            if index % 3:
+                tiers = {"price_small_opt": price * Decimal("0.93"),
+                         "min_qty_small_opt": rng.randint(1, 20),
+                         "price_big_opt": price * Decimal("0.81"),
+                         "min_qty_big_opt": rng.randint(10, 60)}
+            cheeses.append(Cheese.objects.create(
+                name=f"Сыр {index}", price=price, weight=1,
+                cheese_type=self.cheese_type, production_date="2024-01-01",
+                **{field: Decimal(value).quantize(Decimal("0.01"))
+                   if field.startswith("price") else value
+                   for field, value in tiers.items()}))
+        # Уровни прайс-листа, в том числе дороже базовой цены
+        for cheese in cheeses[::2]:
+            for min_qty in rng.sample(range(5, 120), 3):
+                PriceTier.objects.create(
+                    cheese=cheese, price_list=self.price_list,
+                    min_qty=min_qty,
+                    price=Decimal(rng.randint(1, 120000)).scaleb(-2))
+        self.cheeses = Cheese.objects.order_by("id")
+
+    def assert_matches_decimal(self, price_list):
+        batch = Batch.objects.create(manager=self.manager,
+                                     price_list=price_list)
+        tiers = PriceTier.objects.for_batch(batch.id)
+        quantities = range(1, 151)
+        table = QuoteTable(self.cheeses,
+                           price_list.id if price_list else None)
+        quote = table.quote(quantities)
+        lines = [(cheese.id, quantity) for cheese in self.cheeses
+                 for quantity in quantities]
+        resolved = tiers.resolve(lines)
+        cheeses = self.cheeses.in_bulk()
+        for (cheese_id, quantity), line in zip(lines, quote.lines()):
+            cheese = cheeses[cheese_id]
+            tier = resolved[cheese_id, quantity]
+            unit_price = tier[1] if tier else cheese.price
+            expected = (cheese.sku, cheese.name, quantity,
+                        tier[0] if tier else None, unit_price,
+                        unit_price * quantity,
+                        discount_percent(cheese.price, unit_price))
+            self.assertEqual(line, expected)
+
+    def test_general_prices_match_decimal(self):
+        self.assert_matches_decimal(None)
+
+    def test_price_list_prices_match_decimal(self):
+        self.assert_matches_decimal(self.price_list)
+
+    def test_chunks_keep_catalog_order(self):
+        cheeses = self.cheeses.order_by("-price", "id")
+        quotes = list(quote_chunks(cheeses, range(1, 11), size=7))
+        self.assertEqual([len(quote.table) for quote in quotes],
+                         [7, 7, 7, 7, 2])
+        whole = QuoteTable(cheeses).quote(range(1, 11))
+        self.assertEqual(
+            [line for quote in quotes for line in quote.lines()],
+            list(whole.lines()))
+
+    def test_two_queries_for_whole_catalog(self):
+        with self.assertNumQueries(2):
+            quote = QuoteTable(self.cheeses).quote(range(1, 1001))
+        self.assertEqual(quote.unit.shape, (30, 1000))
+
+
+@skipIf(not QUOTES_AVAILABLE, "numpy не установлен")
+class TestQuoteSimulationView(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="manager", password="pass",
+                                 role="sales_manager")
+        User.objects.create_user(username="buyer", password="pass",
+                                 role="guest")
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        Cheese.objects.create(
+            sku="Q-1", name="Гауда", price=100, weight=1,
+            cheese_type=cheese_type, production_date="2024-01-01",
+            price_small_opt=90, min_qty_small_opt=10, price_big_opt=80,
+            min_qty_big_opt=50)
+
+    def test_only_managers(self):
+        self.client.login(username="buyer", password="pass")
+        response = self.client.get(reverse("quote_simulation"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_page_shows_discount_curve(self):
+        self.client.login(username="manager", password="pass")
+        response = self.client.get(reverse("quote_simulation"),
+                                   {"max_qty": 100, "step": 1})
+        curve = response.context["curves"][0]
+        self.assertEqual([line[2:5] for line in curve],
+                         [(1, None, Decimal("100.00")),
+                          (10, 10, Decimal("90.00")),
+                          (50, 50, Decimal("80.00"))])
+        self.assertContains(response, "20.00%")
+
+    def test_csv_has_whole_grid(self):
+        self.client.login(username="manager", password="pass")
+        response = self.client.get(reverse("quote_simulation"),
+                                   {"max_qty": 60, "step": 5,
+                                    "format": "csv"})
+        rows = list(csv.reader(io.StringIO(
+            b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1 + 12)
+        self.assertEqual(rows[2], ["Q-1", "Гауда", "10", "10", "90.00",
+                                   "900.00", "10.00"])
+
+    def test_invalid_range(self):
+        self.client.login(username="manager", password="pass")
+        response = self.client.get(reverse("quote_simulation"),
+                                   {"max_qty": 100000, "step": 1})
+        self.assertNotIn("curves", response.context)
+        self.assertContains(response, "увеличьте шаг")
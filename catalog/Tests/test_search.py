@@ -0,0 +1,86 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Cheese, CheeseType
+from catalog.search import search_cheeses, suggest_cheeses
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 есть только в SQLite")
+class TestCheeseSearch(TestCase):
+    def setUp(self):
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        for name in ["Пармезан", "Бри с пармезаном", "Гауда", "Эдам"]:
+            Cheese.objects.create(
+                name=name,
+                price=100,
+                weight=1,
+                cheese_type=cheese_type,
+                production_date="2024-01-01",
+            )
+
+    def _search(self, query):
+        cheeses, ranked = search_cheeses(Cheese.objects.all(), query)
+        return {cheese.name for cheese in cheeses}, ranked
+
+    def test_substring_is_case_insensitive(self):
+        names, ranked = self._search("ПАРМЕЗ")
+        self.assertTrue(ranked)
+        self.assertEqual(names, {"Пармезан", "Бри с пармезаном"})
+
+    def test_short_query_falls_back_to_icontains(self):
+        names, ranked = self._search("уд")
+        self.assertFalse(ranked)
+        self.assertEqual(names, {"Гауда"})
+
+    def test_short_prefix_uses_name_index(self):
+        Cheese.objects.create(name="эдамер", price=100, weight=1,
+                              cheese_type=CheeseType.objects.get(),
+                              production_date="2024-01-01")
+        suggestions = suggest_cheeses(Cheese.objects.all(), "эД", 10)
+        self.assertEqual([cheese.name for cheese in suggestions],
+                         ["Эдам", "эдамер"])
+        plan = suggestions.explain()
+        self.assertIn("cheese_name_idx", plan)
+        self.assertNotIn("SCAN catalog_cheese", plan)
+
+    def test_quotes_in_query_are_escaped(self):
+        names, _ = self._search('"Гауда" OR')
+        self.assertEqual(names, set())
+
+    def test_index_follows_updates_and_deletes(self):
+        cheese = Cheese.objects.get(name="Гауда")
+        cheese.name = "Гауда выдержанная"
+        cheese.save()
+        self.assertEqual(self._search("выдерж")[0], {"Гауда выдержанная"})
+
+        cheese.delete()
+        self.assertEqual(self._search("Гауда")[0], set())
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO catalog_cheese_fts(catalog_cheese_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(self._search("Эдам")[0], set())
+
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self._search("Эдам")[0], {"Эдам"})
+
+    @override_settings(CATALOG_PAGE_SIZE=1)
+    def test_cheese_list_pages_by_relevance(self):
+        url = reverse("cheese_list")
+        response = self.client.get(url, {"q": "пармезан"})
+        first = [cheese.name for cheese in response.context["cheeses"]]
+        self.assertEqual(first, ["Пармезан"])
+
+        cursor = response.context["page"].next_cursor
+        response = self.client.get(url, {"q": "пармезан", "cursor": cursor})
+        second = [cheese.name for cheese in response.context["cheeses"]]
+        self.assertEqual(second, ["Бри с пармезаном"])
+        self.assertFalse(response.context["page"].has_next())
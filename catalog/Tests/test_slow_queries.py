@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import slow_queries
+from catalog.models import Cheese
+from catalog.slow_queries import explain, fingerprint
+from catalog.Tests.base import CatalogTestCase, middleware_first
+
+SLOW_QUERY_MIDDLEWARE = middleware_first(
+    "catalog.slow_queries.SlowQueryMiddleware")
+
+
+def _records(logs):
+    return [json.loads(record.getMessage()) for record in logs.records]
+
+
+def _is_page_query(record):
+    """Запрос страницы каталога (а не сессии, счётчиков или типов)"""
+    return ('FROM "catalog_cheese"' in record["sql"]
+            and "ORDER BY" in record["sql"])
+
+
+class TestFingerprint(TestCase):
+    def test_literals_and_lists_are_normalized(self):
+        first, sql = fingerprint(
+            'SELECT "id" FROM "cheese" WHERE "id" IN (%s, %s, %s)\n'
+            "  AND \"name\" = 'Бри' LIMIT 51")
+        second, _ = fingerprint(
+            'SELECT "id" FROM "cheese" WHERE "id" IN (%s) '
+            "AND \"name\" = 'Д''Артаньян' LIMIT 21")
+        self.assertEqual(first, second)
+        self.assertEqual(sql, 'SELECT "id" FROM "cheese" WHERE "id" IN '
+                              '(...) AND "name" = ? LIMIT ?')
+        other, _ = fingerprint('SELECT "id" FROM "cheese" LIMIT 51')
+        self.assertNotEqual(first, other)
+
+
+@override_settings(MIDDLEWARE=SLOW_QUERY_MIDDLEWARE,
+                   SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN=True)
+class TestSlowQueryLog(CatalogTestCase):
+    def setUp(self):
+        slow_queries._explained.clear()
+        super().setUp()
+        self.client.force_login(self.manager)
+
+    def cheese_data(self, index):
+        return {**super().cheese_data(index), "name": f"Бри {index}",
+                "weight": index + 1}
+
+    def test_query_is_logged_with_page_params_and_plan(self):
+        with self.assertLogs("catalog.slow_queries", "INFO") as logs:
+            response = self.client.get(reverse("cheese_list"), {
+                "q": "бри", "order_by": "weight"})
+        self.assertEqual(response.status_code, 200)
+
+        record = next(filter(_is_page_query, _records(logs)))
+        self.assertEqual(record["url_name"], "cheese_list")
+        self.assertEqual(record["params"], {"q": "бри",
+                                            "order_by": "weight"})
+        self.assertEqual(record["fingerprint"],
+                         fingerprint(record["sql"])[0])
+        self.assertGreaterEqual(record["duration_ms"], 0)
+        self.assertTrue(record["plan"])
+
+    def test_plan_is_taken_once_per_fingerprint(self):
+        url = reverse("cheese_list") + "?order_by=weight"
+        with self.assertLogs("catalog.slow_queries", "INFO") as logs:
+            self.client.get(url)
+            self.client.get(url)
+        plans = [record["plan"] for record in _records(logs)
+                 if _is_page_query(record)]
+        self.assertEqual(len(plans), 2)
+        self.assertTrue(plans[0])
+        self.assertIsNone(plans[1])
+
+    def test_failed_explain_keeps_transaction(self):
+        with self.assertLogs("catalog.slow_queries", "WARNING"):
+            self.assertIsNone(explain(
+                connection, 'SELECT * FROM "no_such_table"', []))
+        # Транзакция теста не прервана (PostgreSQL)
+        self.assertEqual(Cheese.objects.count(), 3)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=60_000)
+    def test_fast_queries_are_not_logged(self):
+        with self.assertNoLogs("catalog.slow_queries", "INFO"):
+            self.client.get(reverse("cheese_list"))
+
+    async def test_async_requests(self):
+        with self.assertLogs("catalog.slow_queries", "INFO") as logs:
+            response = await self.async_client.get(reverse("cheese_list"),
+                                                   {"order_by": "price"})
+        self.assertEqual(response.status_code, 200)
+        record = next(filter(_is_page_query, _records(logs)))
+        self.assertEqual(record["params"], {"order_by": "price"})
+
+
+class TestSlowQueriesCommand(TestCase):
+    def _record(self, digest, duration, url_name="cheese_list", plan=None,
+                **params):
+        return {"fingerprint": digest, "sql": f"SELECT {digest}",
+                "duration_ms": duration, "url_name": url_name,
+                "method": "GET", "path": "/", "params": params,
+                "plan": plan}
+
+    def test_fingerprints_are_ordered_by_total_time(self):
+        records = [
+            self._record("aaa", 150, plan=["SCAN cheese"], q="бри"),
+            self._record("aaa", 400, q="сыр", order_by="weight"),
+            self._record("bbb", 300, url_name="api_cheeses"),
+            self._record("ccc", 200),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "slow.jsonl")
+            with open(path, "w", encoding="utf-8") as stream:
+                for record in records:
+                    stream.write(json.dumps(record, ensure_ascii=False)
+                                 + "\n")
+                stream.write("{обрезанная строка\n")
+            out, err = StringIO(), StringIO()
+            call_command("slow_queries", path, "--top", "2", "--plans",
+                         stdout=out, stderr=err)
+            output = out.getvalue()
+
+            self.assertIn("Медленных запросов: 4, отпечатков: 3", output)
+            self.assertIn("1. aaa: 550.0 мс (52%), 2 раз", output)
+            self.assertIn("Самый медленный: /?q=%D1%81%D1%8B%D1%80"
+                          "&order_by=weight", output)
+            # План - от самой медленной записи, у которой он снят
+            self.assertIn("SCAN cheese", output)
+            self.assertIn("2. bbb", output)
+            self.assertNotIn("ccc", output)
+            self.assertIn("испорченных строк: 1", err.getvalue())
+
+            out = StringIO()
+            call_command("slow_queries", path, "--url-name", "api_cheeses",
+                         stdout=out, stderr=StringIO())
+            self.assertIn("1. bbb: 300.0 мс (100%)", out.getvalue())
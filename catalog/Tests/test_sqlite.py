@@ -0,0 +1,72 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from catalog.models import Batch, BatchItem, Cheese, CheeseType, User
+
+
+@skipUnless(connection.vendor == "sqlite", "Настройки только для SQLite")
+class TestSQLiteTuning(TransactionTestCase):
+    # Данные коммитятся, поэтому их видит соединение catalog_ro
+    databases = {"default", settings.CATALOG_READ_DATABASE}
+
+    def setUp(self):
+        cheese_type = CheeseType.objects.create(name="Твердый")
+        self.cheese = Cheese.objects.create(
+            name="Чеддер",
+            price=100,
+            weight=1,
+            cheese_type=cheese_type,
+            production_date="2024-01-01",
+        )
+
+    def test_pragmas_applied_to_every_connection(self):
+        pragmas = settings.SQLITE_PRAGMAS
+        if not pragmas:
+            self.skipTest("SQLITE_TUNING=0")
+        for alias in ["default", "catalog_ro"]:
+            with self.subTest(alias=alias):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertEqual(cursor.fetchone()[0],
+                                     pragmas["busy_timeout"])
+                    cursor.execute("PRAGMA temp_store")
+                    self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_catalog_reads_use_read_only_alias(self):
+        self.assertEqual(Cheese.objects.all().db, "catalog_ro")
+        # Внутри транзакции читаем свои же изменения из default
+        with transaction.atomic():
+            self.assertEqual(Cheese.objects.all().db, "default")
+        # Прочие модели и запись остаются в default
+        self.assertEqual(Batch.objects.all().db, "default")
+
+        response = self.client.get(reverse("cheese_list"))
+        self.assertContains(response, "Чеддер")
+
+    def test_read_only_alias_rejects_writes(self):
+        with self.assertRaises(OperationalError):
+            with connections["catalog_ro"].cursor() as cursor:
+                cursor.execute("DELETE FROM catalog_cheese")
+
+    def test_cheese_read_from_replica_is_saved_to_default(self):
+        cheese = Cheese.objects.get(id=self.cheese.id)
+        cheese.name = "Гауда"
+        cheese.save()
+        self.assertTrue(Cheese.objects.filter(name="Гауда").exists())
+
+    def test_concurrency_benchmark_leaves_database_untouched(self):
+        manager = User.objects.create_user(username="manager",
+                                           password="password")
+        batch = Batch.objects.create(manager=manager)
+        BatchItem.objects.create(batch=batch, cheese=self.cheese, quantity=1)
+        out = StringIO()
+        call_command("benchmark_sqlite_concurrency", readers=2,
+                     duration=0.2, stdout=out, stderr=StringIO())
+        self.assertIn("Чтения:", out.getvalue())
+        self.assertEqual(BatchItem.objects.count(), 1)
@@ -1,13 +1,27 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import Cheese, CheeseType, User
+from .models import Cheese, CheeseType, PriceList, PriceTier, User
 
 
 admin.site.register(Cheese)
 admin.site.register(CheeseType)
 
 
+class PriceTierInline(admin.TabularInline):
+    model = PriceTier
+    raw_id_fields = ["cheese"]
+    extra = 1
+
+
+@admin.register(PriceList)
+class PriceListAdmin(admin.ModelAdmin):
+    # Общие уровни задаются полями опта у сыра, здесь - только уровни
+    # прайс-листов покупателей, сколько угодно на сыр
+    inlines = [PriceTierInline]
+    search_fields = ["name"]
+
+
 class UserAdmin(BaseUserAdmin):
     # Добавляем поле role в форму редактирования
     fieldsets = BaseUserAdmin.fieldsets + ((None, {"fields": ("role",)}),)
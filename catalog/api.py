@@ -0,0 +1,478 @@
+"""JSON API каталога и партий (для кассовых терминалов и сканеров).
+
+Ответы собираются прямо из .values() - без экземпляров моделей - и
+кодируются orjson, если он установлен (иначе стандартным json).
+Права те же, что у страниц: role_required для изменения каталога,
+владелец партии или администратор для партий. Списки отдаются по
+курсору (KeysetPaginator), а ?fields=id,name,price оставляет в
+ответе только нужные поля. Анонимные ответы списка сыров кэшируются
+по версии каталога, как страницы сайта. Итоги партий хранятся в
+самих партиях, цены позиций - снимки на момент добавления; суммы
+позиций считаются в SQL (with_prices).
+
+Авторизация - сессией, как у сайта; для POST, PATCH и DELETE нужен
+заголовок X-CSRFToken со значением cookie csrftoken.
+"""
+
+import json
+from decimal import Decimal
+from functools import wraps
+
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.forms.models import model_to_dict
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+
+from .batch_items import update_batch_items
+from .cache import api_cheese_list_key, cache_anonymous_page
+from .decorators import role_required
+from .filters import catalog_list_params
+from .forms import CheeseForm
+from .models import (Batch, BatchItem, Cheese, CheeseType, PriceList,
+                     PriceTier)
+from .pagination import KeysetPaginator
+from .search import search_cheeses, suggest_cheeses
+from .sorting import resolve_sort
+
+try:
+    import orjson
+except ImportError:  # необязателен: без него медленнее, но работает
+    orjson = None
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Подсказок в ответе cheese_suggestions: по умолчанию и не больше
+SUGGEST_SIZE = 10
+MAX_SUGGEST_SIZE = 50
+
+# Поле ответа -> путь ORM для .values()
+CHEESE_FIELDS = {
+    "id": "id",
+    "sku": "sku",
+    "name": "name",
+    "price": "price",
+    "price_small_opt": "price_small_opt",
+    "min_qty_small_opt": "min_qty_small_opt",
+    "price_big_opt": "price_big_opt",
+    "min_qty_big_opt": "min_qty_big_opt",
+    "weight": "weight",
+    "cheese_type_id": "cheese_type_id",
+    "cheese_type_name": "cheese_type__name",
+    "in_stock": "in_stock",
+    "production_date": "production_date",
+    "updated_at": "updated_at",
+}
+# Без ?fields= в списке сыров: без JOIN с типом и без дат, разбор
+# которых из ответа базы - самая дорогая часть строки
+CHEESE_LIST_FIELDS = [
+    "id", "sku", "name", "price", "price_small_opt", "min_qty_small_opt",
+    "price_big_opt", "min_qty_big_opt", "weight", "cheese_type_id",
+    "in_stock",
+]
+CHEESE_TYPE_FIELDS = {"id": "id", "name": "name"}
+BATCH_FIELDS = {
+    "id": "id",
+    "manager_id": "manager_id",
+    "created_at": "created_at",
+    "price_list_id": "price_list_id",
+    "total_base_price": "total_base",
+    "total_price": "total_price",
+    "discount_percent": "discount_percent",
+}
+BATCH_ITEM_FIELDS = {
+    "id": "id",
+    "cheese_id": "cheese_id",
+    "sku": "cheese__sku",
+    "name": "cheese__name",
+    "quantity": "quantity",
+    "tier_min_qty": "tier_min_qty",
+    "base_price": "base_price",
+    "unit_price": "unit_price",
+    "discount_percent": "line_discount_percent",
+    "total_base_price": "line_base_total",
+    "total_price": "line_total",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+
+def _decimal(value):
+    # Decimal отдаётся строкой, чтобы не терять копейки во float. Все
+    # десятичные поля здесь с двумя знаками, а SQLite не округляет
+    # результаты выражений (суммы, скидки) - округляем при выводе
+    if isinstance(value, Decimal):
+        return f"{value:.2f}"
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+class _JSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return _decimal(o)
+        return super().default(o)
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_decimal)
+    return json.dumps(data, cls=_JSONEncoder, ensure_ascii=False).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status,
+                        content_type="application/json")
+
+
+def api_view(*methods):
+    """Допустимые методы и ошибки в JSON вместо HTML-страниц"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in methods:
+                response = json_response(
+                    {"error": "Метод не поддерживается"}, status=405)
+                response["Allow"] = ", ".join(methods)
+                return response
+            try:
+                return view_func(request, *args, **kwargs)
+            except PermissionDenied as error:
+                return json_response(
+                    {"error": str(error) or "Доступ запрещён"}, status=403)
+            except Http404:
+                return json_response({"error": "Не найдено"}, status=404)
+            except ApiError as error:
+                data = {"error": str(error)}
+                if error.errors:
+                    data["errors"] = error.errors
+                return json_response(data, status=error.status)
+
+        return _wrapped_view
+
+    return decorator
+
+
+def _login_required(request):
+    if not request.user.is_authenticated:
+        raise PermissionDenied("Требуется авторизация")
+
+
+def _check_batch_owner(request, batch):
+    if batch.manager_id != request.user.id and request.user.role != "admin":
+        raise PermissionDenied("Нет доступа к чужой партии")
+
+
+def _read_body(request):
+    try:
+        data = (orjson.loads(request.body) if orjson is not None
+                else json.loads(request.body))
+    except ValueError:
+        raise ApiError("Тело запроса не является JSON")
+    if not isinstance(data, dict):
+        raise ApiError("Ожидается объект JSON")
+    return data
+
+
+def _selected_fields(request, available, default=None):
+    """Поля ответа по параметру ?fields= (по умолчанию - default или все)"""
+    fields = request.GET.get("fields")
+    if not fields:
+        return list(default or available)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return names
+
+
+def _values(queryset, mapping, names, extra=()):
+    """queryset.values() с полями ответа names.
+
+    Поля, чьё имя совпадает с путём ORM, передаются как есть, а
+    переименованные - через F(); extra - дополнительные столбцы
+    (например, поля сортировки для курсора).
+    """
+    plain = [name for name in names if mapping[name] == name]
+    renamed = {name: F(mapping[name]) for name in names
+               if mapping[name] != name}
+    return queryset.values(*plain, *extra, **renamed)
+
+
+def _page_size(request, default=PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    limit = request.GET.get("limit", "")
+    if not limit:
+        return default
+    if not limit.isdigit() or not 0 < int(limit) <= maximum:
+        raise ApiError(f"limit - число от 1 до {maximum}")
+    return int(limit)
+
+
+def _paginated(request, queryset, mapping, ordering, default=None):
+    """Страница .values() по курсору в формате ответа API.
+
+    Поля сортировки нужны для курсора: если их не запросили, они
+    читаются из базы, но из ответа убираются.
+    """
+    names = _selected_fields(request, mapping, default)
+    extra = [field.lstrip("-") for field in ordering
+             if field.lstrip("-") not in names]
+    queryset = _values(queryset, mapping, names, extra)
+    paginator = KeysetPaginator(queryset, ordering,
+                                per_page=_page_size(request))
+    page = paginator.page(request.GET.get("cursor"))
+    rows = page.object_list
+    if extra:
+        rows = [{name: row[name] for name in names} for row in rows]
+    return {"results": rows, "next": page.next_cursor,
+            "previous": page.previous_cursor}
+
+
+def _form_errors(form):
+    return {field: list(messages) for field, messages in form.errors.items()}
+
+
+# Сыры и типы
+
+
+@api_view("GET", "POST")
+def cheeses(request):
+    if request.method == "POST":
+        return _cheese_create(request)
+    return _cheese_list(request)
+
+
+@cache_anonymous_page(api_cheese_list_key)
+def _cheese_list(request):
+    params = catalog_list_params(request.GET)
+    queryset = Cheese.objects.all()
+    ranked = False
+    if params["q"]:
+        queryset, ranked = search_cheeses(queryset, params["q"])
+    if params["type"]:
+        queryset = queryset.filter(cheese_type_id=params["type"])
+    if params["in_stock"]:
+        queryset = queryset.filter(in_stock=params["in_stock"] == "true")
+
+    sort = resolve_sort(params["order_by"], ranked)
+    return json_response(
+        _paginated(request, queryset, CHEESE_FIELDS, sort.ordering,
+                   default=CHEESE_LIST_FIELDS))
+
+
+def _cheese_detail_data(cheese_id):
+    row = _values(Cheese.objects.filter(id=cheese_id), CHEESE_FIELDS,
+                  CHEESE_FIELDS).first()
+    if row is None:
+        raise Http404
+    return row
+
+
+@role_required(["admin"])
+def _cheese_create(request):
+    form = CheeseForm(_read_body(request))
+    if not form.is_valid():
+        raise ApiError("Ошибки в данных сыра", errors=_form_errors(form))
+    cheese = form.save()
+    return json_response(_cheese_detail_data(cheese.id), status=201)
+
+
+@api_view("GET", "PATCH", "PUT", "DELETE")
+def cheese_detail(request, cheese_id):
+    if request.method in ("PATCH", "PUT"):
+        return _cheese_update(request, cheese_id)
+    if request.method == "DELETE":
+        return _cheese_delete(request, cheese_id)
+    return json_response(_cheese_detail_data(cheese_id))
+
+
+@role_required(["admin", "product_manager"])
+def _cheese_update(request, cheese_id):
+    cheese = get_object_or_404(Cheese, id=cheese_id)
+    data = _read_body(request)
+    if request.method == "PATCH":
+        # Недостающие поля берутся из текущего сыра
+        data = {**model_to_dict(cheese, fields=CheeseForm.Meta.fields),
+                **data}
+    form = CheeseForm(data, instance=cheese)
+    if not form.is_valid():
+        raise ApiError("Ошибки в данных сыра", errors=_form_errors(form))
+    form.save()
+    return json_response(_cheese_detail_data(cheese.id))
+
+
+@role_required(["admin"])
+def _cheese_delete(request, cheese_id):
+    get_object_or_404(Cheese, id=cheese_id).delete()
+    return HttpResponse(status=204)
+
+
+@api_view("GET")
+def cheese_suggestions(request):
+    """Подсказки для выбора сыра: первые совпадения в наличии.
+
+    ?q= - часть названия, ?limit= - число подсказок, ?batch= - партия,
+    чей прайс-лист учитывается в уровнях. Два запроса (сыры и уровни)
+    при любом размере каталога.
+    """
+    _login_required(request)
+    query = request.GET.get("q", "").strip()
+    limit = _page_size(request, SUGGEST_SIZE, MAX_SUGGEST_SIZE)
+    price_list_id = None
+    batch_id = request.GET.get("batch", "")
+    if batch_id:
+        if not batch_id.isdigit():
+            raise ApiError("batch - номер партии")
+        price_list_id = _get_batch(request, int(batch_id)).price_list_id
+    if not query:
+        return json_response({"results": []})
+
+    rows = list(suggest_cheeses(Cheese.objects.filter(in_stock=True), query,
+                                limit).values("id", "sku", "name", "price"))
+    ladders = PriceTier.objects.ladders([row["id"] for row in rows],
+                                        price_list_id)
+    for row in rows:
+        row["tiers"] = [{"min_qty": min_qty, "price": price}
+                        for min_qty, price in ladders.get(row["id"], [])]
+    return json_response({"results": rows})
+
+
+@api_view("GET")
+def cheese_types(request):
+    return json_response(_paginated(request, CheeseType.objects.all(),
+                                    CHEESE_TYPE_FIELDS, ("name", "id")))
+
+
+# Партии
+
+
+@api_view("GET", "POST")
+def batches(request):
+    _login_required(request)
+    if request.method == "POST":
+        # Тело необязательно: {"price_list_id": id} - прайс-лист партии
+        price_list_id = (
+            _read_body(request).get("price_list_id")
+            if request.content_type == "application/json" else None)
+        if price_list_id is not None and not (
+                _is_int(price_list_id)
+                and PriceList.objects.filter(id=price_list_id).exists()):
+            raise ApiError("Неизвестный прайс-лист",
+                           errors={"price_list_id": [str(price_list_id)]})
+        batch = Batch.objects.create(manager=request.user,
+                                     price_list_id=price_list_id)
+        return json_response(_batch_data(batch.id), status=201)
+    queryset = Batch.objects.filter(manager=request.user)
+    return json_response(_paginated(request, queryset, BATCH_FIELDS,
+                                    ("-created_at", "-id")))
+
+
+def _batch_data(batch_id):
+    """Партия с итогами и позициями: два запроса при любом числе строк"""
+    batch = _values(Batch.objects.filter(id=batch_id), BATCH_FIELDS,
+                    BATCH_FIELDS).first()
+    items = BatchItem.objects.filter(batch_id=batch_id).with_prices()
+    batch["items"] = list(_values(items.order_by("id"), BATCH_ITEM_FIELDS,
+                                  BATCH_ITEM_FIELDS))
+    return batch
+
+
+def _get_batch(request, batch_id):
+    _login_required(request)
+    batch = get_object_or_404(
+        Batch.objects.only("id", "manager_id", "price_list_id"), id=batch_id)
+    _check_batch_owner(request, batch)
+    return batch
+
+
+@api_view("GET", "DELETE")
+def batch_detail(request, batch_id):
+    batch = _get_batch(request, batch_id)
+    if request.method == "DELETE":
+        batch.delete()
+        return HttpResponse(status=204)
+    return json_response(_batch_data(batch.id))
+
+
+@api_view("POST")
+def batch_reprice(request, batch_id):
+    """Пересчитывает позиции партии по текущим ценам сыров"""
+    batch = _get_batch(request, batch_id)
+    batch.reprice()
+    return json_response(_batch_data(batch.id))
+
+
+def _is_int(value):
+    # bool - подкласс int: JSON true не должен проходить как 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse_items(items):
+    """[{"sku" или "cheese_id", "quantity"}] -> {id сыра: количество}"""
+    if not isinstance(items, list) or not items:
+        raise ApiError("items - непустой список позиций")
+    errors, parsed = {}, []
+    for index, item in enumerate(items):
+        quantity = item.get("quantity") if isinstance(item, dict) else None
+        if not _is_int(quantity) or quantity < 1:
+            errors[str(index)] = ["quantity - целое число больше нуля"]
+            continue
+        if _is_int(item.get("cheese_id")):
+            parsed.append((index, "id", item["cheese_id"], quantity))
+        elif isinstance(item.get("sku"), str):
+            parsed.append((index, "sku", item["sku"], quantity))
+        else:
+            errors[str(index)] = ["Нужен sku или cheese_id"]
+
+    # Все сыры - одним запросом
+    ids = {key for _, kind, key, _ in parsed if kind == "id"}
+    skus = {key for _, kind, key, _ in parsed if kind == "sku"}
+    known = {("id", cheese_id): cheese_id for cheese_id in
+             Cheese.objects.filter(id__in=ids).values_list("id", flat=True)}
+    known.update(
+        (("sku", sku), cheese_id) for sku, cheese_id in
+        Cheese.objects.filter(sku__in=skus).values_list("sku", "id"))
+
+    quantities = {}
+    for index, kind, key, quantity in parsed:
+        cheese_id = known.get((kind, key))
+        if cheese_id is None:
+            errors[str(index)] = [f"Неизвестный сыр: {key}"]
+            continue
+        quantities[cheese_id] = quantities.get(cheese_id, 0) + quantity
+    if errors:
+        raise ApiError("Ошибки в позициях", errors=errors)
+    return quantities
+
+
+@api_view("POST")
+def batch_items(request, batch_id):
+    """Добавляет позиции; тот же сыр увеличивает количество позиции"""
+    batch = _get_batch(request, batch_id)
+    added = _parse_items(_read_body(request).get("items"))
+    update_batch_items(batch, added=added)
+    return json_response(_batch_data(batch.id))
+
+
+@api_view("PATCH", "DELETE")
+def batch_item_detail(request, item_id):
+    _login_required(request)
+    item = get_object_or_404(
+        BatchItem.objects.select_related("batch").only(
+            "id", "quantity", "batch__id", "batch__manager_id"),
+        id=item_id)
+    _check_batch_owner(request, item.batch)
+    if request.method == "DELETE":
+        update_batch_items(item.batch, deleted=[item.id])
+        return HttpResponse(status=204)
+
+    quantity = _read_body(request).get("quantity")
+    if not _is_int(quantity) or quantity < 1:
+        raise ApiError("quantity - целое число больше нуля")
+    update_batch_items(item.batch, quantities={item.id: quantity})
+    return json_response(_batch_data(item.batch.id))
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalog"
+
+    def ready(self):
+        from . import signals, sorting  # noqa: F401 (регистрация)
+        from .search import install_search_index_after_migrate
+
+        # Поисковый индекс и его триггеры живут вне моделей Django
+        post_migrate.connect(install_search_index_after_migrate, sender=self)
@@ -0,0 +1,124 @@
+"""Асинхронные версии страниц каталога и партий.
+
+Подключаются вместо синхронных при CATALOG_ASYNC_VIEWS = True (см.
+urls.py) и рассчитаны на ASGI-сервер (uvicorn). Данные читаются
+асинхронным ORM и полностью загружаются до отрисовки, а шаблон
+рендерится в потоке: контекстный процессор auth обращается к
+request.user синхронно.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import aget_object_or_404, render
+
+from .cache import cache_anonymous_page, catalog_list_key, cheese_detail_key
+from .conditional import (async_condition, catalog_list_etag,
+                          catalog_list_last_modified, cheese_detail_etag,
+                          cheese_detail_last_modified)
+from .decorators import query_budget
+from .filters import catalog_link_params, catalog_list_params
+from .models import Batch, Cheese, CheeseType
+from .pagination import KeysetPaginator
+from .pricing import aprice_batch
+from .search import search_cheeses
+from .sorting import CATALOG_SORT_OPTIONS, resolve_sort
+
+
+async def arender(request, template_name, context):
+    # Пользователь уже загружен через auser(): отдаём его шаблону, чтобы
+    # синхронный request.user не читал сессию из базы второй раз
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@async_condition(etag_func=cheese_detail_etag,
+                 last_modified_func=cheese_detail_last_modified)
+@cache_anonymous_page(cheese_detail_key)
+@query_budget(3)
+async def cheese_detail(request, cheese_id):
+    cheese = await aget_object_or_404(
+        Cheese.objects.select_related("cheese_type"), id=cheese_id)
+    return await arender(request, "catalog/cheese_detail.html",
+                         {"cheese": cheese})
+
+
+@async_condition(etag_func=catalog_list_etag,
+                 last_modified_func=catalog_list_last_modified)
+@cache_anonymous_page(catalog_list_key)
+@query_budget(5)
+async def cheese_list(request):
+    params = catalog_list_params(request.GET)
+    query = params["q"]
+    cheese_type_id = params["type"]
+    in_stock = params["in_stock"]
+
+    cheeses = Cheese.objects.select_related("cheese_type")
+    cheese_types = [cheese_type
+                    async for cheese_type in CheeseType.objects.all()]
+
+    ranked = False
+    if query:
+        cheeses, ranked = search_cheeses(cheeses, query)
+
+    if cheese_type_id:
+        cheeses = cheeses.filter(cheese_type_id=cheese_type_id)
+
+    if in_stock == "true":
+        cheeses = cheeses.filter(in_stock=True)
+    elif in_stock == "false":
+        cheeses = cheeses.filter(in_stock=False)
+
+    sort = resolve_sort(params["order_by"], ranked)
+
+    paginator = KeysetPaginator(cheeses, sort.ordering,
+                                per_page=settings.CATALOG_PAGE_SIZE)
+    page = await paginator.apage(params["cursor"],
+                                 with_count=params["count"])
+
+    return await arender(
+        request,
+        "catalog/home.html",
+        {
+            "cheeses": page,
+            "page": page,
+            "cheese_types": cheese_types,
+            "selected_type": cheese_type_id,
+            "order_by": sort.key,
+            "sort_options": CATALOG_SORT_OPTIONS,
+            "query": query,
+            "in_stock": in_stock,
+            "link_params": catalog_link_params(params),
+        },
+    )
+
+
+@login_required
+@query_budget(1)
+async def batch_list(request):
+    user = await request.auser()
+    batches = [
+        batch async for batch in (
+            Batch.objects.filter(manager=user)
+            .select_related("manager")
+            .order_by("-created_at")
+        )
+    ]
+    return await arender(request, "catalog/batch_list.html",
+                         {"batches": batches})
+
+
+@login_required
+@query_budget(2)
+async def batch_detail(request, batch_id):
+    batch = await aget_object_or_404(
+        Batch.objects.select_related("manager", "price_list"), id=batch_id)
+    user = await request.auser()
+    if batch.manager_id != user.id and user.role != "admin":
+        raise PermissionDenied("Вы не можете просматривать чужие партии")
+    pricing = await aprice_batch(batch)
+    return await arender(
+        request, "catalog/batch_detail.html",
+        {"batch": batch, "pricing": pricing}
+    )
@@ -0,0 +1,73 @@
+"""Массовое изменение позиций партии.
+
+Все изменения сохраняются в одной транзакции: новые позиции через
+bulk_create, новые количества через bulk_update, удаление одним
+DELETE. Сыр, который уже есть в партии, не дублируется: количество
+прибавляется к его позиции. Новые и изменённые позиции получают
+снимок текущих цен (как в BatchItem.save()); оптовые уровни для них
+выбираются одним запросом. Итоги партии пересчитываются в той же
+транзакции.
+"""
+
+from django.db import transaction
+
+from .metrics import record_batch_lines
+from .models import Batch, BatchItem, Cheese, PriceTier
+
+
+def update_batch_items(batch, added=None, quantities=None, deleted=()):
+    """Применяет изменения к позициям партии.
+
+    added - {id сыра: добавляемое количество}, quantities - {id позиции:
+    новое количество}, deleted - id удаляемых позиций. Возвращает
+    (добавлено, изменено, удалено) позиций.
+    """
+    added = added or {}
+    quantities = quantities or {}
+    deleted = set(deleted)
+    with transaction.atomic():
+        # Блокировка партии: параллельное добавление того же сыра
+        # дождётся нас и найдёт уже созданную позицию
+        list(Batch.objects.select_for_update().filter(id=batch.id)
+             .values_list("id"))
+        items = (BatchItem.objects.filter(batch=batch)
+                 .select_related("cheese").order_by("id"))
+
+        by_cheese = {}
+        changed = {}
+        for item in items:
+            if item.id in deleted:
+                continue
+            by_cheese.setdefault(item.cheese_id, item)
+            quantity = quantities.get(item.id, item.quantity)
+            if quantity != item.quantity:
+                item.quantity = quantity
+                changed[item.id] = item
+
+        created = []
+        new_cheeses = Cheese.objects.in_bulk(
+            [cheese_id for cheese_id in added if cheese_id not in by_cheese])
+        for cheese_id, quantity in added.items():
+            item = by_cheese.get(cheese_id)
+            if item is None:
+                created.append(BatchItem(batch=batch,
+                                         cheese=new_cheeses[cheese_id],
+                                         quantity=quantity))
+            else:
+                item.quantity += quantity
+                changed[item.id] = item
+
+        priced = [*changed.values(), *created]
+        tiers = PriceTier.objects.for_batch(batch.id).resolve(
+            (item.cheese_id, item.quantity) for item in priced)
+        for item in priced:
+            item.snapshot_price(tiers[item.cheese_id, item.quantity])
+        if deleted:
+            BatchItem.objects.filter(batch=batch, id__in=deleted).delete()
+        BatchItem.objects.bulk_update(
+            changed.values(), ["quantity", *BatchItem.SNAPSHOT_FIELDS])
+        BatchItem.objects.bulk_create(created)
+        # bulk_create и bulk_update не вызывают save()
+        Batch.objects.filter(id=batch.id).refresh_totals()
+        record_batch_lines(len(created), len(changed), len(deleted))
+    return len(created), len(changed), len(deleted)
@@ -0,0 +1,77 @@
+"""Общие помощники для нагрузочных замеров.
+
+Каждый поток копит задержки в своём LatencyStats, а в конце замера
+они объединяются через merge(), так что блокировки не нужны.
+"""
+
+import math
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга; None для пустого списка"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class LatencyStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def add(self, seconds):
+        self.latencies.append(seconds)
+
+    def error(self):
+        self.errors += 1
+
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        self.errors += other.errors
+        return self
+
+    def summary(self, duration):
+        """Пропускная способность (операций в секунду) и задержки в мс"""
+        count = len(self.latencies)
+
+        def ms(value):
+            return None if value is None else value * 1000
+
+        return {
+            "count": count,
+            "errors": self.errors,
+            "per_second": count / duration if duration else 0.0,
+            "p50_ms": ms(percentile(self.latencies, 0.5)),
+            "p95_ms": ms(percentile(self.latencies, 0.95)),
+            "p99_ms": ms(percentile(self.latencies, 0.99)),
+            "max_ms": ms(max(self.latencies, default=None)),
+        }
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+@contextmanager
+def count_queries():
+    """Считает запросы во всех базах: каталог может читаться не из default.
+
+    Отдаёт функцию, возвращающую число запросов на текущий момент.
+    execute_wrapper, в отличие от CaptureQueriesContext, не открывает
+    соединений и не зависит от длины connection.queries.
+    """
+    executed = []
+
+    def counter(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield lambda: len(executed)
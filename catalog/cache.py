@@ -0,0 +1,134 @@
+"""Кэш публичных страниц каталога.
+
+Готовые страницы cheese_list, cheese_detail и about (и ответы списка
+сыров JSON API) хранятся в кэше
+Django (settings.CACHES) только для анонимных посетителей: вошедшие
+пользователи всегда получают свежие данные. Попадания и промахи
+считаются в метриках (catalog.metrics). Ключ списка содержит
+версию каталога из базы (CatalogVersion), а ключ страницы сыра - время
+изменения сыра и его типа, поэтому после изменения каталога старые
+ключи не используются ни одним процессом. Удалять их не нужно: у
+LocMemCache кэш свой в каждом воркере, и удаление в одном из них
+остальные не увидели бы.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from .filters import catalog_list_params
+from .metrics import record_cache
+from .models import CatalogVersion, Cheese
+
+
+def catalog_version(request):
+    """Текущая версия каталога; читается из базы один раз за запрос"""
+    if not hasattr(request, "_catalog_version"):
+        request._catalog_version = CatalogVersion.current()
+    return request._catalog_version
+
+
+def catalog_list_key(request):
+    params = sorted(catalog_list_params(request.GET).items())
+    digest = hashlib.md5(urlencode(params).encode()).hexdigest()
+    version = catalog_version(request).version
+    return f"catalog:list:{version}:{digest}"
+
+
+def api_cheese_list_key(request):
+    # В ответ API влияют и fields, limit, поэтому в ключе все параметры
+    params = sorted(request.GET.lists())
+    digest = hashlib.md5(urlencode(params, doseq=True).encode()).hexdigest()
+    version = catalog_version(request).version
+    return f"api:cheeses:{version}:{digest}"
+
+
+def cheese_timestamps(request, cheese_id):
+    """Время изменения сыра и его типа; None, если сыра нет.
+
+    Читается из базы один раз за запрос: по нему строятся и ключ кэша,
+    и ETag страницы сыра.
+    """
+    if not hasattr(request, "_cheese_timestamps"):
+        request._cheese_timestamps = (
+            Cheese.objects.filter(id=cheese_id)
+            .values_list("updated_at", "cheese_type__updated_at")
+            .first()
+        )
+    return request._cheese_timestamps
+
+
+def cheese_detail_key(request, cheese_id):
+    timestamps = cheese_timestamps(request, cheese_id)
+    stamp = max(timestamps).timestamp() if timestamps else "missing"
+    return f"catalog:cheese:{cheese_id}:{stamp}"
+
+
+def about_key(request):
+    return "catalog:about"
+
+
+def _cached_response(cached):
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_anonymous_page(key_func):
+    """Кэширует ответ представления для анонимных GET-запросов.
+
+    Работает и с асинхронными представлениями: тогда пользователь
+    берётся из request.auser(), а ключ, который читает версию каталога
+    из базы, вычисляется через sync_to_async.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                user = await request.auser()
+                if request.method != "GET" or user.is_authenticated:
+                    return await view_func(request, *args, **kwargs)
+
+                key = await sync_to_async(key_func)(request, *args, **kwargs)
+                cached = await cache.aget(key)
+                record_cache(view_func.__name__, cached is not None)
+                if cached is not None:
+                    return _cached_response(cached)
+
+                response = await view_func(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(
+                        key, (response.content, response["Content-Type"]),
+                        settings.CATALOG_CACHE_TIMEOUT)
+                return response
+
+            return _wrapped_view
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            key = key_func(request, *args, **kwargs)
+            cached = cache.get(key)
+            record_cache(view_func.__name__, cached is not None)
+            if cached is not None:
+                return _cached_response(cached)
+
+            response = view_func(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(key, (response.content, response["Content-Type"]),
+                          settings.CATALOG_CACHE_TIMEOUT)
+            return response
+
+        return _wrapped_view
+
+    return decorator
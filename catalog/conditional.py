@@ -0,0 +1,99 @@
+"""ETag и Last-Modified для страниц каталога.
+
+Функции используются с django.views.decorators.http.condition: если
+каталог не менялся, браузер (или nginx) получает 304 без отрисовки
+шаблона. Страница зависит и от пользователя (меню, кнопки, CSRF-токен
+формы выхода), поэтому в ETag входит сессия вошедшего пользователя,
+а в Last-Modified - время его входа.
+
+Для асинхронных представлений есть async_condition: встроенный
+condition вызывает эти функции прямо в цикле событий, а они читают
+базу синхронным ORM.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from .cache import catalog_version, cheese_timestamps
+from .filters import catalog_list_params
+
+
+def _user_marker(request):
+    if not request.user.is_authenticated:
+        return "anon"
+    session_key = request.session.session_key or ""
+    return hashlib.md5(
+        f"{request.user.pk}:{session_key}".encode()).hexdigest()[:16]
+
+
+def _with_login_time(request, last_modified):
+    last_login = getattr(request.user, "last_login", None)
+    if last_login is not None and last_login > last_modified:
+        return last_login
+    return last_modified
+
+
+def catalog_list_etag(request):
+    params = urlencode(sorted(catalog_list_params(request.GET).items()))
+    digest = hashlib.md5(params.encode()).hexdigest()[:16]
+    version = catalog_version(request).version
+    return f"catalog-{version}-{digest}-{_user_marker(request)}"
+
+
+def catalog_list_last_modified(request):
+    return _with_login_time(request, catalog_version(request).updated_at)
+
+
+def cheese_detail_etag(request, cheese_id):
+    timestamps = cheese_timestamps(request, cheese_id)
+    if timestamps is None:
+        return None
+    stamp = max(timestamps).timestamp()
+    return f"cheese-{cheese_id}-{stamp}-{_user_marker(request)}"
+
+
+def cheese_detail_last_modified(request, cheese_id):
+    timestamps = cheese_timestamps(request, cheese_id)
+    if timestamps is None:
+        return None
+    return _with_login_time(request, max(timestamps))
+
+
+class _Proceed(HttpResponse):
+    """Условия запроса выполнены, нужно вызвать само представление"""
+
+
+def _proceed(request, *args, **kwargs):
+    return _Proceed()
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    def decorator(view_func):
+        # Проверку (304/412 и заголовки) делает сам condition, но в потоке
+        precondition = sync_to_async(condition(
+            etag_func=etag_func, last_modified_func=last_modified_func,
+        )(_proceed))
+
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            # ETag зависит от пользователя: загружаем его один раз для
+            # request.user и request.auser()
+            request.user = await request.auser()
+            checked = await precondition(request, *args, **kwargs)
+            if not isinstance(checked, _Proceed):
+                return checked
+            response = await view_func(request, *args, **kwargs)
+            for header in ("ETag", "Last-Modified"):
+                if header in checked.headers:
+                    response.headers.setdefault(header,
+                                                checked.headers[header])
+            return response
+
+        return _wrapped_view
+
+    return decorator
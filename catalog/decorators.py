@@ -1,4 +1,17 @@
+import logging
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем заявлено"""
 
 
 def role_required(allowed_roles):
@@ -13,3 +26,62 @@ def role_required(allowed_roles):
         return _wrapped_view
 
     return decorator
+
+
+def query_budget(max_queries):
+    """Ограничивает число SQL-запросов, выполненных внутри представления.
+
+    Считаются запросы самого представления и отрисовки шаблона.
+    При превышении пишет предупреждение в лог, а при
+    QUERY_BUDGET_STRICT = True выбрасывает QueryBudgetExceeded
+    (так тесты ловят появление N+1).
+    """
+    def decorator(view_func):
+        def check(executed):
+            if len(executed) > max_queries:
+                message = (
+                    f"{view_func.__name__}: {len(executed)} SQL-запросов "
+                    f"при бюджете {max_queries}"
+                )
+                if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                    raise QueryBudgetExceeded(
+                        message + "\n" + "\n".join(executed))
+                logger.warning(message)
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                executed = []
+                stack = ExitStack()
+                # Асинхронный ORM выполняет запросы в потоке sync_to_async,
+                # у которого свои соединения: счётчик ставим там же
+                await sync_to_async(_count_queries)(stack, executed)
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                finally:
+                    await sync_to_async(stack.close)()
+                check(executed)
+                return response
+        else:
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                executed = []
+                with ExitStack() as stack:
+                    _count_queries(stack, executed)
+                    response = view_func(request, *args, **kwargs)
+                check(executed)
+                return response
+
+        return _wrapped_view
+
+    return decorator
+
+
+def _count_queries(stack, executed):
+    """Записывает SQL всех соединений текущего потока в executed"""
+    def counter(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(counter))
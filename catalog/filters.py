@@ -0,0 +1,46 @@
+"""Разбор GET-параметров каталога (cheese_list).
+
+Параметры приводятся к каноническому виду: пробелы обрезаются, а
+недопустимые значения заменяются пустыми. По этим значениям строится
+и сама выдача, и ключ кэша, и ссылки на соседние страницы.
+"""
+
+from django.http import QueryDict
+
+from .sorting import CATALOG_SORTS
+
+
+# Наибольший id (bigint): число больше ORM не передаст в базу
+MAX_ID = 2 ** 63 - 1
+
+
+def _object_id(value):
+    """Строка id без ведущих нулей или "" для недопустимого значения"""
+    # isdigit() пропускает и не-ASCII цифры вроде "²", их не берёт int()
+    if not (value.isascii() and value.isdigit()):
+        return ""
+    number = int(value)
+    return str(number) if 0 < number <= MAX_ID else ""
+
+
+def catalog_list_params(query_dict):
+    in_stock = query_dict.get("in_stock", "")
+    cheese_type_id = query_dict.get("type", "").strip()
+    order_by = query_dict.get("order_by", "")
+    return {
+        "q": query_dict.get("q", "").strip(),
+        "type": _object_id(cheese_type_id),
+        "in_stock": in_stock if in_stock in ("true", "false") else "",
+        "order_by": order_by if order_by in CATALOG_SORTS else "",
+        "cursor": query_dict.get("cursor", ""),
+        "count": "1" if query_dict.get("count") == "1" else "",
+    }
+
+
+def catalog_link_params(params):
+    """QueryDict для ссылок между страницами: без курсора и пустых значений"""
+    query_dict = QueryDict(mutable=True)
+    for name, value in params.items():
+        if value and name != "cursor":
+            query_dict[name] = value
+    return query_dict
@@ -1,11 +1,18 @@
+import re
+
 from django import forms
-from .models import Cheese, BatchItem
+from .models import Cheese, CheeseType, BatchItem, PriceList
+from .widgets import CheeseAutocomplete
+
+# Не больше стольких позиций за одну отправку массовой формы
+BATCH_LINES_MAX = 1000
 
 
 class CheeseForm(forms.ModelForm):
     class Meta:
         model = Cheese
         fields = [
+            "sku",
             "name",
             "price",
             "price_small_opt",
@@ -18,6 +25,7 @@ class CheeseForm(forms.ModelForm):
             "production_date",
         ]
         labels = {
+            "sku": "Артикул",
             "name": "Название",
             "price": "Цена (₽)",
             "price_small_opt": "Цена мелкий опт (₽)",
@@ -54,5 +62,223 @@ class BatchItemForm(forms.ModelForm):
         model = BatchItem
         fields = ["cheese", "quantity"]
         widgets = {
+            # Не <select> на весь каталог: подсказки по мере ввода
+            "cheese": CheeseAutocomplete,
             "quantity": forms.NumberInput(attrs={"min": 1}),
         }
+
+    def __init__(self, *args, batch=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["cheese"].widget.batch_id = batch.id if batch else None
+
+
+class BatchLineForm(forms.Form):
+    """Строка массового редактирования: количество позиции партии"""
+    item = forms.IntegerField(widget=forms.HiddenInput)
+    quantity = forms.IntegerField(
+        label="Количество", min_value=1,
+        widget=forms.NumberInput(attrs={"min": 1}))
+
+    def __init__(self, *args, batch_item=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_item = batch_item
+
+
+class BaseBatchLineFormSet(forms.BaseFormSet):
+    """Позиции партии; items - {id: BatchItem}, загруженные заранее.
+
+    Принадлежность позиции партии проверяется по items, а не
+    отдельным запросом на каждую строку, как в modelformset.
+    """
+
+    def __init__(self, *args, items, **kwargs):
+        self.items = items
+        super().__init__(*args, **kwargs)
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        if self.initial and index < len(self.initial):
+            kwargs["batch_item"] = self.items.get(self.initial[index]["item"])
+        return kwargs
+
+    def clean(self):
+        for form in self.forms:
+            item_id = form.cleaned_data.get("item")
+            if item_id is not None and item_id not in self.items:
+                raise forms.ValidationError(
+                    "Позиция не относится к этой партии")
+
+    def changes(self):
+        """({id позиции: количество}, [id удаляемых позиций])"""
+        quantities, deleted = {}, []
+        for form in self.forms:
+            if form in self.deleted_forms:
+                if form.cleaned_data.get("item") is not None:
+                    deleted.append(form.cleaned_data["item"])
+            elif form.cleaned_data:
+                quantities[form.cleaned_data["item"]] = (
+                    form.cleaned_data["quantity"])
+        return quantities, deleted
+
+
+BatchLineFormSet = forms.formset_factory(
+    BatchLineForm, formset=BaseBatchLineFormSet, extra=0, can_delete=True,
+    max_num=BATCH_LINES_MAX, validate_max=True,
+)
+
+
+class BatchItemLinesForm(forms.Form):
+    """Вставленный список "артикул, количество" - по позиции на строку"""
+    lines = forms.CharField(
+        label="Добавить позиции",
+        help_text="По одной на строку: артикул и количество через "
+                  "запятую, точку с запятой или табуляцию (можно "
+                  "вставить из Excel). Повторы одного сыра суммируются.",
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 8}),
+    )
+
+    LINE_RE = re.compile(r"(?P<sku>.+?)\s*[,;\t ]\s*(?P<quantity>\d+)")
+
+    def clean_lines(self):
+        """Разбирает строки в {id сыра: количество}.
+
+        Все артикулы ищутся одним запросом; ошибки собираются по всем
+        строкам сразу.
+        """
+        parsed, errors = [], []
+        for number, line in enumerate(self.cleaned_data["lines"]
+                                      .splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            match = self.LINE_RE.fullmatch(line)
+            if match is None or int(match["quantity"]) < 1:
+                errors.append(f"Строка {number}: ожидается "
+                              f"\"артикул, количество\", получено {line!r}")
+                continue
+            parsed.append((number, match["sku"], int(match["quantity"])))
+        if len(parsed) > BATCH_LINES_MAX:
+            raise forms.ValidationError(
+                f"Не больше {BATCH_LINES_MAX} строк за раз")
+
+        cheese_ids = dict(
+            Cheese.objects.filter(sku__in={sku for _, sku, _ in parsed})
+            .values_list("sku", "id"))
+        self.quantities = {}
+        for number, sku, quantity in parsed:
+            cheese_id = cheese_ids.get(sku)
+            if cheese_id is None:
+                errors.append(f"Строка {number}: неизвестный артикул {sku}")
+                continue
+            self.quantities[cheese_id] = (
+                self.quantities.get(cheese_id, 0) + quantity)
+        if errors:
+            raise forms.ValidationError(errors)
+        return self.cleaned_data["lines"]
+
+
+class CheeseImportForm(CheeseForm):
+    """Проверка одной строки импорта по правилам CheeseForm.
+
+    Тип сыра приходит названием и ищется в словаре cheese_types
+    (название -> id, None - у нескольких типов такое название), чтобы
+    не делать запрос на каждую строку. Артикул
+    обязателен: по нему строка обновляет существующий сыр.
+    """
+
+    cheese_type = forms.CharField(max_length=50)
+
+    class Meta(CheeseForm.Meta):
+        fields = [field for field in CheeseForm.Meta.fields
+                  if field != "cheese_type"]
+
+    def __init__(self, *args, cheese_types, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cheese_types = cheese_types
+        self.fields["sku"].required = True
+
+    def rebind(self, data):
+        """Привязывает форму к следующей строке импорта.
+
+        Создание формы копирует все её поля (deepcopy) и стоит дороже
+        самой проверки, поэтому импорт проверяет все строки одной формой.
+        """
+        self.data = data
+        self.is_bound = True
+        self._errors = None
+        self.instance = self._meta.model()
+
+    def clean_cheese_type(self):
+        name = self.cleaned_data["cheese_type"].strip()
+        if name not in self.cheese_types:
+            raise forms.ValidationError(f"Неизвестный тип сыра: {name}")
+        if self.cheese_types[name] is None:
+            raise forms.ValidationError(
+                f"Несколько типов сыра с названием {name}")
+        return self.cheese_types[name]
+
+    def _post_clean(self):
+        super()._post_clean()
+        if "cheese_type" in self.cleaned_data:
+            self.instance.cheese_type_id = self.cleaned_data["cheese_type"]
+
+    def validate_unique(self):
+        # Повтор артикула при импорте - обновление, а не ошибка
+        pass
+
+
+class CheeseImportUploadForm(forms.Form):
+    file = forms.FileField(label="Файл CSV или JSONL")
+    create_types = forms.BooleanField(
+        label="Создавать недостающие типы сыра", required=False)
+
+
+class BatchExportForm(forms.Form):
+    start = forms.DateField(label="С даты", required=False,
+                            widget=forms.DateInput(attrs={"type": "date"}))
+    end = forms.DateField(label="По дату", required=False,
+                          widget=forms.DateInput(attrs={"type": "date"}))
+    format = forms.ChoiceField(label="Формат", required=False,
+                               choices=[("csv", "CSV"), ("xlsx", "XLSX")])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError(
+                "Начало периода позже его окончания")
+        return cleaned_data
+
+
+class QuoteForm(forms.Form):
+    cheese_type = forms.ModelChoiceField(
+        label="Тип сыра", required=False, queryset=CheeseType.objects.all(),
+        empty_label="Все типы")
+    price_list = forms.ModelChoiceField(
+        label="Прайс-лист", required=False, queryset=PriceList.objects.all(),
+        empty_label="Общие цены")
+    max_qty = forms.IntegerField(label="Количество до", initial=100,
+                                 min_value=1, max_value=100000)
+    step = forms.IntegerField(label="Шаг", initial=1, min_value=1)
+    format = forms.ChoiceField(label="Формат", required=False,
+                               choices=[("html", "Страница"), ("csv", "CSV")])
+
+    # Столбцов в сетке не больше этого. Память сетки - сыры x
+    # количества, поэтому CSV считается частями (quotes.QUOTE_CHUNK сыров)
+    MAX_QUANTITIES = 1000
+
+    def clean(self):
+        cleaned_data = super().clean()
+        max_qty, step = cleaned_data.get("max_qty"), cleaned_data.get("step")
+        if max_qty and step and step > max_qty:
+            raise forms.ValidationError("Шаг больше количества")
+        if max_qty and step and max_qty // step > self.MAX_QUANTITIES:
+            raise forms.ValidationError(
+                f"Не больше {self.MAX_QUANTITIES} количеств: увеличьте шаг")
+        return cleaned_data
+
+    def quantities(self):
+        return range(self.cleaned_data["step"],
+                     self.cleaned_data["max_qty"] + 1,
+                     self.cleaned_data["step"])
@@ -0,0 +1,295 @@
+"""Массовый импорт и экспорт сыров в CSV и JSONL.
+
+Файл читается построчно. Каждая строка проверяется CheeseImportForm
+(те же правила, что у CheeseForm), а проверенные сыры сохраняются
+пачками через bulk_create(update_conflicts=True) по артикулу (sku):
+новые добавляются, существующие обновляются. В памяти держится одна
+пачка и первые max_errors ошибок, а не весь файл. Экспорт так же
+построчно отдаёт каталог через iterator().
+
+Выгрузка партий для бухгалтерии устроена так же: позиции партий за
+период читаются одним запросом со снимками цен и суммами, посчитанными
+в SQL (BatchItem.objects.with_prices()), и построчно пишутся в CSV или
+XLSX.
+"""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .forms import CheeseImportForm
+from .models import (BatchItem, CatalogVersion, Cheese, CheeseType,
+                     PriceTier)
+
+try:
+    import openpyxl
+except ImportError:  # XLSX необязателен, CSV работает и без него
+    openpyxl = None
+
+FORMATS = ("csv", "jsonl")
+FIELDS = [
+    "sku", "name", "price", "price_small_opt", "min_qty_small_opt",
+    "price_big_opt", "min_qty_big_opt", "weight", "cheese_type",
+    "in_stock", "production_date",
+]
+# При совпадении артикула обновляется всё, кроме самого артикула
+UPDATE_FIELDS = [field for field in FIELDS if field != "sku"] + [
+    "updated_at"]
+CHUNK_SIZE = 1000
+
+BATCH_FORMATS = ("csv", "xlsx") if openpyxl else ("csv",)
+BATCH_FIELDS = [
+    "batch_id", "created_at", "manager", "item_id", "sku", "cheese",
+    "quantity", "tier_min_qty", "base_price", "unit_price",
+    "discount_percent", "total_base_price", "total_price",
+]
+# Столбцы values_list() в порядке BATCH_FIELDS
+BATCH_COLUMNS = [
+    "batch_id", "batch__created_at", "batch__manager__username", "id",
+    "cheese__sku", "cheese__name", "quantity", "tier_min_qty", "base_price",
+    "unit_price", "line_discount_percent", "line_base_total", "line_total",
+]
+# Строк на листе XLSX, не считая заголовка (предел Excel - 1048576)
+XLSX_SHEET_ROWS = 1048575
+CENT = Decimal("0.01")
+
+TRUE_VALUES = {"1", "true", "yes", "да"}
+FALSE_VALUES = {"0", "false", "no", "нет"}
+
+
+def detect_format(filename, default="csv"):
+    """Формат по расширению файла: .jsonl/.ndjson или .csv"""
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+def read_rows(stream, file_format):
+    """Выдаёт (номер строки, словарь значений) по одной строке файла.
+
+    Для нечитаемой строки JSONL вместо словаря выдаётся None.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class ImportResult:
+    def __init__(self, max_errors):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # [(номер строки, {поле: [сообщения]})]
+        self.max_errors = max_errors
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append((line, errors))
+
+
+class CheeseImporter:
+    """Импорт строк read_rows(); on_error(line, errors) вызывается сразу"""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, create_types=False,
+                 max_errors=100, on_error=None):
+        self.chunk_size = chunk_size
+        self.create_types = create_types
+        self.max_errors = max_errors
+        self.on_error = on_error
+        # Все типы в памяти: название -> id. У повторяющегося названия
+        # id None: строка с ним не угадывает тип, а отклоняется
+        self.cheese_types = {}
+        for name, type_id in CheeseType.objects.values_list("name", "id"):
+            self.cheese_types[name] = (
+                None if name in self.cheese_types else type_id)
+        self.form = CheeseImportForm(cheese_types=self.cheese_types)
+
+    def run(self, rows):
+        result = ImportResult(self.max_errors)
+        chunk = {}
+        for line, row in rows:
+            cheese, errors = self.validate(row)
+            if errors:
+                result.add_error(line, errors)
+                if self.on_error:
+                    self.on_error(line, errors)
+                continue
+            # Повтор артикула в одной пачке: побеждает последняя строка
+            chunk[cheese.sku] = cheese
+            if len(chunk) >= self.chunk_size:
+                self.save_chunk(chunk, result)
+                chunk = {}
+        if chunk:
+            self.save_chunk(chunk, result)
+        return result
+
+    def validate(self, row):
+        """Возвращает (несохранённый Cheese, None) или (None, ошибки)"""
+        if row is None:
+            return None, {"__all__": ["Строка не является объектом JSON"]}
+        data = {field: row.get(field) for field in FIELDS}
+        data = {field: "" if value is None else value
+                for field, value in data.items()}
+
+        in_stock = data["in_stock"]
+        if isinstance(in_stock, str):
+            value = in_stock.strip().lower()
+            if value == "" or value in TRUE_VALUES:
+                data["in_stock"] = True
+            elif value in FALSE_VALUES:
+                data["in_stock"] = False
+            else:
+                return None, {"in_stock": [
+                    f"Ожидается true или false, получено {in_stock!r}"]}
+
+        type_name = str(data["cheese_type"]).strip()
+        if (self.create_types and type_name
+                and type_name not in self.cheese_types):
+            cheese_type = CheeseType.objects.create(name=type_name)
+            self.cheese_types[type_name] = cheese_type.id
+
+        form = self.form
+        form.rebind(data)
+        if not form.is_valid():
+            return None, {field: list(messages)
+                          for field, messages in form.errors.items()}
+        return form.instance, None
+
+    def save_chunk(self, chunk, result):
+        with transaction.atomic():
+            existing = dict(Cheese.objects.filter(sku__in=list(chunk))
+                            .values_list("sku", "id"))
+            Cheese.objects.bulk_create(
+                chunk.values(),
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=UPDATE_FIELDS,
+            )
+            # Сигналы post_save и Cheese.save() при bulk_create не
+            # срабатывают: версия каталога и общие оптовые уровни -
+            # вручную (id сыров bulk_create проставляет сам)
+            CatalogVersion.bump()
+            PriceTier.objects.sync_general(chunk.values())
+        result.updated += len(existing)
+        result.created += len(chunk) - len(existing)
+
+
+def import_cheeses(stream, file_format, **options):
+    return CheeseImporter(**options).run(read_rows(stream, file_format))
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else value
+
+
+def export_cheeses(file_format, queryset=None):
+    """Построчно выдаёт каталог в CSV или JSONL (для стриминга)"""
+    if queryset is None:
+        queryset = Cheese.objects.all()
+    columns = [field if field != "cheese_type" else "cheese_type__name"
+               for field in FIELDS]
+    rows = queryset.order_by("id").values_list(*columns).iterator(
+        chunk_size=2000)
+
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow([_export_value(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(FIELDS, row)), cls=DjangoJSONEncoder,
+                             ensure_ascii=False) + "\n"
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def batch_lines(start=None, end=None, batch_id=None):
+    """Построчно выдаёт позиции партий в порядке BATCH_FIELDS.
+
+    start и end - даты создания партии включительно (по местному
+    времени), batch_id - одна партия. Цены считаются в SQL, строки
+    читаются курсором пачками, так что память не растёт с объёмом.
+    """
+    items = BatchItem.objects.with_prices()
+    if start is not None:
+        items = items.filter(batch__created_at__gte=_day_start(start))
+    if end is not None:
+        items = items.filter(
+            batch__created_at__lt=_day_start(end + timedelta(days=1)))
+    if batch_id is not None:
+        items = items.filter(batch_id=batch_id)
+    rows = items.order_by("batch_id", "id").values_list(
+        *BATCH_COLUMNS).iterator(chunk_size=2000)
+
+    for row in rows:
+        row = list(row)
+        # Excel не хранит часовой пояс: время местное, без смещения
+        row[1] = timezone.make_naive(row[1]).replace(microsecond=0)
+        # SQLite не округляет результат выражений до decimal_places
+        row[8:] = [Decimal(value).quantize(CENT) for value in row[8:]]
+        yield row
+
+
+def export_batches_csv(lines):
+    """Построчно выдаёт CSV из строк batch_lines() (для стриминга)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(BATCH_FIELDS)
+    for row in lines:
+        yield writer.writerow(
+            [_export_value(value) for value in row])
+
+
+def write_batches_xlsx(lines, stream):
+    """Пишет строки batch_lines() в XLSX-файл stream.
+
+    Книга открывается в режиме write_only: строки сразу сбрасываются
+    во временный файл, а не копятся в памяти. Когда лист заполнен,
+    выгрузка продолжается на следующем.
+    """
+    if openpyxl is None:
+        raise RuntimeError("Для выгрузки в XLSX установите openpyxl")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet, rows_left = None, 0
+    for row in lines:
+        if not rows_left:
+            sheet = workbook.create_sheet(
+                f"Партии {len(workbook.worksheets) + 1}")
+            sheet.append(BATCH_FIELDS)
+            rows_left = XLSX_SHEET_ROWS
+        sheet.append(row)
+        rows_left -= 1
+    if sheet is None:
+        workbook.create_sheet("Партии 1").append(BATCH_FIELDS)
+    workbook.save(stream)
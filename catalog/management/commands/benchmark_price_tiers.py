@@ -0,0 +1,86 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from catalog.batch_items import update_batch_items
+from catalog.models import Batch, BatchItem, PriceList, PriceTier
+from catalog.seeding import BATCH_SIZE, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Засевает каталог с прайс-листом на несколько оптовых уровней и "
+        "сравнивает выбор уровней для большой партии: запросом на "
+        "позицию, одним запросом на всю партию (PriceTier.resolve) и "
+        "одним UPDATE (BatchItem reprice). Все изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cheeses", type=int, default=20000)
+        parser.add_argument("--lines", type=int, default=1000,
+                            help="Позиций в партии")
+        parser.add_argument("--tiers", type=int, default=5,
+                            help="Уровней прайс-листа на сыр")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["lines"] > options["cheeses"]:
+            raise CommandError("Позиций не может быть больше, чем сыров")
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            self.stdout.write("Заполнение базы...")
+            data = seed_catalog(cheeses=options["cheeses"], batches=0,
+                                seed=options["seed"])
+            price_list = self.seed_price_list(data["cheeses"],
+                                              options["tiers"])
+            batch = Batch.objects.create(manager=data["managers"][0],
+                                         price_list=price_list)
+            lines = [(cheese.id, rng.randint(1, 500)) for cheese in
+                     rng.sample(data["cheeses"], options["lines"])]
+            update_batch_items(batch, added=dict(lines))
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            tiers = PriceTier.objects.for_batch(batch.id)
+            one_by_one, per_line = self.measure(
+                lambda: {line: tiers.lookup(*line) for line in lines})
+            bulk, per_batch = self.measure(lambda: tiers.resolve(lines))
+            _, reprice = self.measure(
+                lambda: BatchItem.objects.filter(batch=batch).reprice())
+            # Ничего из засеянного не сохраняем
+            transaction.set_rollback(True)
+
+        if one_by_one != bulk:
+            raise CommandError("Способы выбрали разные уровни")
+        self.stdout.write(f"Позиций: {len(lines)}, уровней на сыр: "
+                          f"{options['tiers']} + общие")
+        for label, (queries, elapsed) in (
+                ("Запрос на позицию", per_line),
+                ("Вся партия (resolve)", per_batch),
+                ("UPDATE позиций (reprice)", reprice)):
+            self.stdout.write(f"  {label}: запросов {queries}, "
+                              f"{elapsed * 1000:.2f} мс")
+
+    def seed_price_list(self, cheeses, count):
+        """Прайс-лист: count уровней на сыр, каждый дешевле на 2%"""
+        price_list = PriceList.objects.create(name="benchmark")
+        PriceTier.objects.bulk_create(
+            [PriceTier(cheese=cheese, price_list=price_list,
+                       min_qty=10 * 2 ** level,
+                       price=(cheese.price * (1 - Decimal(level + 1) / 50))
+                       .quantize(Decimal("0.01")))
+             for cheese in cheeses for level in range(count)],
+            batch_size=BATCH_SIZE,
+        )
+        return price_list
+
+    def measure(self, run):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+        return result, (len(queries), elapsed)
@@ -0,0 +1,202 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from catalog.benchmarks import LatencyStats, format_ms
+from catalog.models import Batch, BatchItem, Cheese
+
+PAGE = 51  # размер страницы каталога + 1 строка для проверки "дальше"
+
+# Настройки SQLite по умолчанию: журнал отката, без остальных PRAGMA
+BASELINE_PRAGMAS = {"journal_mode": "DELETE"}
+
+
+def _raw_sql(queryset):
+    sql, params = queryset.query.get_compiler(DEFAULT_DB_ALIAS).as_sql()
+    return sql.replace("%s", "?"), list(params)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность SQLite с настройками по "
+        "умолчанию и с settings.SQLITE_PRAGMAS: несколько читателей "
+        "каталога и писатель позиций партий работают с копией базы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=1)
+        parser.add_argument("--duration", type=float, default=5.0,
+                            help="Длительность каждого замера, секунд")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != "sqlite":
+            raise CommandError("Замер имеет смысл только для SQLite")
+
+        cheese_ids = list(Cheese.objects.values_list("id", flat=True))
+        batch_ids = list(Batch.objects.values_list("id", flat=True))
+        if not cheese_ids or not batch_ids:
+            raise CommandError(
+                "В базе нет сыров или партий: сначала заполните её")
+
+        self.readers = options["readers"]
+        self.writers = options["writers"]
+        self.duration = options["duration"]
+        self.seed = options["seed"]
+        self.cheese_ids = cheese_ids
+        self.batch_ids = batch_ids
+        self.page_sql = _raw_sql(
+            Cheese.objects.select_related("cheese_type")
+            .order_by("name", "id")[:PAGE])
+        self.detail_sql = _raw_sql(
+            Cheese.objects.select_related("cheese_type").filter(id=0))
+        self.insert_sql = self.batch_item_insert_sql()
+
+        tuned = getattr(settings, "SQLITE_PRAGMAS", {})
+        if not tuned:
+            self.stderr.write("SQLITE_PRAGMAS пуст (SQLITE_TUNING=0?): "
+                              "оба замера пройдут без настроек")
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Замер идёт на копии, рабочая база не меняется
+            path = os.path.join(directory, "benchmark.sqlite3")
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            connection.connection.backup(target)
+            target.close()
+
+            results = {}
+            for mode, pragmas in (("По умолчанию", BASELINE_PRAGMAS),
+                                  ("С настройками", tuned)):
+                results[mode] = self.run(path, pragmas)
+                self.report(mode, pragmas, results[mode])
+
+        baseline, tuned_result = results.values()
+        for label, key in (("Чтения", "reads"), ("Записи", "writes")):
+            before = baseline[key]["per_second"]
+            after = tuned_result[key]["per_second"]
+            gain = f"x{after / before:.2f}" if before else "-"
+            self.stdout.write(f"{label}: {before:.0f} -> {after:.0f} "
+                              f"в секунду ({gain})")
+
+    def batch_item_insert_sql(self):
+        # Параметры: партия, сыр, количество; цены - снимок из сыра
+        # (для простоты базовая, без оптовых уровней)
+        opts = BatchItem._meta
+        columns = [opts.get_field(name).column for name in
+                   ("batch", "cheese", "quantity", "base_price",
+                    "unit_price")]
+        cheese = Cheese._meta
+        return (f"INSERT INTO {opts.db_table} ({', '.join(columns)}) "
+                f"SELECT ?1, id, ?3, price, price "
+                f"FROM {cheese.db_table} WHERE id = ?2")
+
+    def connect(self, path, pragmas):
+        conn = sqlite3.connect(path, isolation_level=None,
+                               check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def run(self, path, pragmas):
+        # journal_mode хранится в самом файле: сбрасываем его перед замером
+        setup = self.connect(path, BASELINE_PRAGMAS)
+        setup.close()
+
+        deadline = time.perf_counter() + self.duration
+        reads = [LatencyStats() for _ in range(self.readers)]
+        writes = [LatencyStats() for _ in range(self.writers)]
+        threads = [
+            threading.Thread(target=self.read_loop,
+                             args=(path, pragmas, deadline, stats, index))
+            for index, stats in enumerate(reads)
+        ] + [
+            threading.Thread(target=self.write_loop,
+                             args=(path, pragmas, deadline, stats, index))
+            for index, stats in enumerate(writes)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "reads": _merged(reads).summary(elapsed),
+            "writes": _merged(writes).summary(elapsed),
+        }
+
+    def read_loop(self, path, pragmas, deadline, stats, index):
+        rng = random.Random(self.seed + index)
+        conn = self.connect(path, pragmas)
+        try:
+            while time.perf_counter() < deadline:
+                # Страница каталога и карточка случайного сыра по очереди
+                if rng.random() < 0.5:
+                    sql, params = self.page_sql
+                else:
+                    sql, params = self.detail_sql[0], [
+                        rng.choice(self.cheese_ids)]
+                started = time.perf_counter()
+                try:
+                    conn.execute(sql, params).fetchall()
+                except sqlite3.OperationalError:
+                    stats.error()
+                    continue
+                stats.add(time.perf_counter() - started)
+        finally:
+            conn.close()
+
+    def write_loop(self, path, pragmas, deadline, stats, index):
+        rng = random.Random(-self.seed - index - 1)
+        conn = self.connect(path, pragmas)
+        try:
+            while time.perf_counter() < deadline:
+                params = [rng.choice(self.batch_ids),
+                          rng.choice(self.cheese_ids), rng.randint(1, 200)]
+                started = time.perf_counter()
+                try:
+                    # Как batch_add_item: короткая транзакция на запись
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute(self.insert_sql, params)
+                    conn.execute("COMMIT")
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    stats.error()
+                    continue
+                stats.add(time.perf_counter() - started)
+        finally:
+            conn.close()
+
+    def report(self, mode, pragmas, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{mode}"))
+        settings_line = ", ".join(f"{name}={value}"
+                                  for name, value in pragmas.items())
+        self.stdout.write(f"  PRAGMA: {settings_line or '-'}")
+        for label, key in (("Чтения", "reads"), ("Записи", "writes")):
+            summary = result[key]
+            self.stdout.write(
+                f"  {label}: {summary['count']} "
+                f"({summary['per_second']:.0f}/с), "
+                f"p50 {format_ms(summary['p50_ms'])} мс, "
+                f"p95 {format_ms(summary['p95_ms'])} мс, "
+                f"ошибок {summary['errors']}"
+            )
+
+
+def _merged(stats_list):
+    merged = LatencyStats()
+    for stats in stats_list:
+        merged.merge(stats)
+    return merged
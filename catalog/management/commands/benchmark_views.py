@@ -0,0 +1,249 @@
+import http.client
+import json
+import subprocess
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from catalog.benchmarks import LatencyStats, count_queries, format_ms
+from catalog.models import Batch, BatchItem, Cheese, CheeseType, User
+from catalog.sorting import CATALOG_SORT_OPTIONS
+
+# Сколько разных сыров и партий перебирают страницы деталей
+DETAIL_SAMPLE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет страницы каталога (каждая сортировка с каждым "
+        "фильтром), сыра и партий через тестовый клиент или по HTTP и "
+        "пишет в JSON пропускную способность, p50/p95/p99 и число "
+        "запросов к базе на страницу. Файлы разных коммитов можно "
+        "сравнить: --baseline старый.json. Базу заполняет seed_catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20,
+                            help="Замеров на сценарий")
+        parser.add_argument("--warmup", type=int, default=2,
+                            help="Незасчитываемых запросов на сценарий")
+        parser.add_argument("--user",
+                            help="Менеджер, от имени которого открываются "
+                                 "страницы (по умолчанию - с наибольшим "
+                                 "числом партий)")
+        parser.add_argument("--target",
+                            help="Адрес запущенного сервера с той же базой "
+                                 "вместо тестового клиента; число "
+                                 "запросов к базе тогда не считается")
+        parser.add_argument("--cookie", default="",
+                            help="Заголовок Cookie для --target, например "
+                                 "sessionid=...")
+        parser.add_argument("--scenario", action="append", dest="prefixes",
+                            help="Только сценарии с этим началом имени "
+                                 "(можно несколько раз)")
+        parser.add_argument("--output", default="benchmark_views.json")
+        parser.add_argument("--baseline",
+                            help="JSON прошлого прогона для сравнения")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests должно быть больше нуля")
+        user = self.pick_user(options["user"])
+        scenarios = self.scenarios(user)
+        if options["prefixes"]:
+            scenarios = {name: paths for name, paths in scenarios.items()
+                         if name.startswith(tuple(options["prefixes"]))}
+        if options["target"]:
+            send = self.http_sender(options["target"], options["cookie"])
+        else:
+            send = self.client_sender(user)
+
+        results = {}
+        for name, paths in scenarios.items():
+            results[name] = self.measure(send, paths, options["requests"],
+                                         options["warmup"])
+            self.report(name, results[name])
+
+        data = {"meta": self.meta(options, user), "scenarios": results}
+        with open(options["output"], "w", encoding="utf-8") as stream:
+            json.dump(data, stream, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+            stream.write("\n")
+        self.stdout.write(self.style.SUCCESS(
+            f"\nСценариев: {len(results)}, результаты в {options['output']}"))
+        if options["baseline"]:
+            self.compare(options["baseline"], results)
+
+    def pick_user(self, username):
+        managers = User.objects.filter(role__in=["sales_manager", "admin"])
+        if username:
+            user = managers.filter(username=username).first()
+            if user is None:
+                raise CommandError(f"Нет менеджера {username}")
+            return user
+        user = (managers.annotate(batch_count=Count("batches"))
+                .filter(batch_count__gt=0)
+                .order_by("-batch_count", "id").first())
+        if user is None:
+            raise CommandError(
+                "Нет менеджера с партиями: заполните базу seed_catalog")
+        return user
+
+    def scenarios(self, user):
+        """{имя сценария: пути}; пути сценария перебираются по кругу"""
+        cheese_type = CheeseType.objects.order_by("id").first()
+        # Поиск по слову, которое есть в названиях засеянных сыров
+        word = (Cheese.objects.order_by("id")
+                .values_list("name", flat=True).first() or "сыр").split()[0]
+        filters = {"all": {}, "in_stock": {"in_stock": "true"},
+                   "search": {"q": word.lower()}}
+        if cheese_type is not None:
+            filters["type"] = {"type": cheese_type.id}
+            filters["type_in_stock"] = {"type": cheese_type.id,
+                                        "in_stock": "true"}
+        scenarios = {}
+        for option in [None, *CATALOG_SORT_OPTIONS]:
+            for filter_name, params in filters.items():
+                if option is not None:
+                    params = {**params, "order_by": option.key}
+                sort_name = option.key if option else "default"
+                scenarios[f"cheese_list:{filter_name}:{sort_name}"] = [
+                    reverse("cheese_list") + "?" + urlencode(params)]
+
+        # Пути не случайные, чтобы прогоны разных коммитов совпадали
+        cheese_ids = list(Cheese.objects.order_by("id").values_list(
+            "id", flat=True)[:DETAIL_SAMPLE])
+        # У партий - самые длинные: страница партии растёт с позициями
+        batch_ids = list(
+            Batch.objects.filter(manager=user)
+            .annotate(lines=Count("items")).order_by("-lines", "id")
+            .values_list("id", flat=True)[:DETAIL_SAMPLE])
+        scenarios.update({
+            "cheese_detail": [reverse("cheese_detail", args=[cheese_id])
+                              for cheese_id in cheese_ids],
+            "batch_list": [reverse("batch_list")],
+            "batch_detail": [reverse("batch_detail", args=[batch_id])
+                             for batch_id in batch_ids],
+            "batch_add_item": [reverse("batch_add_item", args=[batch_id])
+                               for batch_id in batch_ids],
+        })
+        return {name: paths for name, paths in scenarios.items() if paths}
+
+    def client_sender(self, user):
+        # Без кэша страниц анонимов: замеряются сами представления
+        host = next((host.lstrip(".") for host in settings.ALLOWED_HOSTS
+                     if host != "*"), "localhost")
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+
+        def send(path):
+            with count_queries() as queries:
+                response = client.get(path)
+            return response.status_code, queries()
+
+        return send
+
+    def http_sender(self, target, cookie):
+        parts = urlsplit(target)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise CommandError(f"Некорректный адрес: {target}")
+        connection_class = (http.client.HTTPSConnection
+                            if parts.scheme == "https"
+                            else http.client.HTTPConnection)
+        prefix = parts.path.rstrip("/")
+        headers = {"Connection": "keep-alive"}
+        if cookie:
+            headers["Cookie"] = cookie
+        state = {"connection": connection_class(parts.netloc, timeout=60)}
+
+        def send(path):
+            try:
+                state["connection"].request("GET", prefix + path,
+                                            headers=headers)
+                response = state["connection"].getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                state["connection"].close()
+                state["connection"] = connection_class(parts.netloc,
+                                                       timeout=60)
+                return None, None
+            return response.status, None
+
+        return send
+
+    def measure(self, send, paths, requests, warmup):
+        for index in range(warmup):
+            send(paths[index % len(paths)])
+        stats = LatencyStats()
+        query_counts = []
+        started = time.perf_counter()
+        for index in range(requests):
+            request_started = time.perf_counter()
+            status, queries = send(paths[index % len(paths)])
+            if status is None or status >= 400:
+                stats.error()
+                continue
+            stats.add(time.perf_counter() - request_started)
+            if queries is not None:
+                query_counts.append(queries)
+        summary = stats.summary(time.perf_counter() - started)
+        summary["path"] = paths[0]
+        summary["queries"] = max(query_counts, default=None)
+        return summary
+
+    def meta(self, options, user):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(
+                timespec="seconds"),
+            "database": connection.vendor,
+            "target": options["target"] or "test client",
+            "requests": options["requests"],
+            "user": user.username,
+            "rows": {
+                "cheeses": Cheese.objects.count(),
+                "batches": Batch.objects.count(),
+                "batch_items": BatchItem.objects.count(),
+            },
+        }
+
+    def report(self, name, summary):
+        queries = summary["queries"]
+        self.stdout.write(
+            f"{name}: {summary['per_second']:.1f}/с, "
+            f"p50 {format_ms(summary['p50_ms'])} мс, "
+            f"p95 {format_ms(summary['p95_ms'])} мс, "
+            f"p99 {format_ms(summary['p99_ms'])} мс, "
+            f"запросов {'-' if queries is None else queries}, "
+            f"ошибок {summary['errors']}"
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding="utf-8") as stream:
+            baseline = json.load(stream)["scenarios"]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nСравнение с {path}"))
+        for name, summary in results.items():
+            old = baseline.get(name)
+            if old is None or not old["p50_ms"] or summary["p50_ms"] is None:
+                continue
+            ratio = summary["p50_ms"] / old["p50_ms"]
+            line = (f"{name}: p50 {format_ms(old['p50_ms'])} -> "
+                    f"{format_ms(summary['p50_ms'])} мс (x{ratio:.2f})")
+            if old["queries"] != summary["queries"]:
+                line += f", запросов {old['queries']} -> {summary['queries']}"
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Batch
+
+CENT = Decimal("0.01")
+# Партий за один UPDATE при исправлении
+FIX_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет сохранённые итоги партий (total_base, total_price, "
+        "discount_percent) с пересчётом по позициям и с --fix "
+        "исправляет расхождения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true",
+                            help="Пересчитать партии с расхождениями")
+
+    def handle(self, *args, **options):
+        rows = Batch.objects.with_totals().order_by("id").values_list(
+            "id", "total_base", "total_price", "discount_percent",
+            "computed_total_base", "computed_total_price",
+            "computed_discount_percent",
+        ).iterator(chunk_size=2000)
+
+        checked = 0
+        drifted = []
+        for batch_id, *stored_and_computed in rows:
+            checked += 1
+            stored = stored_and_computed[:3]
+            # SQLite не округляет результаты выражений
+            computed = [Decimal(value).quantize(CENT)
+                        for value in stored_and_computed[3:]]
+            if stored != computed:
+                drifted.append(batch_id)
+                self.stderr.write(
+                    f"Партия #{batch_id}: сохранено "
+                    f"{' / '.join(map(str, stored))}, по позициям "
+                    f"{' / '.join(map(str, computed))}"
+                )
+
+        if options["fix"]:
+            for start in range(0, len(drifted), FIX_CHUNK_SIZE):
+                Batch.objects.filter(
+                    id__in=drifted[start:start + FIX_CHUNK_SIZE]
+                ).refresh_totals()
+
+        message = (f"Проверено партий: {checked}, "
+                   f"с расхождениями: {len(drifted)}")
+        if options["fix"] and drifted:
+            message += " (исправлены)"
+        style = self.style.WARNING if drifted else self.style.SUCCESS
+        self.stdout.write(style(message))
@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from catalog.models import Batch, BatchItem, Cheese
+from catalog.seeding import seed_catalog
+
+PAGE = 51  # размер страницы каталога + 1 строка для проверки "дальше"
+
+
+class Command(BaseCommand):
+    help = (
+        "Засевает базу тестовыми данными и выводит EXPLAIN и время "
+        "запросов каталога без составных индексов и с ними. "
+        "Все изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cheeses", type=int, default=20000)
+        parser.add_argument("--batches", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="Сколько раз выполнять каждый запрос")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        with transaction.atomic():
+            self.stdout.write("Заполнение базы...")
+            data = seed_catalog(cheeses=options["cheeses"],
+                                batches=options["batches"],
+                                seed=options["seed"])
+            cases = self.query_cases(data)
+
+            self.analyze()
+            after = self.collect(cases)
+            self.drop_indexes()
+            self.analyze()
+            before = self.collect(cases)
+            # Ничего из засеянного и удалённого не сохраняем
+            transaction.set_rollback(True)
+
+        for label in cases:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+            for title, results in (("До", before), ("После", after)):
+                plan, elapsed = results[label]
+                self.stdout.write(f"  {title}: {elapsed * 1000:.2f} мс")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def query_cases(self, data):
+        cheese_type = data["cheese_types"][0]
+        middle = sorted(data["cheeses"], key=lambda c: (c.price, c.id))[
+            len(data["cheeses"]) // 2]
+        batch = data["batches"][0]
+        item = batch.items.first()
+        return {
+            "Каталог: сортировка по имени":
+                Cheese.objects.order_by("name", "id")[:PAGE],
+            "Каталог: тип + сортировка по цене":
+                Cheese.objects.filter(cheese_type=cheese_type)
+                .order_by("price", "id")[:PAGE],
+            "Каталог: в наличии + сортировка по весу":
+                Cheese.objects.filter(in_stock=True)
+                .order_by("weight", "id")[:PAGE],
+            "Каталог: середина выдачи по цене (курсор)":
+                Cheese.objects.filter(
+                    Q(price__gte=middle.price)
+                    & (Q(price__gt=middle.price)
+                       | Q(price=middle.price, id__gt=middle.id))
+                ).order_by("price", "id")[:PAGE],
+            "Партии менеджера, новые сверху":
+                Batch.objects.filter(manager_id=batch.manager_id)
+                .order_by("-created_at"),
+            "Позиция партии по сыру":
+                BatchItem.objects.filter(batch=batch,
+                                         cheese_id=item.cheese_id),
+        }
+
+    def collect(self, cases):
+        results = {}
+        for label, queryset in cases.items():
+            best = None
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (queryset.explain(), best)
+        return results
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Cheese, Batch, BatchItem):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f"DROP INDEX {connection.ops.quote_name(index.name)}")
@@ -0,0 +1,58 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importexport import (BATCH_FORMATS, batch_lines,
+                                  export_batches_csv, write_batches_xlsx)
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Некорректная дата: {value}, нужна ГГГГ-ММ-ДД")
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает позиции партий с ценами, скидками и суммами в CSV "
+        "или XLSX (для бухгалтерии)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="Путь к файлу, '-' - стандартный вывод "
+                                 "(только CSV)")
+        parser.add_argument("--start", type=_parse_date,
+                            help="Партии, созданные с этой даты")
+        parser.add_argument("--end", type=_parse_date,
+                            help="Партии, созданные по эту дату "
+                                 "включительно")
+        parser.add_argument("--batch", type=int, dest="batch_id",
+                            help="Только одна партия")
+        parser.add_argument("--format", choices=["csv", "xlsx"],
+                            help="Формат файла (по умолчанию по расширению)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or (
+            "xlsx" if path.lower().endswith(".xlsx") else "csv")
+        if file_format not in BATCH_FORMATS:
+            raise CommandError("Для выгрузки в XLSX установите openpyxl")
+        if file_format == "xlsx" and path == "-":
+            raise CommandError("XLSX выгружается только в файл")
+
+        lines = batch_lines(start=options["start"], end=options["end"],
+                            batch_id=options["batch_id"])
+        if file_format == "xlsx":
+            with open(path, "wb") as stream:
+                write_batches_xlsx(lines, stream)
+        elif path == "-":
+            for chunk in export_batches_csv(lines):
+                self.stdout.write(chunk, ending="")
+            return
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as stream:
+                for chunk in export_batches_csv(lines):
+                    stream.write(chunk)
+        self.stderr.write(f"Партии выгружены в {path}")
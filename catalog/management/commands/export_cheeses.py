@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from catalog.importexport import FORMATS, detect_format, export_cheeses
+
+
+class Command(BaseCommand):
+    help = "Выгружает каталог сыров в CSV или JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="Путь к файлу, '-' - стандартный вывод")
+        parser.add_argument("--format", choices=FORMATS,
+                            help="Формат файла (по умолчанию по расширению)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+        if path == "-":
+            for chunk in export_cheeses(file_format):
+                self.stdout.write(chunk, ending="")
+            return
+        with open(path, "w", encoding="utf-8", newline="") as stream:
+            for chunk in export_cheeses(file_format):
+                stream.write(chunk)
+        self.stderr.write(f"Каталог выгружен в {path}")
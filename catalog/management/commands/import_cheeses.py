@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importexport import (CHUNK_SIZE, FORMATS, detect_format,
+                                  import_cheeses)
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует сыры из CSV или JSONL: строки с новым артикулом "
+        "добавляются, с существующим - обновляют сыр"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу")
+        parser.add_argument("--format", choices=FORMATS,
+                            help="Формат файла (по умолчанию по расширению)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                            help="Сколько строк сохранять за один запрос")
+        parser.add_argument("--create-types", action="store_true",
+                            help="Создавать типы сыра, которых нет в базе")
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or detect_format(options["path"])
+
+        def report_error(line, errors):
+            self.stderr.write(f"Строка {line}: "
+                              f"{json.dumps(errors, ensure_ascii=False)}")
+
+        try:
+            stream = open(options["path"], encoding="utf-8-sig", newline="")
+        except OSError as error:
+            raise CommandError(f"Не удалось открыть файл: {error}")
+        with stream:
+            result = import_cheeses(
+                stream, file_format,
+                chunk_size=options["chunk_size"],
+                create_types=options["create_types"],
+                max_errors=0,  # ошибки уже выведены по ходу
+                on_error=report_error,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено: {result.created}, обновлено: {result.updated}, "
+            f"с ошибками: {result.error_count}"
+        ))
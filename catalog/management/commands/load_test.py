@@ -0,0 +1,126 @@
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmarks import LatencyStats, format_ms
+
+# Каталог, сортировка, поиск ("сыр") и статичная страница
+DEFAULT_PATHS = ["/", "/?order_by=price", "/?q=%D1%81%D1%8B%D1%80",
+                 "/about/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает один или несколько запущенных серверов GET-запросами "
+        "и сравнивает запросы в секунду и задержки (p50/p95/p99). "
+        "Например: load_test http://localhost:8003 http://localhost:8001 "
+        "- синхронный gunicorn против ASGI-воркеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="+",
+                            help="Базовые адреса серверов")
+        parser.add_argument("--path", action="append", dest="paths",
+                            help="Путь для запросов (можно несколько раз)")
+        parser.add_argument("--concurrency", type=int, default=32,
+                            help="Число одновременных клиентов")
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Длительность замера для сервера, секунд")
+        parser.add_argument("--cookie", default="",
+                            help="Заголовок Cookie, например sessionid=... "
+                                 "для страниц партий")
+        parser.add_argument("--timeout", type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        self.paths = options["paths"] or DEFAULT_PATHS
+        self.concurrency = options["concurrency"]
+        self.duration = options["duration"]
+        self.timeout = options["timeout"]
+        self.headers = {"Connection": "keep-alive"}
+        if options["cookie"]:
+            self.headers["Cookie"] = options["cookie"]
+
+        results = []
+        for target in options["targets"]:
+            parts = urlsplit(target)
+            if parts.scheme not in ("http", "https") or not parts.netloc:
+                raise CommandError(f"Некорректный адрес: {target}")
+            summary = self.run(parts)
+            results.append((target, summary))
+            self.report(target, summary)
+
+        if len(results) > 1:
+            (first, base), *others = results
+            for target, summary in others:
+                rps = (summary["per_second"] / base["per_second"]
+                       if base["per_second"] else 0)
+                self.stdout.write(
+                    f"{target} против {first}: x{rps:.2f} запросов в "
+                    f"секунду, p99 {format_ms(base['p99_ms'])} -> "
+                    f"{format_ms(summary['p99_ms'])} мс"
+                )
+
+    def connect(self, parts):
+        connection_class = (http.client.HTTPSConnection
+                            if parts.scheme == "https"
+                            else http.client.HTTPConnection)
+        return connection_class(parts.netloc, timeout=self.timeout)
+
+    def run(self, parts):
+        prefix = parts.path.rstrip("/")
+        deadline = time.perf_counter() + self.duration
+        stats = [LatencyStats() for _ in range(self.concurrency)]
+        threads = [
+            threading.Thread(target=self.client_loop,
+                             args=(parts, prefix, deadline, client, index))
+            for index, client in enumerate(stats)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        merged = LatencyStats()
+        for client in stats:
+            merged.merge(client)
+        return merged.summary(elapsed)
+
+    def client_loop(self, parts, prefix, deadline, stats, index):
+        connection = self.connect(parts)
+        # Клиенты начинают с разных путей, чтобы не ходить строем
+        request_number = index
+        try:
+            while time.perf_counter() < deadline:
+                path = prefix + self.paths[request_number % len(self.paths)]
+                request_number += 1
+                started = time.perf_counter()
+                try:
+                    connection.request("GET", path, headers=self.headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    stats.error()
+                    connection.close()
+                    connection = self.connect(parts)
+                    continue
+                if response.status >= 400:
+                    stats.error()
+                    continue
+                stats.add(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def report(self, target, summary):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{target}"))
+        self.stdout.write(
+            f"  {summary['count']} запросов, "
+            f"{summary['per_second']:.1f}/с, ошибок {summary['errors']}\n"
+            f"  p50 {format_ms(summary['p50_ms'])} мс, "
+            f"p95 {format_ms(summary['p95_ms'])} мс, "
+            f"p99 {format_ms(summary['p99_ms'])} мс"
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from catalog.search import fts_supported, install_search_index
+
+
+class Command(BaseCommand):
+    help = "Пересоздаёт полнотекстовый индекс названий сыров"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default=DEFAULT_DB_ALIAS,
+            help="Псевдоним базы данных",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not fts_supported(connection):
+            raise CommandError(
+                f"Полнотекстовый индекс не поддерживается для "
+                f"{connection.vendor}: используется поиск icontains"
+            )
+        install_search_index(connection, rebuild=True)
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен"))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу объёмами, близкими к рабочим: типы сыра, сыры с "
+        "оптовыми уровнями, прайс-листы, менеджеры и партии с позициями. "
+        "Одна транзакция, вставка пачками (bulk_create); при том же "
+        "--seed данные одинаковые. Повторный запуск дописывает данные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cheese-types", type=int, default=20)
+        parser.add_argument("--cheeses", type=int, default=20000)
+        parser.add_argument("--price-lists", type=int, default=3)
+        parser.add_argument("--users", type=int, default=20,
+                            help="Менеджеров по продажам")
+        parser.add_argument("--batches", type=int, default=2000)
+        parser.add_argument("--max-lines", type=int, default=50,
+                            help="Наибольшее число позиций в партии")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["cheese_types"] < 1 or options["cheeses"] < 1:
+            raise CommandError("Нужны хотя бы один тип сыра и один сыр")
+        if options["batches"] and options["users"] < 1:
+            raise CommandError("Партиям нужен хотя бы один менеджер")
+        started = time.perf_counter()
+        with transaction.atomic():
+            data = seed_catalog(
+                cheese_types=options["cheese_types"],
+                cheeses=options["cheeses"],
+                managers=options["users"],
+                batches=options["batches"],
+                max_lines=options["max_lines"],
+                price_lists=options["price_lists"],
+                seed=options["seed"],
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Типов: {len(data['cheese_types'])}, "
+            f"сыров: {len(data['cheeses'])}, "
+            f"прайс-листов: {len(data['price_lists'])}, "
+            f"менеджеров: {len(data['managers'])}, "
+            f"партий: {len(data['batches'])} за {elapsed:.1f} с"
+        ))
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.slow_queries import read_log, request_url, summarize
+
+# Сколько символов SQL выводить
+SQL_PREVIEW = 300
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводка журнала медленных SQL (SLOW_QUERY_LOG): отпечатки "
+        "запросов по общему времени, страницы, которые их выполняли, "
+        "самый медленный случай с параметрами и план"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?",
+                            help="Файл журнала (по умолчанию "
+                                 "SLOW_QUERY_LOG)")
+        parser.add_argument("--top", type=int, default=10,
+                            help="Сколько отпечатков вывести")
+        parser.add_argument("--url-name",
+                            help="Только запросы этой страницы")
+        parser.add_argument("--plans", action="store_true",
+                            help="Выводить EXPLAIN")
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.SLOW_QUERY_LOG
+        if not path:
+            raise CommandError("Укажите файл или задайте SLOW_QUERY_LOG")
+        try:
+            with open(path, encoding="utf-8") as stream:
+                records, broken = read_log(stream)
+        except OSError as error:
+            raise CommandError(f"Не удалось прочитать {path}: {error}")
+        if broken:
+            self.stderr.write(f"Пропущено испорченных строк: {broken}")
+
+        summary = summarize(records, options["url_name"])
+        total_ms = sum(group["total_ms"] for group in summary)
+        self.stdout.write(
+            f"Медленных запросов: {sum(g['count'] for g in summary)}, "
+            f"отпечатков: {len(summary)}, всего {total_ms:.1f} мс")
+        for number, group in enumerate(summary[:options["top"]], 1):
+            share = group["total_ms"] / total_ms * 100 if total_ms else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n{number}. {group['fingerprint']}: "
+                f"{group['total_ms']:.1f} мс ({share:.0f}%), "
+                f"{group['count']} раз, среднее {group['mean_ms']:.1f} мс, "
+                f"наибольшее {group['max_ms']:.1f} мс"))
+            pages = ", ".join(
+                f"{url_name or '-'} x{count}"
+                for url_name, count in group["url_names"].most_common())
+            self.stdout.write(f"   Страницы: {pages}")
+            self.stdout.write(
+                f"   Самый медленный: {request_url(group['slowest'])}")
+            sql = group["sql"]
+            if len(sql) > SQL_PREVIEW:
+                sql = sql[:SQL_PREVIEW] + "..."
+            self.stdout.write(f"   {sql}")
+            if options["plans"] and group["plan"]:
+                for line in group["plan"]:
+                    self.stdout.write(f"     {line}")
@@ -0,0 +1,251 @@
+"""Метрики Prometheus: страница /metrics каждого сервера приложения.
+
+MetricsMiddleware (включается PROMETHEUS_METRICS=1) записывает по имени
+маршрута время ответа, ответы по кодам, число и время SQL-запросов.
+cache_anonymous_page отмечает попадания и промахи кэша страниц (доля
+попаданий - отношение rate() двух рядов), update_batch_items -
+добавленные, изменённые и удалённые позиции партий (rate() по ним -
+пропускная способность). Несколько показателей каталога считаются
+в момент сбора запросами по индексам (CatalogCollector).
+
+Под gunicorn у каждого воркера свои счётчики. Если задан
+PROMETHEUS_MULTIPROC_DIR, prometheus_client пишет их в mmap-файлы этого
+каталога, а /metrics складывает файлы всех воркеров сервера
+(MultiProcessCollector). Очищает каталог при старте и отмечает
+завершённые воркеры gunicorn.conf.py. У web1 и web2 каталоги свои,
+Prometheus опрашивает каждый сервер отдельно.
+
+SQL считает execute_wrapper, который ставится на соединение один раз
+при его открытии (а не на каждый запрос, как в profiling: под ASGI это
+лишний переход в поток) и вне замера сводится к чтению contextvar.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+
+from .models import Batch, BatchItem, Cheese
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # необязателен: без него метрики не собираются
+    prometheus_client = None
+
+METRICS_AVAILABLE = prometheus_client is not None
+
+# Границы гистограмм времени, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+                   1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Остальные методы пишутся как other, чтобы не плодить ряды
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+# За какой период считаются недавние партии и позиции
+RECENT_PERIOD = timedelta(hours=1)
+
+if METRICS_AVAILABLE:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+    REQUEST_DURATION = prometheus_client.Histogram(
+        "catalog_request_duration_seconds", "Время ответа",
+        ["url_name", "method"], buckets=LATENCY_BUCKETS)
+    RESPONSES = prometheus_client.Counter(
+        "catalog_responses", "Ответы по кодам",
+        ["url_name", "method", "status"])
+    REQUEST_QUERIES = prometheus_client.Histogram(
+        "catalog_request_db_queries", "SQL-запросов на один запрос",
+        ["url_name"], buckets=QUERY_BUCKETS)
+    REQUEST_DB_DURATION = prometheus_client.Histogram(
+        "catalog_request_db_duration_seconds", "Время SQL одного запроса",
+        ["url_name"], buckets=LATENCY_BUCKETS)
+    PAGE_CACHE = prometheus_client.Counter(
+        "catalog_page_cache_requests", "Обращения к кэшу страниц",
+        ["page", "result"])
+    BATCH_LINES = prometheus_client.Counter(
+        "catalog_batch_lines", "Изменённые позиции партий", ["action"])
+
+# Замер текущего запроса; None - запрос не замеряется
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """SQL одного запроса: число и время в секундах"""
+
+    __slots__ = ("queries", "db")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.db += time.perf_counter() - started
+
+
+def _watch_connection(sender, connection, **kwargs):
+    # В начало списка: connection.execute_wrapper() (query_budget,
+    # count_queries) снимает свою обёртку с конца
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def _install_query_counter():
+    """Ставит _record_query на соединения, в том числе будущие"""
+    connection_created.connect(_watch_connection,
+                               dispatch_uid="catalog_metrics")
+    for connection in connections.all():
+        _watch_connection(None, connection)
+
+
+def record_cache(page, hit):
+    """Отмечает обращение к кэшу страницы page"""
+    if METRICS_AVAILABLE:
+        PAGE_CACHE.labels(page, "hit" if hit else "miss").inc()
+
+
+def record_batch_lines(added=0, changed=0, deleted=0):
+    """Отмечает изменения позиций партий после фиксации транзакции"""
+    if not METRICS_AVAILABLE:
+        return
+
+    def record():
+        for action, count in (("added", added), ("changed", changed),
+                              ("deleted", deleted)):
+            if count:
+                BATCH_LINES.labels(action).inc(count)
+
+    transaction.on_commit(record)
+
+
+class MetricsMiddleware:
+    """Время, код ответа и SQL каждого запроса.
+
+    Ставится в начало MIDDLEWARE, чтобы в замер попали и запросы
+    сессии и пользователя.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not METRICS_AVAILABLE:
+            raise ImproperlyConfigured(
+                "Для PROMETHEUS_METRICS установите prometheus_client")
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Ряды по (маршрут, метод, код): labels() на каждый запрос
+        # заметно дороже поиска в словаре
+        self.children = {}
+        _install_query_counter()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started,
+                     request_metrics)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started,
+                     request_metrics)
+        return response
+
+    def observe(self, request, response, duration, request_metrics):
+        match = request.resolver_match
+        if match is None:
+            url_name = "unmatched"
+        else:
+            url_name = match.url_name or "unnamed"
+        method = request.method if request.method in METHODS else "other"
+        key = (url_name, method, response.status_code)
+        children = self.children.get(key)
+        if children is None:
+            children = self.children[key] = (
+                REQUEST_DURATION.labels(url_name, method),
+                RESPONSES.labels(url_name, method, str(key[2])),
+                REQUEST_QUERIES.labels(url_name),
+                REQUEST_DB_DURATION.labels(url_name),
+            )
+        duration_metric, responses, queries, db_duration = children
+        duration_metric.observe(duration)
+        responses.inc()
+        queries.observe(request_metrics.queries)
+        db_duration.observe(request_metrics.db)
+
+
+class CatalogCollector:
+    """Показатели каталога на момент сбора: три запроса по индексам"""
+
+    def collect(self):
+        cheeses = Cheese.objects.aggregate(
+            total=Count("id"), in_stock=Count("id", filter=Q(in_stock=True)))
+        since = timezone.now() - RECENT_PERIOD
+        gauge = GaugeMetricFamily("catalog_cheeses", "Сыров в каталоге",
+                                  labels=["in_stock"])
+        gauge.add_metric(["true"], cheeses["in_stock"])
+        gauge.add_metric(["false"], cheeses["total"] - cheeses["in_stock"])
+        yield gauge
+        yield GaugeMetricFamily(
+            "catalog_recent_batches", "Партий за последний час",
+            value=Batch.objects.filter(created_at__gte=since).count())
+        yield GaugeMetricFamily(
+            "catalog_recent_batch_lines", "Позиций в партиях за последний час",
+            value=BatchItem.objects.filter(
+                batch__created_at__gte=since).count())
+
+
+def _registry():
+    """Реестр одного сбора: счётчики процесса или всех воркеров"""
+    registry = prometheus_client.CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(prometheus_client.REGISTRY)
+    registry.register(CatalogCollector())
+    return registry
+
+
+def metrics_view(request):
+    """Страница для Prometheus; доступна только при PROMETHEUS_METRICS"""
+    if not settings.PROMETHEUS_METRICS:
+        raise Http404
+    return HttpResponse(prometheus_client.generate_latest(_registry()),
+                        content_type=prometheus_client.CONTENT_TYPE_LATEST)
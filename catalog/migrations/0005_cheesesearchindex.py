@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:20
+
+import catalog.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0004_remove_batch_total_discount_percent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CheeseSearchIndex",
+            fields=[
+                (
+                    "cheese",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="catalog.cheese",
+                    ),
+                ),
+                ("name", catalog.search.SearchTextField()),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "catalog_cheese_fts",
+                "managed": False,
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_cheesesearchindex"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batch",
+            index=models.Index(
+                fields=["manager", "-created_at"],
+                name="batch_manager_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="batchitem",
+            index=models.Index(
+                fields=["batch", "cheese"], name="batchitem_batch_cheese_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(fields=["name", "id"], name="cheese_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["price", "id"], name="cheese_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["weight", "id"], name="cheese_weight_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["cheese_type", "name", "id"],
+                name="cheese_type_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["cheese_type", "price", "id"],
+                name="cheese_type_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["cheese_type", "weight", "id"],
+                name="cheese_type_weight_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["in_stock", "name", "id"], name="cheese_stock_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["in_stock", "price", "id"],
+                name="cheese_stock_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["in_stock", "weight", "id"],
+                name="cheese_stock_weight_idx",
+            ),
+        ),
+    ]
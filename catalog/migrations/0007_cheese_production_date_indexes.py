@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["production_date", "id"], name="cheese_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["cheese_type", "production_date", "id"],
+                name="cheese_type_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cheese",
+            index=models.Index(
+                fields=["in_stock", "production_date", "id"],
+                name="cheese_stock_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_catalog_version_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cheese",
+            name="sku",
+            field=models.CharField(
+                blank=True,
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="Артикул",
+            ),
+        ),
+    ]
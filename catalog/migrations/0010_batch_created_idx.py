@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_cheese_sku"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batch",
+            index=models.Index(
+                fields=["created_at"], name="batch_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import (
+    Case,
+    DecimalField,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import Exact
+
+# Правила расчёта на момент миграции; catalog.pricing не используется,
+# чтобы его изменения не меняли уже применённые миграции
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def unit_price(quantity):
+    """Цена позиции по оптовым полям сыра (правила на момент 0011)"""
+    return Case(
+        When(
+            Q(
+                cheese__min_qty_big_opt__gt=0,
+                cheese__min_qty_big_opt__lte=quantity,
+                cheese__price_big_opt__isnull=False,
+            ),
+            then=F("cheese__price_big_opt"),
+        ),
+        When(
+            Q(
+                cheese__min_qty_small_opt__gt=0,
+                cheese__min_qty_small_opt__lte=quantity,
+                cheese__price_small_opt__isnull=False,
+            ),
+            then=F("cheese__price_small_opt"),
+        ),
+        default=F("cheese__price"),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def discount_percent():
+    """Скидка партии по сохранённым суммам, в процентах"""
+    return Round(
+        Case(
+            When(Exact(F("total_base"), 0), then=Value(0)),
+            default=(F("total_base") - F("total_price"))
+            * 100
+            / F("total_base"),
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        ),
+        2,
+    )
+
+
+def fill_batch_totals(apps, schema_editor):
+    Batch = apps.get_model("catalog", "Batch")
+    BatchItem = apps.get_model("catalog", "BatchItem")
+    alias = schema_editor.connection.alias
+    items = (
+        BatchItem.objects.using(alias)
+        .filter(batch=OuterRef("pk"))
+        .order_by()
+        .values("batch")
+    )
+
+    # Снимков цен в позициях ещё нет (0012): считаем по ценам сыров
+    def total(price):
+        total = Sum(F("quantity") * price, output_field=MONEY_FIELD)
+        return Coalesce(
+            Subquery(
+                items.annotate(total=total).values("total"),
+                output_field=MONEY_FIELD,
+            ),
+            Value(0),
+            output_field=MONEY_FIELD,
+        )
+
+    batches = Batch.objects.using(alias)
+    batches.update(
+        total_base=total(F("cheese__price")),
+        total_price=total(unit_price(F("quantity"))),
+    )
+    batches.update(discount_percent=discount_percent())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_batch_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batch",
+            name="discount_percent",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=5,
+                verbose_name="Скидка, %",
+            ),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="total_base",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=14,
+                verbose_name="Сумма без скидок",
+            ),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="total_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=14,
+                verbose_name="Сумма с учётом скидок",
+            ),
+        ),
+        migrations.RunPython(fill_batch_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import (
+    Case,
+    CharField,
+    DecimalField,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import Exact
+
+# Правила расчёта на момент миграции; catalog.pricing не используется,
+# чтобы его изменения не меняли уже применённые миграции
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+PRICE_FIELD = DecimalField(max_digits=8, decimal_places=2)
+
+
+def by_tier(big_opt, small_opt, base, output_field):
+    """Значение по уровню цены сыра для количества позиции (OuterRef)"""
+    quantity = OuterRef("quantity")
+    return Case(
+        When(
+            Q(
+                min_qty_big_opt__gt=0,
+                min_qty_big_opt__lte=quantity,
+                price_big_opt__isnull=False,
+            ),
+            then=big_opt,
+        ),
+        When(
+            Q(
+                min_qty_small_opt__gt=0,
+                min_qty_small_opt__lte=quantity,
+                price_small_opt__isnull=False,
+            ),
+            then=small_opt,
+        ),
+        default=base,
+        output_field=output_field,
+    )
+
+
+def batch_totals(items):
+    """Суммы партии по снимкам цен позиций"""
+    items = items.order_by().values("batch")
+
+    def total(price):
+        total = Sum(F("quantity") * F(price), output_field=MONEY_FIELD)
+        return Coalesce(
+            Subquery(
+                items.annotate(total=total).values("total"),
+                output_field=MONEY_FIELD,
+            ),
+            Value(0),
+            output_field=MONEY_FIELD,
+        )
+
+    return {
+        "total_base": total("base_price"),
+        "total_price": total("unit_price"),
+    }
+
+
+def discount_percent():
+    """Скидка партии по сохранённым суммам, в процентах"""
+    return Round(
+        Case(
+            When(Exact(F("total_base"), 0), then=Value(0)),
+            default=(F("total_base") - F("total_price"))
+            * 100
+            / F("total_base"),
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        ),
+        2,
+    )
+
+
+def fill_price_snapshots(apps, schema_editor):
+    Batch = apps.get_model("catalog", "Batch")
+    BatchItem = apps.get_model("catalog", "BatchItem")
+    Cheese = apps.get_model("catalog", "Cheese")
+    alias = schema_editor.connection.alias
+    cheeses = Cheese.objects.using(alias).filter(id=OuterRef("cheese_id"))
+
+    def value(expression, output_field):
+        return Subquery(
+            cheeses.annotate(value=expression).values("value"),
+            output_field=output_field,
+        )
+
+    unit_price = by_tier(
+        F("price_big_opt"), F("price_small_opt"), F("price"), PRICE_FIELD
+    )
+    tier = by_tier(
+        Value("big_opt"), Value("small_opt"), Value("base"), CharField()
+    )
+    BatchItem.objects.using(alias).update(
+        base_price=value(F("price"), PRICE_FIELD),
+        unit_price=value(unit_price, PRICE_FIELD),
+        tier=value(tier, CharField()),
+    )
+    items = BatchItem.objects.using(alias).filter(batch=OuterRef("pk"))
+    batches = Batch.objects.using(alias)
+    batches.update(**batch_totals(items))
+    batches.update(discount_percent=discount_percent())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_batch_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchitem",
+            name="base_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=8,
+                verbose_name="Базовая цена",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="batchitem",
+            name="tier",
+            field=models.CharField(
+                choices=[
+                    ("base", "Базовая цена"),
+                    ("small_opt", "Мелкий опт"),
+                    ("big_opt", "Крупный опт"),
+                ],
+                default="base",
+                max_length=16,
+                verbose_name="Уровень цены",
+            ),
+        ),
+        migrations.AddField(
+            model_name="batchitem",
+            name="unit_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=8,
+                verbose_name="Цена за единицу",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_price_snapshots, migrations.RunPython.noop),
+    ]
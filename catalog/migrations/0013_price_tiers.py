@@ -0,0 +1,177 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+
+# Оптовые поля сыра: (уровень в BatchItem.tier, количество, цена)
+LEGACY_TIERS = [
+    ("small_opt", "min_qty_small_opt", "price_small_opt"),
+    ("big_opt", "min_qty_big_opt", "price_big_opt"),
+]
+
+
+def fill_price_tiers(apps, schema_editor):
+    """Переносит оба оптовых уровня сыров в общий прайс-лист"""
+    Cheese = apps.get_model("catalog", "Cheese")
+    PriceTier = apps.get_model("catalog", "PriceTier")
+    BatchItem = apps.get_model("catalog", "BatchItem")
+    alias = schema_editor.connection.alias
+
+    fields = [field for _, *pair in LEGACY_TIERS for field in pair]
+    cheeses = (
+        Cheese.objects.using(alias)
+        .filter(
+            Q(min_qty_small_opt__gt=0, price_small_opt__isnull=False)
+            | Q(min_qty_big_opt__gt=0, price_big_opt__isnull=False)
+        )
+        .values_list("id", *fields)
+    )
+    tiers = []
+    for cheese_id, *values in cheeses.iterator(chunk_size=2000):
+        levels = {}
+        # Крупный опт последним: при одинаковом количестве он важнее
+        for min_qty, price in zip(values[::2], values[1::2]):
+            if min_qty and price is not None:
+                levels[min_qty] = price
+        tiers.extend(
+            PriceTier(cheese_id=cheese_id, min_qty=min_qty, price=price)
+            for min_qty, price in levels.items()
+        )
+        if len(tiers) >= 2000:
+            PriceTier.objects.using(alias).bulk_create(tiers)
+            tiers = []
+    PriceTier.objects.using(alias).bulk_create(tiers)
+
+    # Уровень снимка позиции: количество "от" вместо названия уровня
+    items = BatchItem.objects.using(alias)
+    for tier, min_qty_field, _ in LEGACY_TIERS:
+        items.filter(tier=tier).update(
+            tier_min_qty=Subquery(
+                Cheese.objects.using(alias)
+                .filter(id=OuterRef("cheese_id"))
+                .values(min_qty_field)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_batchitem_price_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceList",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Название"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Прайс-лист",
+                "verbose_name_plural": "Прайс-листы",
+            },
+        ),
+        migrations.AddField(
+            model_name="batchitem",
+            name="tier_min_qty",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Оптовый уровень, от шт."
+            ),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="price_list",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="batches",
+                to="catalog.pricelist",
+                verbose_name="Прайс-лист",
+            ),
+        ),
+        migrations.CreateModel(
+            name="PriceTier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "min_qty",
+                    models.PositiveIntegerField(verbose_name="От, шт."),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=8, verbose_name="Цена"
+                    ),
+                ),
+                (
+                    "cheese",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_tiers",
+                        to="catalog.cheese",
+                    ),
+                ),
+                (
+                    "price_list",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tiers",
+                        to="catalog.pricelist",
+                        verbose_name="Прайс-лист",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Оптовый уровень",
+                "verbose_name_plural": "Оптовые уровни",
+                "indexes": [
+                    models.Index(
+                        fields=["cheese", "min_qty"],
+                        name="pricetier_cheese_min_qty_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("price_list", "cheese", "min_qty"),
+                        name="pricetier_list_unique",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("price_list__isnull", True)),
+                        fields=("cheese", "min_qty"),
+                        name="pricetier_general_unique",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_price_tiers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="batchitem",
+            name="tier",
+        ),
+    ]
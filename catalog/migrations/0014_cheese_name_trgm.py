@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Выражение должно совпадать с тем, что Django строит для icontains и
+# istartswith на PostgreSQL: UPPER("name"::text) LIKE UPPER(...)
+CREATE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS cheese_name_trgm_idx ON catalog_cheese "
+    "USING gin (UPPER(name::text) gin_trgm_ops)"
+)
+DROP_INDEX = "DROP INDEX IF EXISTS cheese_name_trgm_idx"
+
+
+def create_trigram_index(apps, schema_editor):
+    # На SQLite подстроки ищет FTS5 (catalog.search)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            # Без contrib-пакета поиск работает, но полным просмотром
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_price_tiers"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,16 +1,55 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+
+from .pricing import (BATCH_DISCOUNT_EXPRESSION, MONEY_FIELD,
+                      batch_totals_expressions, discount_percent,
+                      discount_percent_expression, legacy_tiers,
+                      merge_tiers, pick_tier, price_batch,
+                      price_snapshot_expressions)
+from .search import FTS_TABLE, SearchTextField
+
+
+class CatalogVersion(models.Model):
+    """Счётчик изменений каталога (одна строка).
+
+    Увеличивается при любом изменении сыров и их типов; по нему
+    строятся ETag списка и ключи кэша страниц каталога.
+    """
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    SINGLETON_ID = 1
+
+    @classmethod
+    def current(cls):
+        version, _ = cls.objects.get_or_create(id=cls.SINGLETON_ID)
+        return version
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(id=cls.SINGLETON_ID).update(
+            version=F("version") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(id=cls.SINGLETON_ID)
 
 
 class CheeseType(models.Model):
     name = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
 class Cheese(models.Model):
+    # Артикул поставщика: ключ для массового импорта (import_cheeses)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True,
+                           verbose_name="Артикул")
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=8,
                                 decimal_places=2)  # цена за единицу
@@ -43,10 +82,197 @@ class Cheese(models.Model):
     cheese_type = models.ForeignKey(CheeseType, on_delete=models.CASCADE)
     in_stock = models.BooleanField(default=True)
     production_date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Индексы под фильтры и сортировки каталога (cheese_list):
+        # поле сортировки + id для постраничного вывода по ключу
+        indexes = [
+            models.Index(fields=["name", "id"], name="cheese_name_idx"),
+            models.Index(fields=["price", "id"], name="cheese_price_idx"),
+            models.Index(fields=["weight", "id"], name="cheese_weight_idx"),
+            models.Index(fields=["production_date", "id"],
+                         name="cheese_date_idx"),
+            models.Index(fields=["cheese_type", "name", "id"],
+                         name="cheese_type_name_idx"),
+            models.Index(fields=["cheese_type", "price", "id"],
+                         name="cheese_type_price_idx"),
+            models.Index(fields=["cheese_type", "weight", "id"],
+                         name="cheese_type_weight_idx"),
+            models.Index(fields=["cheese_type", "production_date", "id"],
+                         name="cheese_type_date_idx"),
+            models.Index(fields=["in_stock", "name", "id"],
+                         name="cheese_stock_name_idx"),
+            models.Index(fields=["in_stock", "price", "id"],
+                         name="cheese_stock_price_idx"),
+            models.Index(fields=["in_stock", "weight", "id"],
+                         name="cheese_stock_weight_idx"),
+            models.Index(fields=["in_stock", "production_date", "id"],
+                         name="cheese_stock_date_idx"),
+        ]
+
+    # Поля оптовых уровней общего прайс-листа (см. PriceTier)
+    TIER_FIELDS = {"price_small_opt", "min_qty_small_opt", "price_big_opt",
+                   "min_qty_big_opt"}
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        sync_tiers = (update_fields is None
+                      or self.TIER_FIELDS & set(update_fields))
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if sync_tiers:
+                PriceTier.objects.sync_general([self])
+
+
+class PriceList(models.Model):
+    """Прайс-лист покупателя: свои оптовые уровни поверх общих"""
+    name = models.CharField(max_length=100, unique=True,
+                            verbose_name="Название")
+
+    class Meta:
+        verbose_name = "Прайс-лист"
+        verbose_name_plural = "Прайс-листы"
+
+    def __str__(self):
+        return self.name
+
+
+class PriceTierQuerySet(models.QuerySet):
+    def for_batch(self, batch_id):
+        """Уровни, действующие для партии: общие и её прайс-листа.
+
+        batch_id может быть OuterRef: прайс-лист берётся соединением
+        с партией, без отдельного запроса.
+        """
+        return self.filter(Q(price_list__isnull=True)
+                           | Q(price_list__batches=batch_id))
+
+    def lookup(self, cheese_id, quantity):
+        """Уровень (от, цена) для одной позиции или None.
+
+        Один запрос по индексу (cheese, min_qty); уровень прайс-листа
+        важнее общего.
+        """
+        return (self.filter(cheese_id=cheese_id, min_qty__lte=quantity)
+                .order_by(F("price_list").asc(nulls_last=True), "-min_qty")
+                .values_list("min_qty", "price").first())
+
+    def resolve(self, lines):
+        """Уровни для всех позиций сразу одним запросом.
+
+        lines - пары (id сыра, количество). Возвращает словарь
+        {(id сыра, количество): (от, цена) или None}.
+        """
+        lines = set(lines)
+        own, general = {}, {}
+        rows = self.filter(cheese_id__in={cheese_id for cheese_id, _ in lines})
+        for cheese_id, price_list_id, min_qty, price in rows.order_by(
+                "min_qty").values_list("cheese_id", "price_list_id",
+                                       "min_qty", "price"):
+            tiers = general if price_list_id is None else own
+            tiers.setdefault(cheese_id, []).append((min_qty, price))
+        return {
+            (cheese_id, quantity):
+                pick_tier(own.get(cheese_id, []), quantity)
+                or pick_tier(general.get(cheese_id, []), quantity)
+            for cheese_id, quantity in lines
+        }
+
+    def ladders(self, cheese_ids, price_list_id=None):
+        """Лестницы уровней сыров одним запросом.
+
+        Возвращает {id сыра: [(от, цена)] по возрастанию "от"}: общие
+        уровни и уровни прайс-листа price_list_id, сведённые
+        merge_tiers. Сыры без уровней в словарь не попадают.
+        """
+        rows = self.filter(cheese_id__in=cheese_ids)
+        if price_list_id is None:
+            rows = rows.filter(price_list__isnull=True)
+        else:
+            rows = rows.filter(Q(price_list__isnull=True)
+                               | Q(price_list_id=price_list_id))
+        own, general = {}, {}
+        for cheese_id, list_id, min_qty, price in rows.order_by(
+                "min_qty").values_list("cheese_id", "price_list_id",
+                                       "min_qty", "price"):
+            tiers = general if list_id is None else own
+            tiers.setdefault(cheese_id, []).append((min_qty, price))
+        return {cheese_id: merge_tiers(general.get(cheese_id, []),
+                                       own.get(cheese_id, []))
+                for cheese_id in general.keys() | own.keys()}
+
+    def sync_general(self, cheeses):
+        """Переписывает общие уровни сыров по их полям опта"""
+        self.filter(price_list=None,
+                    cheese__in=[cheese.id for cheese in cheeses]).delete()
+        self.bulk_create([
+            PriceTier(cheese=cheese, min_qty=min_qty, price=price)
+            for cheese in cheeses
+            for min_qty, price in legacy_tiers(cheese)
+        ])
+
+
+class PriceTier(models.Model):
+    """Оптовая цена сыра от min_qty штук.
+
+    Без прайс-листа - общий уровень (его задают поля опта у сыра), с
+    прайс-листом - уровень этого прайс-листа.
+    """
+    cheese = models.ForeignKey(Cheese, on_delete=models.CASCADE,
+                               related_name="price_tiers")
+    price_list = models.ForeignKey(
+        PriceList, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="tiers", verbose_name="Прайс-лист")
+    min_qty = models.PositiveIntegerField(verbose_name="От, шт.")
+    price = models.DecimalField(max_digits=8, decimal_places=2,
+                                verbose_name="Цена")
+
+    objects = PriceTierQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Оптовый уровень"
+        verbose_name_plural = "Оптовые уровни"
+        indexes = [
+            # Поиск уровня для позиции: сыр и "от" не больше количества
+            models.Index(fields=["cheese", "min_qty"],
+                         name="pricetier_cheese_min_qty_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["price_list", "cheese", "min_qty"],
+                name="pricetier_list_unique"),
+            models.UniqueConstraint(
+                fields=["cheese", "min_qty"],
+                condition=Q(price_list__isnull=True),
+                name="pricetier_general_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.cheese} от {self.min_qty}: {self.price}"
+
+
+class CheeseSearchIndex(models.Model):
+    """Строка полнотекстового индекса названий сыров.
+
+    Таблица FTS5 создаётся и обновляется вне миграций (см. search.py),
+    модель нужна только для соединения с ней в запросах.
+    """
+    cheese = models.OneToOneField(
+        Cheese, primary_key=True, db_column="rowid",
+        on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name="search_index",
+    )
+    name = SearchTextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -60,45 +286,140 @@ class User(AbstractUser):
                             choices=ROLE_CHOICES, default="guest")
 
 
+class BatchQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Добавляет суммы и скидку партии, посчитанные заново в SQL.
+
+        computed_total_base - сумма по базовым ценам, computed_total_price
+        - с учётом оптовых цен, computed_discount_percent - скидка в
+        процентах; всё по снимкам цен позиций. Нужны для сверки с
+        сохранёнными итогами (check_batch_totals); страницы читают сами
+        столбцы.
+        """
+        base_total = Sum(F("items__quantity") * F("items__base_price"),
+                         output_field=MONEY_FIELD)
+        discounted_total = Sum(F("items__quantity") * F("items__unit_price"),
+                               output_field=MONEY_FIELD)
+        return self.annotate(
+            computed_total_base=Coalesce(base_total, Value(0),
+                                         output_field=MONEY_FIELD),
+            computed_total_price=Coalesce(discounted_total, Value(0),
+                                          output_field=MONEY_FIELD),
+        ).annotate(
+            computed_discount_percent=discount_percent_expression(
+                F("computed_total_base"), F("computed_total_price")),
+        )
+
+    def refresh_totals(self):
+        """Пересчитывает сохранённые итоги партий (два UPDATE)"""
+        items = BatchItem.objects.filter(batch=OuterRef("pk"))
+        updated = self.update(**batch_totals_expressions(items))
+        if updated:
+            self.update(discount_percent=BATCH_DISCOUNT_EXPRESSION)
+        return updated
+
+
 class Batch(models.Model):
     manager = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
         related_name="batches"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Прайс-лист покупателя; без него действуют общие оптовые цены
+    price_list = models.ForeignKey(
+        PriceList, on_delete=models.PROTECT, null=True, blank=True,
+        related_name="batches", verbose_name="Прайс-лист")
+    # Итоги по позициям хранятся в партии и пересчитываются в той же
+    # транзакции, что и изменение позиций
+    total_base = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        verbose_name="Сумма без скидок")
+    total_price = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        verbose_name="Сумма с учётом скидок")
+    discount_percent = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0,
+        verbose_name="Скидка, %")
+
+    TOTAL_FIELDS = ["total_base", "total_price", "discount_percent"]
+
+    objects = BatchQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Список партий менеджера, новые сверху (batch_list)
+            models.Index(fields=["manager", "-created_at"],
+                         name="batch_manager_created_idx"),
+            # Выгрузка партий за период (export_batches)
+            models.Index(fields=["created_at"], name="batch_created_idx"),
+        ]
 
     def __str__(self):
         return f"Партия #{self.id} менеджер: {self.manager.username}"
 
+    @property
+    def pricing(self):
+        """Позиции партии с ценами, посчитанные одним запросом"""
+        return price_batch(self)
+
     @property
     def total_base_price(self):
         """Общая цена без скидок (базовая цена * количество)"""
-        return sum(item.cheese.price *
-                   item.quantity for item in self.items.all())
+        return self.total_base
 
     @property
     def total_price_before_batch_discount(self):
         """Сумма по позициям с учётом скидок товаров"""
-        return sum(item.total_price for item in self.items.all())
+        return self.total_price
 
     @property
     def total_discount_amount(self):
         """Сумма скидки по позициям"""
-        return self.total_base_price - self.total_price_before_batch_discount
+        return self.total_base - self.total_price
 
     @property
     def total_discount_percent(self):
         """Общая скидка по позициям в партии в процентах"""
-        base = self.total_base_price
-        if base == 0:
-            return 0
-        discount = (base - self.total_price_before_batch_discount) / base * 100
-        return round(discount, 2)
+        return self.discount_percent
+
+    @transaction.atomic
+    def reprice(self):
+        """Пересчитывает позиции по текущим ценам сыров и итоги партии"""
+        BatchItem.objects.filter(batch=self).reprice()
+        self.refresh_totals()
+
+    def refresh_totals(self):
+        """Пересчитывает итоги в базе и в этом экземпляре"""
+        if Batch.objects.filter(id=self.id).refresh_totals():
+            self.refresh_from_db(fields=self.TOTAL_FIELDS)
 
-    @property
-    def total_price(self):
-        """Итоговая сумма партии с учётом скидок товаров"""
-        return self.total_price_before_batch_discount
+
+class BatchItemQuerySet(models.QuerySet):
+    def with_prices(self):
+        """Добавляет суммы позиции, посчитанные в SQL (как BatchLine).
+
+        line_base_total и line_total - суммы по базовой цене и по цене
+        позиции, line_discount_percent - скидка в процентах.
+        """
+        return self.annotate(
+            line_base_total=ExpressionWrapper(
+                F("base_price") * F("quantity"), output_field=MONEY_FIELD),
+            line_total=ExpressionWrapper(
+                F("unit_price") * F("quantity"), output_field=MONEY_FIELD),
+            line_discount_percent=discount_percent_expression(
+                F("base_price"), F("unit_price")),
+        )
+
+    def reprice(self):
+        """Снимает цены позиций заново по текущим ценам и уровням.
+
+        Один UPDATE; итоги партий нужно пересчитать отдельно
+        (Batch.reprice делает и то и другое).
+        """
+        cheeses = Cheese.objects.filter(id=OuterRef("cheese_id"))
+        tiers = PriceTier.objects.for_batch(OuterRef("batch_id")).filter(
+            cheese=OuterRef("cheese_id"))
+        return self.update(**price_snapshot_expressions(cheeses, tiers))
 
 
 class BatchItem(models.Model):
@@ -106,30 +427,76 @@ class BatchItem(models.Model):
                               related_name="items")
     cheese = models.ForeignKey(Cheese, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # Снимок цен на момент добавления позиции или смены сыра или
+    # количества (см. snapshot_price): последующие изменения цен сыра
+    # на партию не влияют
+    tier_min_qty = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Оптовый уровень, от шт.")
+    base_price = models.DecimalField(max_digits=8, decimal_places=2,
+                                     verbose_name="Базовая цена")
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2,
+                                     verbose_name="Цена за единицу")
+
+    SNAPSHOT_FIELDS = ["tier_min_qty", "base_price", "unit_price"]
+
+    objects = BatchItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["batch", "cheese"],
+                         name="batchitem_batch_cheese_idx"),
+        ]
 
     def __str__(self):
         return f"{self.cheese.name} x {self.quantity}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # Сыр и количество из базы: по ним save() решает, нужен ли
+        # новый снимок цен
+        item._priced_as = (item.__dict__.get("cheese_id"),
+                           item.__dict__.get("quantity"))
+        return item
+
+    def snapshot_price(self, tier):
+        """Запоминает цены позиции; tier - уровень (от, цена) или None"""
+        self.base_price = self.cheese.price
+        self.tier_min_qty, self.unit_price = tier or (None, self.base_price)
+
+    def needs_snapshot(self):
+        """Новая позиция, другой сыр или другое количество"""
+        return self._state.adding or getattr(self, "_priced_as", None) != (
+            self.cheese_id, self.quantity)
+
+    def save(self, *args, **kwargs):
+        snapshot = self.needs_snapshot()
+        update_fields = kwargs.get("update_fields")
+        if snapshot and update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *self.SNAPSHOT_FIELDS}
+        with transaction.atomic(using=kwargs.get("using")):
+            # Цены на момент сохранения; повторное сохранение без
+            # изменений оставляет прежний снимок
+            if snapshot:
+                self.snapshot_price(
+                    PriceTier.objects.for_batch(self.batch_id).lookup(
+                        self.cheese_id, self.quantity))
+            super().save(*args, **kwargs)
+            self._priced_as = (self.cheese_id, self.quantity)
+            refresh_batch_totals(self)
+
+    def delete(self, *args, **kwargs):
+        # Итоги пересчитываются здесь, а не в post_delete: обработчик
+        # сигнала отключил бы быстрое удаление позиций вместе с партией
+        # или сыром (удаление сыра - см. signals.py)
+        with transaction.atomic(using=kwargs.get("using")):
+            deleted = super().delete(*args, **kwargs)
+            refresh_batch_totals(self)
+        return deleted
+
     @property
-    def unit_price(self):
-        qty = self.quantity
-        c = self.cheese
-        # Проверяем крупный опт первым, чтобы применить максимальную скидку
-        if (
-            c.min_qty_big_opt
-            and qty >= c.min_qty_big_opt
-            and c.price_big_opt is not None
-        ):
-            return c.price_big_opt
-        # Потом мелкий опт
-        if (
-            c.min_qty_small_opt
-            and qty >= c.min_qty_small_opt
-            and c.price_small_opt is not None
-        ):
-            return c.price_small_opt
-        # Иначе базовая цена
-        return c.price
+    def total_base_price(self):
+        return self.base_price * self.quantity
 
     @property
     def total_price(self):
@@ -137,9 +504,15 @@ class BatchItem(models.Model):
 
     @property
     def discount_percent(self):
-        base_price = self.cheese.price
-        actual_price = self.unit_price
-        if base_price == 0:
-            return 0
-        discount = (base_price - actual_price) / base_price * 100
-        return round(discount, 2)
+        return discount_percent(self.base_price, self.unit_price)
+
+
+def refresh_batch_totals(item):
+    """Пересчитывает итоги партии позиции после её изменения.
+
+    Если партия позиции уже загружена, обновляются и её поля в памяти.
+    """
+    if BatchItem.batch.is_cached(item):
+        item.batch.refresh_totals()
+    else:
+        Batch.objects.filter(id=item.batch_id).refresh_totals()
@@ -0,0 +1,184 @@
+"""Постраничный вывод по ключу (keyset / seek pagination).
+
+Вместо OFFSET страница начинается с условия "строго после последней
+показанной строки" по полям сортировки, поэтому дальние страницы
+стоят столько же, сколько первая. Последним полем сортировки должен
+быть уникальный столбец (обычно id), а все поля - NOT NULL.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+NEXT = "next"
+PREVIOUS = "prev"
+
+
+def _field_name(ordering_field):
+    return ordering_field.lstrip("-")
+
+
+def _row_value(row, field):
+    # Поддерживаются и экземпляры моделей, и словари из .values()
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+class KeysetPage:
+    """Одна страница выдачи; ведёт себя как список объектов"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page=50):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def encode_cursor(self, row, direction):
+        values = [_row_value(row, _field_name(field))
+                  for field in self.ordering]
+        payload = json.dumps({"d": direction, "v": values},
+                             default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, значения) или None для битого курсора"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            direction, raw_values = payload["d"], payload["v"]
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            return None
+        if (direction not in (NEXT, PREVIOUS)
+                or not isinstance(raw_values, list)
+                or len(raw_values) != len(self.ordering)):
+            return None
+
+        values = []
+        opts = self.queryset.model._meta
+        for field, value in zip(self.ordering, raw_values):
+            # Поля сортировки NOT NULL: null бывает только в подделанном
+            # курсоре, а name__gte=None - ошибка запроса
+            if value is None or isinstance(value, (list, dict)):
+                return None
+            try:
+                model_field = opts.get_field(_field_name(field))
+            except FieldDoesNotExist:
+                # Аннотации хранятся в курсоре как есть
+                values.append(value)
+                continue
+            try:
+                value = model_field.to_python(value)
+            except Exception:
+                return None
+            if value is None:
+                return None
+            values.append(value)
+        return direction, values
+
+    def _seek_filter(self, values, forward):
+        """Условие "строго после" (или "строго до") позиции values"""
+        condition = Q()
+        equal = Q()
+        bound = None
+        for field, value in zip(self.ordering, values):
+            name = _field_name(field)
+            descending = field.startswith("-")
+            lookup = "gt" if forward != descending else "lt"
+            if bound is None:
+                # Нестрогая граница по первому полю позволяет СУБД начать
+                # чтение индекса с нужного места, а не с начала
+                bound = Q(**{f"{name}__{lookup}e": value})
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return bound & condition
+
+    def _page_queryset(self, cursor):
+        """Запрос строк страницы (с одной лишней) и разобранный курсор"""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+
+        if decoded is None:
+            queryset = self.queryset.order_by(*self.ordering)
+        elif decoded[0] == NEXT:
+            queryset = (self.queryset
+                        .filter(self._seek_filter(decoded[1], True))
+                        .order_by(*self.ordering))
+        else:
+            # Назад идём в обратном порядке и разворачиваем результат
+            reverse_ordering = [
+                field[1:] if field.startswith("-") else "-" + field
+                for field in self.ordering
+            ]
+            queryset = (self.queryset
+                        .filter(self._seek_filter(decoded[1], False))
+                        .order_by(*reverse_ordering))
+        return queryset[:limit], decoded
+
+    def _make_page(self, rows, decoded, count):
+        if decoded is None:
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif decoded[0] == NEXT:
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            has_next, has_previous = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        if not rows:
+            # Курсор указывает за пределы выдачи
+            has_next = has_previous = False
+
+        return KeysetPage(
+            rows,
+            next_cursor=(self.encode_cursor(rows[-1], NEXT)
+                         if has_next else None),
+            previous_cursor=(self.encode_cursor(rows[0], PREVIOUS)
+                             if has_previous else None),
+            count=count,
+        )
+
+    def page(self, cursor=None, with_count=False):
+        queryset, decoded = self._page_queryset(cursor)
+        rows = list(queryset)
+        count = self.queryset.count() if with_count else None
+        return self._make_page(rows, decoded, count)
+
+    async def apage(self, cursor=None, with_count=False):
+        """То же, что page(), через асинхронный ORM"""
+        queryset, decoded = self._page_queryset(cursor)
+        rows = [row async for row in queryset]
+        count = await self.queryset.acount() if with_count else None
+        return self._make_page(rows, decoded, count)
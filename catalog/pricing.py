@@ -0,0 +1,194 @@
+"""Расчёт стоимости партий.
+
+Оптовые цены - уровни PriceTier "от N штук": общие (их задают поля
+сыра) и уровни прайс-листа партии, который важнее общего. Цена
+позиции определяется один раз - при сохранении позиции - и хранится
+в ней (BatchItem.base_price, unit_price и tier_min_qty). Дальше суммы
+считаются по этим снимкам без обращения к текущим ценам, так что
+правка сыра не меняет старые партии; пересчитать партию по новым
+ценам можно явно (Batch.reprice). Те же правила продублированы
+SQL-выражениями.
+"""
+
+from bisect import bisect_right
+from operator import itemgetter
+
+from django.db.models import (Case, DecimalField, F, OuterRef, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import Exact
+
+# Тип для денежных сумм по позициям и партиям
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+# Тип цены за единицу (как у Cheese.price)
+PRICE_FIELD = DecimalField(max_digits=8, decimal_places=2)
+
+# Поля сыра с оптовыми уровнями общего прайс-листа: (от, цена)
+LEGACY_TIER_FIELDS = [
+    ("min_qty_small_opt", "price_small_opt"),
+    ("min_qty_big_opt", "price_big_opt"),
+]
+
+
+def legacy_tiers(cheese):
+    """Оптовые уровни из полей сыра: [(от, цена)] по возрастанию "от".
+
+    Уровень без количества или без цены не действует. При одинаковом
+    количестве побеждает крупный опт (он всегда проверялся первым).
+    """
+    tiers = {}
+    for min_qty_field, price_field in LEGACY_TIER_FIELDS:
+        min_qty = getattr(cheese, min_qty_field)
+        price = getattr(cheese, price_field)
+        if min_qty and price is not None:
+            tiers[min_qty] = price
+    return sorted(tiers.items())
+
+
+def pick_tier(tiers, quantity):
+    """Уровень с наибольшим "от" не больше quantity или None.
+
+    tiers - [(от, цена)] по возрастанию "от".
+    """
+    index = bisect_right(tiers, quantity, key=itemgetter(0))
+    return tiers[index - 1] if index else None
+
+
+def merge_tiers(general, own):
+    """Уровни прайс-листа поверх общих одной возрастающей лестницей.
+
+    Уровень прайс-листа важнее общего, а ниже его первого "от"
+    действуют общие, поэтому pick_tier(merge_tiers(general, own), q)
+    равен pick_tier(own, q) or pick_tier(general, q).
+    """
+    if not own:
+        return general
+    first = own[0][0]
+    return [tier for tier in general if tier[0] < first] + own
+
+
+def resolve_unit_price(cheese, quantity, tiers=None):
+    """Цена за единицу: по уровню tiers (по умолчанию - из полей сыра)"""
+    if tiers is None:
+        tiers = legacy_tiers(cheese)
+    tier = pick_tier(tiers, quantity)
+    return tier[1] if tier else cheese.price
+
+
+def price_snapshot_expressions(cheeses, tiers):
+    """Выражения снимка цен позиций по текущим ценам для update().
+
+    cheeses - сыр позиции, например
+    Cheese.objects.filter(id=OuterRef("cheese_id")); tiers - уровни,
+    которые действуют для позиции (PriceTier.objects.for_batch(...)
+    с отбором по сыру). Уровень прайс-листа партии важнее общего,
+    среди них выбирается наибольший "от". Возвращает base_price,
+    unit_price и tier_min_qty.
+    """
+    tier = tiers.filter(min_qty__lte=OuterRef("quantity")).order_by(
+        F("price_list").asc(nulls_last=True), "-min_qty")[:1]
+    base_price = Subquery(cheeses.values("price"), output_field=PRICE_FIELD)
+    return {
+        "base_price": base_price,
+        "unit_price": Coalesce(
+            Subquery(tier.values("price"), output_field=PRICE_FIELD),
+            base_price, output_field=PRICE_FIELD),
+        "tier_min_qty": Subquery(tier.values("min_qty")),
+    }
+
+
+def discount_percent(base_price, actual_price):
+    """Скидка фактической цены относительно базовой в процентах"""
+    if base_price == 0:
+        return 0
+    discount = (base_price - actual_price) / base_price * 100
+    return round(discount, 2)
+
+
+def discount_percent_expression(base_price, actual_price):
+    """SQL-выражение discount_percent() для двух выражений-сумм"""
+    return Round(
+        Case(
+            When(Exact(base_price, 0), then=Value(0)),
+            default=(base_price - actual_price) * 100 / base_price,
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        ),
+        2,
+    )
+
+
+def batch_totals_expressions(items):
+    """Выражения сохраняемых сумм партии для update().
+
+    items - позиции одной партии, например
+    BatchItem.objects.filter(batch=OuterRef("pk")). Суммы считаются по
+    снимкам цен, без соединения с сырами. Возвращает словарь
+    total_base и total_price; скидку после них считает
+    BATCH_DISCOUNT_EXPRESSION (в одном UPDATE SQL видит старые значения
+    столбцов).
+    """
+    items = items.order_by().values("batch")
+
+    def total(price):
+        return Coalesce(
+            Subquery(items.annotate(total=Sum(F("quantity") * F(price),
+                                              output_field=MONEY_FIELD))
+                     .values("total"), output_field=MONEY_FIELD),
+            Value(0), output_field=MONEY_FIELD,
+        )
+
+    return {
+        "total_base": total("base_price"),
+        "total_price": total("unit_price"),
+    }
+
+
+BATCH_DISCOUNT_EXPRESSION = discount_percent_expression(F("total_base"),
+                                                        F("total_price"))
+
+
+class BatchLine:
+    """Позиция партии с ценами из снимка"""
+
+    def __init__(self, item):
+        self.item = item
+        self.cheese = item.cheese
+        self.quantity = item.quantity
+        self.tier_min_qty = item.tier_min_qty
+        self.base_price = item.base_price
+        self.unit_price = item.unit_price
+        self.total_base_price = self.base_price * self.quantity
+        self.total_price = self.unit_price * self.quantity
+        self.discount_percent = discount_percent(self.base_price,
+                                                 self.unit_price)
+
+
+class BatchPricing:
+    """Итоги партии, посчитанные за один проход по позициям"""
+
+    def __init__(self, items):
+        self.lines = [BatchLine(item) for item in items]
+        self.total_base_price = sum(
+            line.total_base_price for line in self.lines)
+        self.total_price = sum(line.total_price for line in self.lines)
+        self.total_discount_amount = self.total_base_price - self.total_price
+        self.total_discount_percent = discount_percent(
+            self.total_base_price, self.total_price)
+
+
+def _batch_items(batch):
+    # Сыр нужен только для названия: цены берутся из снимка позиции
+    return (batch.items.select_related("cheese")
+            .only("quantity", "tier_min_qty", "base_price", "unit_price",
+                  "batch_id", "cheese__name", "cheese__sku")
+            .order_by("id"))
+
+
+def price_batch(batch):
+    """Считает все цены партии по одному запросу к позициям"""
+    return BatchPricing(_batch_items(batch))
+
+
+async def aprice_batch(batch):
+    """price_batch() для асинхронных представлений"""
+    return BatchPricing([item async for item in _batch_items(batch)])
@@ -0,0 +1,304 @@
+"""Профилирование запросов: куда ушло время страницы.
+
+RequestProfilingMiddleware (включается REQUEST_PROFILING=1) замеряет
+каждый запрос: SQL (время и число запросов во всех базах), отрисовку
+шаблонов и собственный код представления - всё, что осталось (например,
+расчёт цен партии). Итоги уходят в заголовок Server-Timing (их
+показывают инструменты разработчика браузера) и строкой JSON в лог
+catalog.profiling.
+
+Выборочно можно снять полный профиль: доля PROFILING_SAMPLE_RATE
+запросов к страницам PROFILING_URL_NAMES профилируется cProfile или
+pyinstrument (PROFILING_BACKEND), файлы пишутся в PROFILING_DIR. При
+нулевой доле профилировщик не запускается, а маршрут запроса не
+разбирается лишний раз. В процессе одновременно профилируется не больше
+одного запроса: в Python 3.12 второй cProfile в том же интерпретаторе
+не включится, так что параллельный запрос из выборки просто
+пропускается. Под ASGI профиль cProfile включает и другие запросы того
+же цикла событий, выполнявшиеся в это время; pyinstrument
+(async_mode) их отделяет.
+
+Шаблоны замеряются подменой Template.render на время жизни процесса;
+подмена ставится, только когда middleware включён, и без активного
+замера сводится к чтению contextvar. SQL, выполненный при отрисовке
+(ленивые связи), относится к db, а не к template, так что части
+в сумме дают время представления.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.template.base import Template
+from django.urls import Resolver404, resolve
+
+try:
+    import pyinstrument
+except ImportError:  # необязателен: по умолчанию профили снимает cProfile
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILING_BACKENDS = ("cprofile", "pyinstrument")
+
+# Замер текущего запроса; None - запрос не замеряется
+_current = ContextVar("request_timings", default=None)
+
+# Занят, пока снимается профиль какого-либо запроса этого процесса
+_profiling = threading.Lock()
+
+
+class RequestTimings:
+    """Счётчики одного запроса, все времена - в секундах"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.total = 0.0
+        self._template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """execute_wrapper: время и число SQL-запросов"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db += elapsed
+            if self._template_depth:
+                # SQL из шаблона уже входит во время отрисовки
+                self.template -= elapsed
+
+    def watch_queries(self, stack):
+        """Подключает execute к соединениям текущего потока"""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self.execute))
+
+    def render(self, render, template, context):
+        # Вложенные шаблоны ({% include %}, виджеты форм) уже внутри
+        # замера внешнего
+        if self._template_depth:
+            return render(template, context)
+        self._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            self._template_depth -= 1
+            self.template += time.perf_counter() - started
+
+    @property
+    def view(self):
+        """Собственное время кода: без SQL и шаблонов"""
+        return max(self.total - self.db - self.template, 0.0)
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} SQL"',
+            f"template;dur={self.template * 1000:.1f}",
+            f"view;dur={self.view * 1000:.1f}",
+            f"total;dur={self.total * 1000:.1f}",
+        ])
+
+
+def _install_template_timer():
+    """Подменяет Template.render (один раз на процесс)"""
+    if getattr(Template.render, "profiled", False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        timings = _current.get()
+        if timings is None:
+            return original(self, context)
+        return timings.render(original, self, context)
+
+    render.profiled = True
+    Template.render = render
+
+
+class _Profile:
+    """Профиль одного запроса: cProfile (.prof) или pyinstrument (.html).
+
+    Создаётся, только когда удалось занять _profiling; save()
+    освобождает его.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.started = False
+        if backend == "pyinstrument":
+            self.profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        # Профилировщик, включённый не нами (например, отладчиком),
+        # не даёт включить второй: запрос идёт без профиля
+        try:
+            if self.backend == "pyinstrument":
+                self.profiler.start()
+            else:
+                self.profiler.enable()
+        except (ValueError, RuntimeError):
+            logger.warning("Профилировщик уже запущен, профиль не снят",
+                           exc_info=True)
+        else:
+            self.started = True
+
+    def save(self, directory, url_name):
+        try:
+            if not self.started:
+                return None
+            return self._write(directory, url_name)
+        except Exception:
+            logger.warning("Не удалось сохранить профиль", exc_info=True)
+            return None
+        finally:
+            _profiling.release()
+
+    def _write(self, directory, url_name):
+        os.makedirs(directory, exist_ok=True)
+        name = (f"{url_name}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                f"{uuid.uuid4().hex[:8]}")
+        if self.backend == "pyinstrument":
+            self.profiler.stop()
+            path = os.path.join(directory, f"{name}.html")
+            with open(path, "w", encoding="utf-8") as stream:
+                stream.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            path = os.path.join(directory, f"{name}.prof")
+            self.profiler.dump_stats(path)
+        return path
+
+
+class RequestProfilingMiddleware:
+    """Server-Timing, строка лога и выборочные профили на каждый запрос.
+
+    Ставится первым в MIDDLEWARE, чтобы в замер попали и запросы
+    сессии и пользователя.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.url_names = set(getattr(settings, "PROFILING_URL_NAMES", ()))
+        self.backend = getattr(settings, "PROFILING_BACKEND", "cprofile")
+        self.directory = getattr(settings, "PROFILING_DIR", "profiles")
+        if self.backend not in PROFILING_BACKENDS:
+            raise ImproperlyConfigured(
+                f"PROFILING_BACKEND: одно из {', '.join(PROFILING_BACKENDS)}")
+        if self.sample_rate and self.backend == "pyinstrument" and (
+                pyinstrument is None):
+            raise ImproperlyConfigured(
+                "Для PROFILING_BACKEND = 'pyinstrument' установите "
+                "pyinstrument")
+        _install_template_timer()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        profile, url_name = self.sample(request)
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                timings.watch_queries(stack)
+                if profile is not None:
+                    profile.start()
+                response = self.get_response(request)
+        finally:
+            timings.total = time.perf_counter() - started
+            _current.reset(token)
+            path = self.save(profile, url_name)
+        return self.finish(request, response, timings, path)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        profile, url_name = self.sample(request)
+        token = _current.set(timings)
+        stack = ExitStack()
+        started = time.perf_counter()
+        try:
+            # Асинхронный ORM выполняет запросы в потоке sync_to_async,
+            # у которого свои соединения (как в query_budget)
+            await sync_to_async(timings.watch_queries)(stack)
+            if profile is not None:
+                profile.start()
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            timings.total = time.perf_counter() - started
+            _current.reset(token)
+            path = self.save(profile, url_name)
+        return self.finish(request, response, timings, path)
+
+    def sample(self, request):
+        """(профиль или None, имя маршрута) для этого запроса"""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None, None
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None, None
+        if self.url_names and url_name not in self.url_names:
+            return None, None
+        # Уже профилируется другой запрос (поток или тот же цикл событий)
+        if not _profiling.acquire(blocking=False):
+            return None, None
+        try:
+            return _Profile(self.backend), url_name or "unnamed"
+        except Exception:
+            _profiling.release()
+            raise
+
+    def save(self, profile, url_name):
+        if profile is None:
+            return None
+        return profile.save(self.directory, url_name)
+
+    def finish(self, request, response, timings, profile_path):
+        header = timings.server_timing()
+        if response.has_header("Server-Timing"):
+            header = f"{response['Server-Timing']}, {header}"
+        response["Server-Timing"] = header
+
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "url_name": match.url_name if match else None,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "db_ms": round(timings.db * 1000, 2),
+            "template_ms": round(timings.template * 1000, 2),
+            "view_ms": round(timings.view * 1000, 2),
+            "total_ms": round(timings.total * 1000, 2),
+        }
+        if profile_path:
+            record["profile"] = profile_path
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
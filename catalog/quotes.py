@@ -0,0 +1,170 @@
+"""Симуляция цен: "что если" для многих сыров и количеств сразу.
+
+Базовые цены и оптовые уровни (PriceTier) загружаются двумя запросами
+в массивы NumPy: цены в копейках (int64), "от" уровней - матрица
+сыр x уровень, дополненная недостижимым порогом. Цена за единицу для
+всей сетки сыр x количество выбирается циклом по уровням (их единицы),
+а не по позициям; суммы и скидки считаются в целых копейках и
+сотых долях процента, поэтому совпадают с Decimal из pricing до
+копейки, включая банковское округление скидки.
+"""
+
+import csv
+from decimal import Decimal
+
+from .importexport import _Echo, _export_value
+from .models import Cheese, PriceTier
+
+try:
+    import numpy as np
+except ImportError:  # необязателен: без него симуляция недоступна
+    np = None
+
+QUOTES_AVAILABLE = np is not None
+
+# Порог отсутствующего уровня: больше любого количества
+NO_TIER = 2 ** 62
+
+
+def _kopecks(price):
+    return int(price * 100)
+
+
+def _round_half_even(numerator, denominator):
+    """numerator / denominator с округлением до целого, как round()"""
+    sign = np.sign(numerator)
+    quotient, remainder = np.divmod(np.abs(numerator), denominator)
+    twice = 2 * remainder
+    up = (twice > denominator) | ((twice == denominator)
+                                  & (quotient % 2 == 1))
+    return sign * (quotient + up)
+
+
+class QuoteTable:
+    """Цены сыров, загруженные в массивы для расчёта сеток.
+
+    cheeses - queryset сыров (порядок сохраняется), price_list_id -
+    прайс-лист партии или None для общих цен.
+    """
+
+    def __init__(self, cheeses=None, price_list_id=None):
+        if np is None:
+            raise RuntimeError("Для симуляции цен установите numpy")
+        if cheeses is None:
+            cheeses = Cheese.objects.order_by("id")
+        rows = list(cheeses.values_list("id", "sku", "name", "price"))
+        self.ids = [row[0] for row in rows]
+        self.skus = [row[1] for row in rows]
+        self.names = [row[2] for row in rows]
+        self.base = np.array([_kopecks(row[3]) for row in rows],
+                             dtype=np.int64)
+
+        by_cheese = PriceTier.objects.ladders(self.ids, price_list_id)
+        ladders = [[(min_qty, _kopecks(price)) for min_qty, price
+                    in by_cheese.get(cheese_id, [])]
+                   for cheese_id in self.ids]
+        width = max(map(len, ladders), default=0)
+        self.min_qty = np.full((len(ladders), width), NO_TIER,
+                               dtype=np.int64)
+        self.prices = np.zeros((len(ladders), width), dtype=np.int64)
+        for row, ladder in enumerate(ladders):
+            for column, (min_qty, price) in enumerate(ladder):
+                self.min_qty[row, column] = min_qty
+                self.prices[row, column] = price
+
+    def __len__(self):
+        return len(self.ids)
+
+    def quote(self, quantities):
+        """Считает сетку сыр x количество; возвращает Quote"""
+        quantities = np.asarray(quantities, dtype=np.int64)
+        # Уровни идут по возрастанию "от": каждый следующий, если
+        # достигнут, перекрывает предыдущий
+        unit = np.repeat(self.base[:, None], len(quantities), axis=1)
+        tier = np.full(unit.shape, -1, dtype=np.int64)
+        for column in range(self.min_qty.shape[1]):
+            reached = self.min_qty[:, column, None] <= quantities[None, :]
+            unit = np.where(reached, self.prices[:, column, None], unit)
+            tier = np.where(reached, self.min_qty[:, column, None], tier)
+        return Quote(self, quantities, unit, tier)
+
+
+class Quote:
+    """Сетка цен: строки - сыры QuoteTable, столбцы - количества.
+
+    Массивы unit, total, base_total - в копейках, discount - в сотых
+    долях процента, tier - "от" выбранного уровня (-1 - базовая цена).
+    """
+
+    def __init__(self, table, quantities, unit, tier):
+        self.table = table
+        self.quantities = quantities
+        self.unit = unit
+        self.tier = tier
+        self.total = unit * quantities[None, :]
+        self.base_total = table.base[:, None] * quantities[None, :]
+        base = np.broadcast_to(table.base[:, None], unit.shape)
+        # round((base - unit) / base * 100, 2), как discount_percent
+        self.discount = np.where(
+            base == 0, 0,
+            _round_half_even((base - unit) * 10000, np.maximum(base, 1)))
+
+    def line(self, row, column):
+        """Строка сетки: (sku, name, количество, уровень, цена,
+        сумма, скидка %); уровень None - базовая цена"""
+        table, tier = self.table, int(self.tier[row, column])
+        return (
+            table.skus[row], table.names[row],
+            int(self.quantities[column]),
+            tier if tier >= 0 else None,
+            _money(self.unit[row, column]),
+            _money(self.total[row, column]),
+            _money(self.discount[row, column]),
+        )
+
+    def lines(self):
+        """Все строки сетки: по сырам, внутри - по количествам"""
+        for row in range(len(self.table)):
+            for column in range(len(self.quantities)):
+                yield self.line(row, column)
+
+    def breakpoints(self, row):
+        """Кривая скидки сыра: строки, где меняется цена за единицу"""
+        unit = self.unit[row]
+        columns = np.flatnonzero(np.diff(unit, prepend=unit[:1] - 1))
+        return [self.line(row, column) for column in columns]
+
+
+def _money(value):
+    """Копейки (или сотые доли процента) из NumPy в Decimal"""
+    return Decimal(int(value)).scaleb(-2)
+
+
+QUOTE_FIELDS = ["sku", "cheese", "quantity", "tier_min_qty", "unit_price",
+                "total", "discount_percent"]
+
+# Сыров в одной сетке при выгрузке: в памяти одновременно несколько
+# массивов QUOTE_CHUNK x число количеств (int64)
+QUOTE_CHUNK = 1000
+
+
+def quote_chunks(cheeses, quantities, price_list_id=None, size=QUOTE_CHUNK):
+    """Сетки цен по size сыров подряд, в порядке queryset cheeses.
+
+    Сначала загружаются только id, затем каждая часть - своей
+    QuoteTable (два запроса на часть).
+    """
+    ids = list(cheeses.values_list("id", flat=True))
+    for start in range(0, len(ids), size):
+        table = QuoteTable(cheeses.filter(id__in=ids[start:start + size]),
+                           price_list_id)
+        yield table.quote(quantities)
+
+
+def export_quotes_csv(quotes):
+    """Построчно выдаёт сетки цен в CSV (для стриминга)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(QUOTE_FIELDS)
+    for quote in quotes:
+        for line in quote.lines():
+            yield writer.writerow([_export_value(value) for value in line])
@@ -0,0 +1,44 @@
+"""Чтение каталога через отдельное соединение только для чтения.
+
+settings.CATALOG_READ_DATABASE указывает псевдоним базы, из которого
+читаются сыры, типы, поисковый индекс и версия каталога. Запись всегда
+идёт в default. Внутри транзакции на default чтение тоже остаётся в
+default, иначе код не увидел бы собственных незакоммиченных изменений.
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+CATALOG_MODELS = {"cheese", "cheesetype", "cheesesearchindex",
+                  "catalogversion"}
+
+
+def _is_catalog_model(model):
+    return (model._meta.app_label == "catalog"
+            and model._meta.model_name in CATALOG_MODELS)
+
+
+class CatalogReadRouter:
+    def db_for_read(self, model, **hints):
+        alias = settings.CATALOG_READ_DATABASE
+        if alias == DEFAULT_DB_ALIAS or not _is_catalog_model(model):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные из реплики, сохраняются в основную базу
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Обе базы - один и тот же файл (или одна и та же база)
+        aliases = {DEFAULT_DB_ALIAS, settings.CATALOG_READ_DATABASE}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.CATALOG_READ_DATABASE != DEFAULT_DB_ALIAS:
+            return False
+        return None
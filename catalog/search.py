@@ -0,0 +1,170 @@
+"""Полнотекстовый поиск сыров по названию.
+
+На SQLite используется виртуальная таблица FTS5 с триграммным
+токенизатором: она находит подстроки (в том числе кириллические, без
+учёта регистра) по индексу, а не полным просмотром LIKE '%q%'.
+Индекс синхронизируется с catalog_cheese триггерами. На PostgreSQL
+тот же icontains обслуживает GIN-индекс pg_trgm по UPPER(name)
+(миграция 0014). Для запросов короче трёх символов остаётся поиск
+через icontains.
+
+Подсказки (suggest_cheeses) для коротких запросов ищут по началу
+названия, а для остальных - по тем же индексам; совпадения с начала
+названия идут первыми. На SQLite начало названия из одного-двух
+символов ищется диапазонами по cheese_name_idx - по одному на каждый
+вариант регистра (их не больше девяти). Без индекса остаётся только
+проверка начала названия у сыров, уже найденных FTS (REGEXP): она
+нужна для сортировки и не просматривает таблицу.
+"""
+
+import re
+
+from django.db import connections, models
+from django.db.models import Case, F, Lookup, Q, Value, When
+
+FTS_TABLE = "catalog_cheese_fts"
+# Триграммный токенизатор не ищет строки короче трёх символов
+MIN_FTS_QUERY_LENGTH = 3
+
+_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON catalog_cheese BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON catalog_cheese BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF name ON catalog_cheese BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+}
+
+
+class SearchTextField(models.TextField):
+    """Столбец FTS-таблицы, по которому доступен lookup match"""
+
+
+@SearchTextField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+def fts_supported(connection):
+    return connection.vendor == "sqlite"
+
+
+def install_search_index(connection, rebuild=False):
+    """Создаёт FTS-таблицу и триггеры, если их нет.
+
+    Пересоздание таблицы catalog_cheese в миграциях SQLite удаляет
+    триггеры, поэтому функция вызывается после каждого migrate и
+    перестраивает индекс, если чего-то не хватало.
+    """
+    if not fts_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [FTS_TABLE, *_TRIGGERS],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if rebuild or len(existing) < len(_TRIGGERS) + 1:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"name, content='catalog_cheese', content_rowid='id', "
+                f"tokenize='trigram')"
+            )
+            for sql in _TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            return True
+    return False
+
+
+def install_search_index_after_migrate(sender, using, **kwargs):
+    install_search_index(connections[using])
+
+
+def _match_expression(query):
+    # Весь запрос - одна фраза: кавычки внутри экранируются удвоением
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_cheeses(queryset, query):
+    """Фильтрует сыры по названию.
+
+    Возвращает (queryset, ranked). Если ranked - True, у сыров есть
+    аннотация search_rank (меньше - релевантнее) для сортировки.
+    """
+    query = query.strip()
+    connection = connections[queryset.db]
+    if len(query) < MIN_FTS_QUERY_LENGTH or not fts_supported(connection):
+        return queryset.filter(name__icontains=query), False
+
+    # Индекс присоединяется к сырам через CheeseSearchIndex, и ранг
+    # bm25 берётся из той же выборки без отдельного запроса на строку
+    queryset = queryset.filter(
+        search_index__name__match=_match_expression(query)
+    ).annotate(search_rank=F("search_index__rank"))
+    return queryset, True
+
+
+# Больше любого символа: верхняя граница диапазона названий с префиксом
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def _case_variants(query):
+    """Написания query во всех сочетаниях регистра букв"""
+    variants = [""]
+    for char in query:
+        forms = {form for form in (char, char.lower(), char.upper())
+                 if len(form) == 1}
+        variants = [variant + form for variant in variants
+                    for form in sorted(forms)]
+    return variants
+
+
+def _name_starts_with(connection, query):
+    if not fts_supported(connection):
+        return Q(name__istartswith=query)
+    # LIKE в SQLite не различает регистр только у латиницы. Короткий
+    # префикс - диапазоны name >= p AND name < p + _MAX_CHAR по индексу
+    # для каждого написания; длинный проверяется REGEXP (Python re)
+    # только среди найденных FTS сыров
+    if len(query) < MIN_FTS_QUERY_LENGTH:
+        ranges = Q()
+        for prefix in _case_variants(query):
+            ranges |= Q(name__gte=prefix, name__lt=prefix + _MAX_CHAR)
+        return ranges
+    return Q(name__iregex="^" + re.escape(query))
+
+
+def suggest_cheeses(queryset, query, limit):
+    """Первые limit сыров под подсказку для строки query"""
+    query = query.strip()
+    starts_with = _name_starts_with(connections[queryset.db], query)
+    if len(query) < MIN_FTS_QUERY_LENGTH:
+        queryset = queryset.filter(starts_with)
+    else:
+        queryset, _ = search_cheeses(queryset, query)
+    return queryset.annotate(
+        prefix_match=Case(When(starts_with, then=Value(0)),
+                          default=Value(1)),
+    ).order_by("prefix_match", "name", "id")[:limit]
@@ -0,0 +1,190 @@
+"""Заполнение базы большими объёмами тестовых данных.
+
+Все объекты создаются через bulk_create пачками, без сигналов и
+хеширования паролей, поэтому десятки тысяч строк вставляются за секунды.
+Цены позиций и итоги партий считаются здесь же, как при обычном
+добавлении: засеянная база проходит check_batch_totals. Повторный
+запуск дописывает данные, не сталкиваясь с уже засеянными именами.
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from .models import (Batch, BatchItem, Cheese, CheeseType, PriceList,
+                     PriceTier, User)
+from .pricing import discount_percent, legacy_tiers, merge_tiers, pick_tier
+
+CHEESE_NAMES = [
+    "Пармезан", "Гауда", "Чеддер", "Бри", "Камамбер", "Эдам", "Маасдам",
+    "Рокфор", "Горгонзола", "Моцарелла", "Фета", "Бринза", "Сулугуни",
+    "Российский", "Голландский", "Пошехонский", "Костромской", "Эмменталь",
+]
+CHEESE_SUFFIXES = [
+    "классический", "выдержанный", "молодой", "сливочный", "копчёный",
+    "с травами", "с орехами", "фермерский", "premium", "лёгкий",
+]
+BATCH_SIZE = 2000
+
+
+def _tier_prices(rng, price):
+    """Оптовые уровни: у части сыров их нет совсем"""
+    tiers = {}
+    if rng.random() < 0.7:
+        tiers["price_small_opt"] = (price * Decimal("0.9")).quantize(
+            Decimal("0.01"))
+        tiers["min_qty_small_opt"] = rng.choice([5, 10, 20])
+        if rng.random() < 0.6:
+            tiers["price_big_opt"] = (price * Decimal("0.8")).quantize(
+                Decimal("0.01"))
+            tiers["min_qty_big_opt"] = tiers["min_qty_small_opt"] * 5
+    return tiers
+
+
+def seed_cheese_types(count, rng, prefix="Тип"):
+    # Импорт ищет тип по названию, повтор названия он отклонит
+    start = CheeseType.objects.filter(name__startswith=f"{prefix} ").count()
+    return CheeseType.objects.bulk_create(
+        [CheeseType(name=f"{prefix} {index + 1}")
+         for index in range(start, start + count)],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def seed_cheeses(count, cheese_types, rng):
+    today = date.today()
+    cheeses = []
+    for index in range(count):
+        price = Decimal(rng.randint(5000, 300000)) / 100
+        cheeses.append(Cheese(
+            name=(f"{rng.choice(CHEESE_NAMES)} "
+                  f"{rng.choice(CHEESE_SUFFIXES)} {index + 1}"),
+            price=price,
+            weight=Decimal(rng.randint(100, 50000)) / 100,
+            cheese_type=rng.choice(cheese_types),
+            in_stock=rng.random() < 0.8,
+            production_date=today - timedelta(days=rng.randint(0, 365)),
+            **_tier_prices(rng, price),
+        ))
+    cheeses = Cheese.objects.bulk_create(cheeses, batch_size=BATCH_SIZE)
+    # Общие оптовые уровни из полей сыра (как PriceTier.sync_general,
+    # но без DELETE: сыры новые)
+    PriceTier.objects.bulk_create(
+        [PriceTier(cheese=cheese, min_qty=min_qty, price=price)
+         for cheese in cheeses
+         for min_qty, price in legacy_tiers(cheese)],
+        batch_size=BATCH_SIZE,
+    )
+    return cheeses
+
+
+def seed_price_lists(count, cheeses, rng, coverage=0.2):
+    """Прайс-листы: у доли coverage сыров - свои уровни на 10 и 100"""
+    start = PriceList.objects.filter(name__startswith="Прайс-лист ").count()
+    price_lists = PriceList.objects.bulk_create(
+        [PriceList(name=f"Прайс-лист {start + index + 1}")
+         for index in range(count)])
+    tiers = []
+    for price_list in price_lists:
+        for cheese in rng.sample(cheeses, int(len(cheeses) * coverage)):
+            for min_qty, share in ((10, "0.95"), (100, "0.85")):
+                tiers.append(PriceTier(
+                    cheese=cheese, price_list=price_list, min_qty=min_qty,
+                    price=(cheese.price * Decimal(share)).quantize(
+                        Decimal("0.01"))))
+    PriceTier.objects.bulk_create(tiers, batch_size=BATCH_SIZE)
+    return price_lists
+
+
+def seed_managers(count, rng, prefix="seed_manager"):
+    start = User.objects.filter(username__startswith=f"{prefix}_").count()
+    managers = []
+    for index in range(start, start + count):
+        manager = User(username=f"{prefix}_{index + 1}",
+                       role="sales_manager")
+        manager.set_unusable_password()
+        managers.append(manager)
+    return User.objects.bulk_create(managers, batch_size=BATCH_SIZE)
+
+
+def _line_count(rng, max_lines):
+    """Позиций в партии: чаще несколько, изредка - десятки (логнормально)"""
+    return min(max_lines, 1 + int(rng.lognormvariate(1.5, 0.8)))
+
+
+def _ladders(cheeses, price_lists):
+    """Лестницы уровней засеянных сыров: {(id прайс-листа, id сыра): ...}"""
+    general = {cheese.id: legacy_tiers(cheese) for cheese in cheeses}
+    ladders = {(None, cheese_id): tiers
+               for cheese_id, tiers in general.items()}
+    own = {}
+    for price_list_id, cheese_id, min_qty, price in (
+            PriceTier.objects.filter(price_list__in=price_lists)
+            .order_by("min_qty")
+            .values_list("price_list_id", "cheese_id", "min_qty", "price")):
+        own.setdefault((price_list_id, cheese_id), []).append(
+            (min_qty, price))
+    for (price_list_id, cheese_id), tiers in own.items():
+        ladders[price_list_id, cheese_id] = merge_tiers(
+            general.get(cheese_id, []), tiers)
+    return ladders
+
+
+def seed_batches(count, managers, cheeses, rng, max_lines=20,
+                 price_lists=()):
+    """Партии с позициями; треть партий - с прайс-листом, если есть"""
+    ladders = _ladders(cheeses, price_lists)
+    batches, lines = [], []
+    for _ in range(count):
+        price_list = (rng.choice(price_lists)
+                      if price_lists and rng.random() < 0.3 else None)
+        batch = Batch(manager=rng.choice(managers), price_list=price_list)
+        items = []
+        for cheese in rng.sample(cheeses, _line_count(rng, max_lines)):
+            item = BatchItem(cheese=cheese, quantity=rng.randint(1, 200))
+            tiers = ladders.get((batch.price_list_id, cheese.id))
+            if tiers is None:
+                tiers = ladders[None, cheese.id]
+            item.snapshot_price(pick_tier(tiers, item.quantity))
+            items.append(item)
+        # Итоги - как у Batch.refresh_totals, но без UPDATE на партию
+        batch.total_base = sum(item.quantity * item.base_price
+                               for item in items)
+        batch.total_price = sum(item.quantity * item.unit_price
+                                for item in items)
+        batch.discount_percent = discount_percent(batch.total_base,
+                                                  batch.total_price)
+        batches.append(batch)
+        lines.append(items)
+
+    batches = Batch.objects.bulk_create(batches, batch_size=BATCH_SIZE)
+    items = []
+    for batch, batch_items in zip(batches, lines):
+        for item in batch_items:
+            item.batch = batch
+            items.append(item)
+        if len(items) >= BATCH_SIZE:
+            BatchItem.objects.bulk_create(items)
+            items = []
+    BatchItem.objects.bulk_create(items)
+    return batches
+
+
+def seed_catalog(cheese_types=20, cheeses=10000, managers=10, batches=500,
+                 max_lines=20, price_lists=0, seed=0):
+    """Создаёт каталог и партии; возвращает словарь с объектами"""
+    rng = random.Random(seed)
+    types = seed_cheese_types(cheese_types, rng)
+    cheese_list = seed_cheeses(cheeses, types, rng)
+    price_list_list = seed_price_lists(price_lists, cheese_list, rng)
+    manager_list = seed_managers(managers, rng)
+    batch_list = seed_batches(batches, manager_list, cheese_list, rng,
+                              max_lines=min(max_lines, len(cheese_list)),
+                              price_lists=price_list_list)
+    return {
+        "cheese_types": types,
+        "cheeses": cheese_list,
+        "price_lists": price_list_list,
+        "managers": manager_list,
+        "batches": batch_list,
+    }
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Batch, BatchItem, CatalogVersion, Cheese, CheeseType
+
+
+# Ключи кэша списка содержат версию каталога, а страницы сыра - время
+# изменения сыра и типа (см. cache.py), так что удалять из кэша нечего
+
+
+@receiver([post_save, post_delete], sender=Cheese)
+def bump_catalog_version_on_cheese(sender, instance, **kwargs):
+    CatalogVersion.bump()
+
+
+@receiver([post_save, post_delete], sender=CheeseType)
+def bump_catalog_version_on_type(sender, instance, **kwargs):
+    CatalogVersion.bump()
+
+
+@receiver(pre_delete, sender=Cheese)
+def remember_cheese_batches(sender, instance, **kwargs):
+    # Позиции сыра удаляются каскадом одним DELETE, без сигналов;
+    # итоги их партий пересчитывает refresh_cheese_batches
+    instance._batch_ids = list(
+        BatchItem.objects.filter(cheese_id=instance.id)
+        .values_list("batch_id", flat=True).distinct())
+
+
+@receiver(post_delete, sender=Cheese)
+def refresh_cheese_batches(sender, instance, **kwargs):
+    batch_ids = getattr(instance, "_batch_ids", None)
+    if batch_ids:
+        Batch.objects.filter(id__in=batch_ids).refresh_totals()
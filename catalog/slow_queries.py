@@ -0,0 +1,242 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+SlowQueryMiddleware (включается SLOW_QUERY_LOG=путь) на время запроса
+ставит через connection.execute_wrapper обёртку на соединения всех
+баз. Запрос дольше SLOW_QUERY_THRESHOLD_MS пишется строкой JSON в лог
+catalog.slow_queries (файл SLOW_QUERY_LOG) вместе с маршрутом и
+GET-параметрами страницы, которая его выполнила, - у cheese_list
+скорость запроса зависит от сочетания q, type, in_stock и order_by.
+
+Одинаковые по форме запросы объединяет отпечаток (fingerprint): SQL,
+в котором параметры, числа, строки и списки IN заменены заглушками.
+Для SELECT снимается EXPLAIN (без ANALYZE: запрос не выполняется
+повторно) - не чаще раза в EXPLAIN_INTERVAL секунд на отпечаток
+в каждом процессе. Сводку по отпечаткам выводит
+manage.py slow_queries.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+from django.utils.http import urlencode
+
+logger = logging.getLogger(__name__)
+
+# Как часто повторять EXPLAIN одного отпечатка, секунды
+EXPLAIN_INTERVAL = 300
+
+# {отпечаток: время последнего EXPLAIN} в этом процессе
+_explained = {}
+
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUES_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+_SELECT = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """(отпечаток, нормализованный SQL) запроса"""
+    normalized = _STRING.sub("?", sql).replace("%s", "?")
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _VALUES_LIST.sub("(...)", normalized)
+    normalized = _SPACE.sub(" ", normalized).strip()
+    digest = hashlib.md5(normalized.encode()).hexdigest()[:16]
+    return digest, normalized
+
+
+def explain(connection, sql, params):
+    """Строки плана запроса или None, если план не снять.
+
+    EXPLAIN и точка сохранения выполняются курсором драйвера, мимо
+    execute_wrapper: они не попадают ни в журнал, ни в счётчики
+    query_budget.
+    """
+    ops = connection.ops
+    # Внутри транзакции ошибка EXPLAIN прервала бы её (PostgreSQL)
+    savepoint = connection.in_atomic_block
+    with connection.cursor() as wrapper:
+        cursor = wrapper.cursor
+        try:
+            if savepoint:
+                cursor.execute(ops.savepoint_create_sql(EXPLAIN_SAVEPOINT))
+            cursor.execute(f"{ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+        except connection.Database.Error:
+            if savepoint:
+                cursor.execute(
+                    ops.savepoint_rollback_sql(EXPLAIN_SAVEPOINT))
+            logger.warning("Не удалось снять EXPLAIN", exc_info=True)
+            return None
+        if savepoint:
+            cursor.execute(ops.savepoint_commit_sql(EXPLAIN_SAVEPOINT))
+    # SQLite возвращает план столбцами, PostgreSQL - строками текста
+    return [row[0] if len(row) == 1 else " ".join(map(str, row))
+            for row in rows]
+
+
+class SlowQueryRecorder:
+    """execute_wrapper одного HTTP-запроса"""
+
+    def __init__(self, request, threshold, with_plans=True):
+        self.request = request
+        self.threshold = threshold
+        self.with_plans = with_plans
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold:
+            self.record(context["connection"], sql, params, many, elapsed)
+        return result
+
+    def watch_queries(self, stack):
+        """Подключает execute к соединениям текущего потока"""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self.execute))
+
+    def record(self, connection, sql, params, many, elapsed):
+        digest, normalized = fingerprint(sql)
+        plan = None
+        if self.with_plans and not many and self._needs_plan(digest, sql):
+            plan = explain(connection, sql, params)
+
+        request = self.request
+        match = request.resolver_match
+        logger.info(json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(
+                timespec="seconds"),
+            "fingerprint": digest,
+            "duration_ms": round(elapsed * 1000, 2),
+            "database": connection.alias,
+            "url_name": match.url_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "params": dict(request.GET.items()),
+            "sql": normalized,
+            "plan": plan,
+        }, ensure_ascii=False))
+
+    def _needs_plan(self, digest, sql):
+        if not _SELECT.match(sql):
+            return False
+        now = time.monotonic()
+        if now - _explained.get(digest, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+            return False
+        _explained[digest] = now
+        return True
+
+
+class SlowQueryMiddleware:
+    """Пишет в журнал медленные SQL-запросы каждой страницы.
+
+    Ставится первым в MIDDLEWARE, чтобы в журнал попали и запросы
+    сессии и пользователя.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.with_plans = settings.SLOW_QUERY_EXPLAIN
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = SlowQueryRecorder(request, self.threshold,
+                                     self.with_plans)
+        with ExitStack() as stack:
+            recorder.watch_queries(stack)
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        recorder = SlowQueryRecorder(request, self.threshold,
+                                     self.with_plans)
+        stack = ExitStack()
+        # Асинхронный ORM выполняет запросы в потоке sync_to_async,
+        # у которого свои соединения (как в query_budget)
+        await sync_to_async(recorder.watch_queries)(stack)
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+
+
+def read_log(stream):
+    """Записи журнала из файла; (записи, число испорченных строк)"""
+    records, broken = [], 0
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            broken += 1
+    return records, broken
+
+
+def summarize(records, url_name=None):
+    """Сводка по отпечаткам, самые затратные по общему времени сверху.
+
+    Для каждого отпечатка: число запросов, общее, среднее и наибольшее
+    время (мс), страницы, которые его выполняли, самая медленная запись
+    (с её параметрами) и план самой медленной записи, у которой он есть:
+    EXPLAIN снимается не для каждой.
+    """
+    groups = {}
+    for record in records:
+        if url_name is not None and record.get("url_name") != url_name:
+            continue
+        group = groups.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"],
+            "sql": record["sql"],
+            "count": 0,
+            "total_ms": 0.0,
+            "url_names": Counter(),
+            "slowest": record,
+            "planned": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += record["duration_ms"]
+        group["url_names"][record.get("url_name")] += 1
+        if record["duration_ms"] > group["slowest"]["duration_ms"]:
+            group["slowest"] = record
+        planned = group["planned"]
+        if record.get("plan") and (
+                planned is None
+                or record["duration_ms"] > planned["duration_ms"]):
+            group["planned"] = record
+    summary = []
+    for group in groups.values():
+        planned = group.pop("planned")
+        group["plan"] = planned["plan"] if planned else None
+        group["mean_ms"] = group["total_ms"] / group["count"]
+        group["max_ms"] = group["slowest"]["duration_ms"]
+        summary.append(group)
+    summary.sort(key=lambda group: (-group["total_ms"], group["fingerprint"]))
+    return summary
+
+
+def request_url(record):
+    """Адрес страницы из записи журнала, с GET-параметрами"""
+    if record.get("params"):
+        return f"{record['path']}?{urlencode(record['params'])}"
+    return record["path"]
@@ -0,0 +1,67 @@
+"""Допустимые сортировки каталога.
+
+Параметр order_by принимает только ключи из реестра. Каждому ключу
+соответствует сортировка с id на конце, под которую есть индекс у
+Cheese (это проверяет check_catalog_sorts). Незнакомые значения
+заменяются сортировкой по умолчанию, а не передаются в ORM.
+"""
+
+from django.core import checks
+
+
+class SortOption:
+    def __init__(self, key, label, ordering):
+        self.key = key
+        self.label = label
+        self.ordering = ordering
+
+
+CATALOG_SORT_OPTIONS = [
+    SortOption("name", "По имени", ("name", "id")),
+    SortOption("-name", "По имени, с конца", ("-name", "-id")),
+    SortOption("price", "По цене", ("price", "id")),
+    SortOption("-price", "Сначала дорогие", ("-price", "-id")),
+    SortOption("weight", "По весу", ("weight", "id")),
+    SortOption("-weight", "Сначала тяжёлые", ("-weight", "-id")),
+    SortOption("production_date", "Сначала старые",
+               ("production_date", "id")),
+    SortOption("-production_date", "Сначала свежие",
+               ("-production_date", "-id")),
+]
+CATALOG_SORTS = {option.key: option for option in CATALOG_SORT_OPTIONS}
+
+DEFAULT_SORT = CATALOG_SORTS["name"]
+# Доступна только при полнотекстовом поиске (см. search.py)
+RELEVANCE_SORT = SortOption("", "По релевантности", ("search_rank", "id"))
+
+
+def resolve_sort(key, ranked=False):
+    """Возвращает SortOption по ключу из запроса.
+
+    Пустой или незнакомый ключ даёт сортировку по умолчанию:
+    по релевантности при поиске, иначе по имени.
+    """
+    option = CATALOG_SORTS.get(key)
+    if option is None:
+        return RELEVANCE_SORT if ranked else DEFAULT_SORT
+    return option
+
+
+@checks.register(checks.Tags.models)
+def check_catalog_sorts(app_configs, **kwargs):
+    """Каждая сортировка каталога должна опираться на индекс Cheese"""
+    from .models import Cheese
+
+    indexed = [tuple(index.fields) for index in Cheese._meta.indexes]
+    errors = []
+    for option in CATALOG_SORT_OPTIONS:
+        fields = tuple(field.lstrip("-") for field in option.ordering)
+        # Подходит индекс (поля сортировки) или (фильтр, поля сортировки)
+        if not any(index[-len(fields):] == fields for index in indexed):
+            errors.append(checks.Error(
+                f"Для сортировки каталога {option.key!r} нет индекса "
+                f"по полям {fields}",
+                obj=Cheese,
+                id="catalog.E001",
+            ))
+    return errors
@@ -1,41 +1,85 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, metrics, views
 from django.contrib.auth import views as auth_views
 
-urlpatterns = [
-    path("", views.cheese_list, name="cheese_list"),
-    path("cheese/<int:cheese_id>/", views.cheese_detail, name="cheese_detail"),
-    path("cheese/add/", views.cheese_create, name="cheese_create"),
-    path("cheese/<int:cheese_id>/edit/",
-         views.cheese_edit, name="cheese_edit"),
-    path("cheese/<int:cheese_id>/delete/",
-         views.cheese_delete, name="cheese_delete"),
-    path("about/", views.about, name="about"),
-    path(
-        "accounts/login/",
-        auth_views.LoginView.as_view(template_name="catalog/login.html"),
-        name="login",
-    ),
-    path(
-        "accounts/logout/",
-        auth_views.LogoutView.as_view(next_page="/"), name="logout"
-    ),
-    path("batches/", views.batch_list, name="batch_list"),
-    path("batches/create/", views.batch_create, name="batch_create"),
-    path("batches/<int:batch_id>/", views.batch_detail, name="batch_detail"),
-    path(
-        "batches/<int:batch_id>/add_item/",
-        views.batch_add_item, name="batch_add_item"
-    ),
-    path(
-        "batch_item/<int:item_id>/edit/",
-        views.batch_item_edit, name="batch_item_edit"
-    ),
-    path(
-        "batch_item/<int:item_id>/delete/",
-        views.batch_item_delete,
-        name="batch_item_delete",
-    ),
-    path("batches/<int:batch_id>/delete/",
-         views.batch_delete, name="batch_delete"),
-]
+
+def catalog_urlpatterns(read_views):
+    """Маршруты приложения.
+
+    read_views - модуль с cheese_list, cheese_detail, batch_list и
+    batch_detail: views (WSGI) или async_views (ASGI).
+    """
+    return [
+        path("", read_views.cheese_list, name="cheese_list"),
+        path("cheese/<int:cheese_id>/", read_views.cheese_detail,
+             name="cheese_detail"),
+        path("cheese/add/", views.cheese_create, name="cheese_create"),
+        path("cheese/import/", views.cheese_import, name="cheese_import"),
+        path("cheese/export/", views.cheese_export, name="cheese_export"),
+        path("cheese/<int:cheese_id>/edit/",
+             views.cheese_edit, name="cheese_edit"),
+        path("cheese/<int:cheese_id>/delete/",
+             views.cheese_delete, name="cheese_delete"),
+        path("about/", views.about, name="about"),
+        path(
+            "accounts/login/",
+            auth_views.LoginView.as_view(template_name="catalog/login.html"),
+            name="login",
+        ),
+        path(
+            "accounts/logout/",
+            auth_views.LogoutView.as_view(next_page="/"), name="logout"
+        ),
+        path("batches/", read_views.batch_list, name="batch_list"),
+        path("batches/create/", views.batch_create, name="batch_create"),
+        path("batches/export/", views.batch_export, name="batch_export"),
+        path("batches/quotes/", views.quote_simulation,
+             name="quote_simulation"),
+        path("batches/<int:batch_id>/", read_views.batch_detail,
+             name="batch_detail"),
+        path("batches/<int:batch_id>/bulk/", views.batch_bulk_edit,
+             name="batch_bulk_edit"),
+        path("batches/<int:batch_id>/export/", views.batch_export_one,
+             name="batch_export_one"),
+        path("batches/<int:batch_id>/reprice/", views.batch_reprice,
+             name="batch_reprice"),
+        path(
+            "batches/<int:batch_id>/add_item/",
+            views.batch_add_item, name="batch_add_item"
+        ),
+        path(
+            "batch_item/<int:item_id>/edit/",
+            views.batch_item_edit, name="batch_item_edit"
+        ),
+        path(
+            "batch_item/<int:item_id>/delete/",
+            views.batch_item_delete,
+            name="batch_item_delete",
+        ),
+        path("batches/<int:batch_id>/delete/",
+             views.batch_delete, name="batch_delete"),
+        # JSON API (catalog.api)
+        path("api/cheeses/", api.cheeses, name="api_cheeses"),
+        path("api/cheeses/suggest/", api.cheese_suggestions,
+             name="api_cheese_suggestions"),
+        path("api/cheeses/<int:cheese_id>/", api.cheese_detail,
+             name="api_cheese_detail"),
+        path("api/cheese-types/", api.cheese_types,
+             name="api_cheese_types"),
+        path("api/batches/", api.batches, name="api_batches"),
+        path("api/batches/<int:batch_id>/", api.batch_detail,
+             name="api_batch_detail"),
+        path("api/batches/<int:batch_id>/items/", api.batch_items,
+             name="api_batch_items"),
+        path("api/batches/<int:batch_id>/reprice/", api.batch_reprice,
+             name="api_batch_reprice"),
+        path("api/batch-items/<int:item_id>/", api.batch_item_detail,
+             name="api_batch_item_detail"),
+        # Для Prometheus (catalog.metrics)
+        path("metrics", metrics.metrics_view, name="metrics"),
+    ]
+
+
+urlpatterns = catalog_urlpatterns(
+    async_views if settings.CATALOG_ASYNC_VIEWS else views)
@@ -1,19 +1,49 @@
+import io
+import tempfile
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponseBadRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.exceptions import PermissionDenied
-
-from .decorators import role_required
+from django.views.decorators.http import condition, require_POST
+
+from .cache import (about_key, cache_anonymous_page, catalog_list_key,
+                    cheese_detail_key)
+from .conditional import (catalog_list_etag, catalog_list_last_modified,
+                          cheese_detail_etag, cheese_detail_last_modified)
+from .decorators import query_budget, role_required
+from .filters import catalog_link_params, catalog_list_params
 from .models import Cheese, CheeseType, Batch, BatchItem
-from .forms import CheeseForm, BatchItemForm
+from .batch_items import update_batch_items
+from .forms import (CheeseForm, BatchItemForm, BatchExportForm,
+                    BatchItemLinesForm, BatchLineFormSet,
+                    CheeseImportUploadForm, QuoteForm)
+from .importexport import (BATCH_FORMATS, batch_lines, detect_format,
+                           export_batches_csv, export_cheeses,
+                           import_cheeses, write_batches_xlsx)
+from .pagination import KeysetPaginator
+from .search import search_cheeses
+from .sorting import CATALOG_SORT_OPTIONS, resolve_sort
+from .pricing import price_batch
+from .quotes import (QUOTES_AVAILABLE, QuoteTable, export_quotes_csv,
+                     quote_chunks)
 
 
 # Детальное описание сыра
+@condition(etag_func=cheese_detail_etag,
+           last_modified_func=cheese_detail_last_modified)
+@cache_anonymous_page(cheese_detail_key)
+@query_budget(3)
 def cheese_detail(request, cheese_id):
-    cheese = get_object_or_404(Cheese, id=cheese_id)
+    cheese = get_object_or_404(Cheese.objects.select_related("cheese_type"),
+                               id=cheese_id)
     return render(request, "catalog/cheese_detail.html", {"cheese": cheese})
 
 
 # Страница "О сервисе"
+@cache_anonymous_page(about_key)
 def about(request):
     return render(request, "catalog/about.html")
 
@@ -56,63 +86,201 @@ def cheese_delete(request, cheese_id):
                   "catalog/cheese_confirm_delete.html", {"cheese": cheese})
 
 
-def cheese_list(request):
-    query = request.GET.get("q", "")  # Поиск по названию сыра
-    cheese_type_id = request.GET.get("type")  # Фильтрация по типу сыра
-    in_stock = request.GET.get("in_stock")  # Фильтрация по наличию
-    order_by = request.GET.get("order_by",
-                               "name")  # Сортировка по умолчанию (по имени)
+@role_required(["admin"])
+def cheese_import(request):
+    result = None
+    if request.method == "POST":
+        form = CheeseImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            # Файл читается построчно, целиком в память не загружается
+            stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig",
+                                      newline="")
+            result = import_cheeses(
+                stream, detect_format(upload.name),
+                create_types=form.cleaned_data["create_types"],
+            )
+    else:
+        form = CheeseImportUploadForm()
+
+    return render(request, "catalog/cheese_import.html",
+                  {"form": form, "result": result})
+
+
+@role_required(["admin", "product_manager"])
+def cheese_export(request):
+    file_format = "jsonl" if request.GET.get("format") == "jsonl" else "csv"
+    content_type = ("text/csv" if file_format == "csv"
+                    else "application/x-ndjson")
+    response = StreamingHttpResponse(
+        export_cheeses(file_format),
+        content_type=f"{content_type}; charset=utf-8",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="cheeses.{file_format}"')
+    return response
+
 
-    cheeses = Cheese.objects.all()
+@condition(etag_func=catalog_list_etag,
+           last_modified_func=catalog_list_last_modified)
+@cache_anonymous_page(catalog_list_key)
+@query_budget(5)
+def cheese_list(request):
+    params = catalog_list_params(request.GET)
+    query = params["q"]  # Поиск по названию сыра
+    cheese_type_id = params["type"]  # Фильтрация по типу сыра
+    in_stock = params["in_stock"]  # Фильтрация по наличию
+    # Сортировка: только ключи из реестра (catalog.sorting)
+    order_by = params["order_by"]
+
+    cheeses = Cheese.objects.select_related("cheese_type")
     cheese_types = CheeseType.objects.all()
 
+    ranked = False
     if query:
-        cheeses = cheeses.filter(name__icontains=query)
+        cheeses, ranked = search_cheeses(cheeses, query)
 
     if cheese_type_id:
         cheeses = cheeses.filter(cheese_type_id=cheese_type_id)
 
-    if in_stock is not None:
-        if in_stock == "true":
-            cheeses = cheeses.filter(in_stock=True)
-        elif in_stock == "false":
-            cheeses = cheeses.filter(in_stock=False)
+    if in_stock == "true":
+        cheeses = cheeses.filter(in_stock=True)
+    elif in_stock == "false":
+        cheeses = cheeses.filter(in_stock=False)
 
-    cheeses = cheeses.order_by(order_by)
+    sort = resolve_sort(order_by, ranked)
+
+    # Постраничный вывод по ключу: поле сортировки + id для устойчивости
+    paginator = KeysetPaginator(cheeses, sort.ordering,
+                                per_page=settings.CATALOG_PAGE_SIZE)
+    # Общее количество (COUNT(*)) считаем только по запросу
+    page = paginator.page(params["cursor"], with_count=params["count"])
 
     return render(
         request,
         "catalog/home.html",
         {
-            "cheeses": cheeses,
+            "cheeses": page,
+            "page": page,
             "cheese_types": cheese_types,
             "selected_type": cheese_type_id,
-            "order_by": order_by,
+            "order_by": sort.key,
+            "sort_options": CATALOG_SORT_OPTIONS,
             "query": query,
             "in_stock": in_stock,
+            "link_params": catalog_link_params(params),
         },
     )
 
 
 @login_required
+@query_budget(1)
 def batch_list(request):
-    batches = (Batch.objects.filter(manager=request.user).
-               order_by("-created_at"))
+    # Суммы и скидки хранятся в самих партиях
+    batches = (Batch.objects.filter(manager=request.user)
+               .select_related("manager")
+               .order_by("-created_at"))
     return render(request, "catalog/batch_list.html",
                   {"batches": batches})
 
 
 @login_required
+@query_budget(2)
 def batch_detail(request, batch_id):
-    batch = get_object_or_404(Batch, id=batch_id)
-    if batch.manager != request.user and request.user.role != "admin":
+    batch = get_object_or_404(
+        Batch.objects.select_related("manager", "price_list"), id=batch_id)
+    if batch.manager_id != request.user.id and request.user.role != "admin":
         raise PermissionDenied("Вы не можете просматривать чужие партии")
-    items = batch.items.select_related("cheese")
+    # Все цены и итоги партии считаются за один запрос к позициям
+    pricing = price_batch(batch)
     return render(
-        request, "catalog/batch_detail.html", {"batch": batch, "items": items}
+        request, "catalog/batch_detail.html",
+        {"batch": batch, "pricing": pricing}
     )
 
 
+def _batch_export_response(file_format, filename, **filters):
+    lines = batch_lines(**filters)
+    if file_format == "xlsx":
+        # Книга собирается во временном файле на диске и отдаётся
+        # кусками; FileResponse закроет (и тем удалит) его сам
+        stream = tempfile.TemporaryFile()
+        write_batches_xlsx(lines, stream)
+        stream.seek(0)
+        return FileResponse(stream, as_attachment=True,
+                            filename=f"{filename}.xlsx")
+    response = StreamingHttpResponse(export_batches_csv(lines),
+                                     content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.csv"')
+    return response
+
+
+@role_required(["admin"])
+def batch_export(request):
+    """Позиции всех партий за период - для бухгалтерии"""
+    form = BatchExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    file_format = form.cleaned_data["format"] or "csv"
+    if file_format not in BATCH_FORMATS:
+        return HttpResponseBadRequest(f"Формат {file_format} недоступен")
+    start, end = form.cleaned_data["start"], form.cleaned_data["end"]
+    filename = "batches"
+    if start or end:
+        filename += f"_{start or ''}_{end or ''}"
+    return _batch_export_response(file_format, filename,
+                                  start=start, end=end)
+
+
+@login_required
+def batch_export_one(request, batch_id):
+    batch = get_object_or_404(Batch, id=batch_id)
+    if batch.manager_id != request.user.id and request.user.role != "admin":
+        raise PermissionDenied("Вы не можете выгружать чужие партии")
+    file_format = request.GET.get("format") or "csv"
+    if file_format not in BATCH_FORMATS:
+        return HttpResponseBadRequest(f"Формат {file_format} недоступен")
+    return _batch_export_response(file_format, f"batch_{batch.id}",
+                                  batch_id=batch.id)
+
+
+# На странице - кривые скидок первых сыров, в CSV - весь выбор
+QUOTE_PAGE_CHEESES = 50
+
+
+@role_required(["admin", "sales_manager"])
+def quote_simulation(request):
+    """Цены "что если": каждый сыр при количествах 1..N"""
+    if not QUOTES_AVAILABLE:
+        return HttpResponseBadRequest("Для симуляции цен установите numpy")
+    form = QuoteForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, "catalog/quote_simulation.html",
+                      {"form": form, "limit": QUOTE_PAGE_CHEESES})
+    cheeses = Cheese.objects.order_by("name", "id")
+    if form.cleaned_data["cheese_type"]:
+        cheeses = cheeses.filter(cheese_type=form.cleaned_data["cheese_type"])
+    price_list = form.cleaned_data["price_list"]
+    price_list_id = price_list.id if price_list else None
+
+    if form.cleaned_data["format"] == "csv":
+        # Весь выбор частями по QUOTE_CHUNK сыров: иначе память -
+        # весь каталог x количества
+        quotes = quote_chunks(cheeses, form.quantities(), price_list_id)
+        response = StreamingHttpResponse(
+            export_quotes_csv(quotes), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="quotes.csv"'
+        return response
+
+    quote = QuoteTable(cheeses[:QUOTE_PAGE_CHEESES],
+                       price_list_id).quote(form.quantities())
+    curves = [quote.breakpoints(row) for row in range(len(quote.table))]
+    return render(request, "catalog/quote_simulation.html",
+                  {"form": form, "curves": curves,
+                   "limit": QUOTE_PAGE_CHEESES})
+
+
 @login_required
 def batch_create(request):
     batch = Batch.objects.create(manager=request.user)
@@ -122,24 +290,67 @@ def batch_create(request):
 @login_required
 def batch_add_item(request, batch_id):
     batch = get_object_or_404(Batch, id=batch_id)
-    if batch.manager != request.user and request.user.role != "admin":
+    if batch.manager_id != request.user.id and request.user.role != "admin":
         raise PermissionDenied("Вы не можете изменять чужие партии")
 
     if request.method == "POST":
-        form = BatchItemForm(request.POST)
+        form = BatchItemForm(request.POST, batch=batch)
         if form.is_valid():
-            item = form.save(commit=False)
-            item.batch = batch
-            item.save()
+            # Повторно добавленный сыр увеличивает количество позиции
+            update_batch_items(batch, added={
+                form.cleaned_data["cheese"].id:
+                    form.cleaned_data["quantity"]})
             return redirect("batch_detail", batch_id=batch.id)
     else:
-        form = BatchItemForm()
+        form = BatchItemForm(batch=batch)
 
     return render(
         request, "catalog/batch_add_item.html", {"form": form, "batch": batch}
     )
 
 
+@login_required
+def batch_bulk_edit(request, batch_id):
+    """Правка всех позиций партии и вставка списка за один запрос"""
+    batch = get_object_or_404(Batch, id=batch_id)
+    if batch.manager_id != request.user.id and request.user.role != "admin":
+        raise PermissionDenied("Вы не можете изменять чужие партии")
+
+    items = {item.id: item for item in
+             batch.items.select_related("cheese").order_by("id")}
+    initial = [{"item": item.id, "quantity": item.quantity}
+               for item in items.values()]
+    if request.method == "POST":
+        formset = BatchLineFormSet(request.POST, initial=initial,
+                                   items=items, prefix="lines")
+        lines_form = BatchItemLinesForm(request.POST)
+        if formset.is_valid() and lines_form.is_valid():
+            quantities, deleted = formset.changes()
+            update_batch_items(batch, added=lines_form.quantities,
+                               quantities=quantities, deleted=deleted)
+            return redirect("batch_detail", batch_id=batch.id)
+    else:
+        formset = BatchLineFormSet(initial=initial, items=items,
+                                   prefix="lines")
+        lines_form = BatchItemLinesForm()
+
+    return render(
+        request, "catalog/batch_bulk_edit.html",
+        {"batch": batch, "formset": formset, "lines_form": lines_form},
+    )
+
+
+@login_required
+@require_POST
+def batch_reprice(request, batch_id):
+    """Пересчитывает позиции партии по текущим ценам сыров"""
+    batch = get_object_or_404(Batch, id=batch_id)
+    if batch.manager_id != request.user.id and request.user.role != "admin":
+        raise PermissionDenied("Вы не можете изменять чужие партии")
+    batch.reprice()
+    return redirect("batch_detail", batch_id=batch.id)
+
+
 @login_required
 def batch_item_edit(request, item_id):
     item = get_object_or_404(BatchItem, id=item_id)
@@ -149,12 +360,22 @@ def batch_item_edit(request, item_id):
         raise PermissionDenied("Нет прав на редактирование этого товара")
 
     if request.method == "POST":
-        form = BatchItemForm(request.POST, instance=item)
+        cheese_id = item.cheese_id
+        form = BatchItemForm(request.POST, instance=item, batch=batch)
         if form.is_valid():
-            form.save()
+            cheese = form.cleaned_data["cheese"]
+            quantity = form.cleaned_data["quantity"]
+            if cheese.id == cheese_id:
+                update_batch_items(batch, quantities={item.id: quantity})
+            else:
+                # Другой сыр - как удаление позиции и добавление сыра:
+                # если он уже есть в партии, количество прибавляется
+                # к его позиции, а не создаётся вторая
+                update_batch_items(batch, added={cheese.id: quantity},
+                                   deleted=[item.id])
             return redirect("batch_detail", batch_id=batch.id)
     else:
-        form = BatchItemForm(instance=item)
+        form = BatchItemForm(instance=item, batch=batch)
 
     return render(
         request,
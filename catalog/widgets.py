@@ -0,0 +1,35 @@
+"""Виджеты форм каталога"""
+
+from django import forms
+from django.urls import reverse
+
+from .models import Cheese
+
+
+class CheeseAutocomplete(forms.Widget):
+    """Выбор сыра с подсказками вместо <select> всего каталога.
+
+    На страницу попадает только выбранный сыр: его id в скрытом поле и
+    название для показа. Варианты по мере ввода подгружает скрипт из
+    api_cheese_suggestions; batch_id - партия, чей прайс-лист
+    показывается в подсказках. Поле формы проверяет только присланный
+    id (один запрос).
+    """
+    template_name = "catalog/widgets/cheese_autocomplete.html"
+
+    def __init__(self, attrs=None, batch_id=None):
+        super().__init__(attrs)
+        self.batch_id = batch_id
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ""
+        if value is not None and str(value).isdigit():
+            label = Cheese.objects.filter(id=value).values_list(
+                "name", flat=True).first() or ""
+        context["widget"].update({
+            "label": label,
+            "url": reverse("api_cheese_suggestions"),
+            "batch_id": self.batch_id,
+        })
+        return context
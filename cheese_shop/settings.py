@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,6 +22,16 @@ AUTH_USER_MODEL = "catalog.User"
 LOGIN_REDIRECT_URL = "/"  # куда перенаправлять после логина
 LOGOUT_REDIRECT_URL = "/"  # куда перенаправлять после логаута
 
+CATALOG_PAGE_SIZE = 50  # сыров на одной странице каталога
+
+# Превышение бюджета запросов (catalog.decorators.query_budget):
+# False - предупреждение в лог, True - исключение
+QUERY_BUDGET_STRICT = False
+
+# Асинхронные страницы каталога и партий (catalog.async_views) для
+# запуска под ASGI-сервером; под WSGI выгоднее синхронные
+CATALOG_ASYNC_VIEWS = os.environ.get("CATALOG_ASYNC_VIEWS") == "1"
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -54,6 +67,62 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Метрики Prometheus (catalog.metrics): страница /metrics и запись
+# времени, кодов ответа и SQL на каждый запрос; нужен prometheus_client.
+# Под gunicorn с несколькими воркерами задайте PROMETHEUS_MULTIPROC_DIR
+# (каталог для счётчиков всех воркеров, см. gunicorn.conf.py).
+PROMETHEUS_METRICS = os.environ.get("PROMETHEUS_METRICS") == "1"
+if PROMETHEUS_METRICS:
+    MIDDLEWARE.insert(0, "catalog.metrics.MetricsMiddleware")
+
+# Профилирование запросов (catalog.profiling): Server-Timing и строка
+# лога catalog.profiling на каждый запрос. Доля PROFILING_SAMPLE_RATE
+# запросов к страницам PROFILING_URL_NAMES (через запятую; пусто - ко
+# всем) профилируется целиком, файлы - в PROFILING_DIR.
+REQUEST_PROFILING = os.environ.get("REQUEST_PROFILING") == "1"
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, "catalog.profiling.RequestProfilingMiddleware")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_URL_NAMES = [
+    name for name in os.environ.get("PROFILING_URL_NAMES", "").split(",")
+    if name
+]
+# cprofile (.prof, открывается snakeviz или pstats) или pyinstrument
+# (.html, нужен пакет pyinstrument)
+PROFILING_BACKEND = os.environ.get("PROFILING_BACKEND", "cprofile")
+PROFILING_DIR = os.environ.get("PROFILING_DIR", BASE_DIR / "profiles")
+
+# Журнал медленных SQL (catalog.slow_queries): запросы дольше
+# SLOW_QUERY_THRESHOLD_MS мс пишутся строками JSON с маршрутом,
+# GET-параметрами и EXPLAIN в файл SLOW_QUERY_LOG; сводка по нему -
+# manage.py slow_queries. SLOW_QUERY_EXPLAIN=0 отключает EXPLAIN.
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "")
+if SLOW_QUERY_LOG:
+    MIDDLEWARE.insert(0, "catalog.slow_queries.SlowQueryMiddleware")
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "1") == "1"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "catalog.profiling": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+if SLOW_QUERY_LOG:
+    LOGGING["handlers"]["slow_queries"] = {
+        "class": "logging.FileHandler",
+        "filename": SLOW_QUERY_LOG,
+        "encoding": "utf-8",
+        "delay": True,
+    }
+    LOGGING["loggers"]["catalog.slow_queries"] = {
+        "handlers": ["slow_queries"], "level": "INFO", "propagate": False}
+
 ROOT_URLCONF = "cheese_shop.urls"
 
 TEMPLATES = [
@@ -78,12 +147,122 @@ WSGI_APPLICATION = "cheese_shop.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgres включает PostgreSQL с параметрами из POSTGRES_*;
+# по умолчанию используется файл SQLite db.sqlite3.
+#   DB_CONN_MAX_AGE - сколько секунд держать соединение (0 - закрывать
+#       после каждого запроса);
+#   DB_POOL=1 - пул соединений psycopg внутри процесса (DB_POOL_MIN_SIZE,
+#       DB_POOL_MAX_SIZE); несовместим с DB_CONN_MAX_AGE > 0;
+#   DB_PGBOUNCER=1 - подключение через PgBouncer в режиме transaction,
+#       серверные курсоры при этом отключаются.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "cheese_shop"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS":
+                os.environ.get("DB_PGBOUNCER") == "1",
+            "OPTIONS": {},
+        }
     }
-}
+    if os.environ.get("DB_POOL") == "1":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        }
+    # Отдельной реплики для чтения нет: каталог читает из default
+    CATALOG_READ_DATABASE = "default"
+elif DB_ENGINE == "sqlite":
+    # PRAGMA выполняются при открытии каждого соединения (init_command).
+    # WAL позволяет читателям не ждать писателя; SQLITE_TUNING=0
+    # возвращает настройки SQLite по умолчанию.
+    if os.environ.get("SQLITE_TUNING", "1") == "1":
+        SQLITE_PRAGMAS = {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")),
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # в КиБ, т.е. 64 МиБ
+            "temp_store": "MEMORY",
+        }
+    else:
+        SQLITE_PRAGMAS = {}
+    SQLITE_INIT_COMMAND = ";".join(
+        f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+    )
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "init_command": SQLITE_INIT_COMMAND,
+                # Писатель берёт блокировку сразу в BEGIN, а не при первой
+                # записи, поэтому busy_timeout срабатывает и не даёт
+                # "database is locked" посреди транзакции
+                "transaction_mode": "IMMEDIATE",
+            },
+        },
+        # Тот же файл, но только для чтения: страницы каталога
+        # (см. catalog.routers)
+        "catalog_ro": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "init_command": ";".join(
+                    filter(None, [SQLITE_INIT_COMMAND, "PRAGMA query_only=ON"])
+                ),
+            },
+            "TEST": {"MIRROR": "default"},
+        },
+    }
+    CATALOG_READ_DATABASE = "catalog_ro"
+else:
+    raise ImproperlyConfigured(
+        f"Неизвестный DB_ENGINE={DB_ENGINE!r}: ожидается sqlite или postgres"
+    )
+
+DATABASE_ROUTERS = ["catalog.routers.CatalogReadRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# По умолчанию кэш в памяти процесса; CACHE_DIR включает файловый кэш,
+# общий для всех воркеров, а REDIS_URL - Redis (нужен пакет redis).
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+elif os.environ.get("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ["CACHE_DIR"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Сколько секунд хранить страницы каталога для анонимных посетителей
+CATALOG_CACHE_TIMEOUT = 300
 
 
 # Password validation
@@ -0,0 +1,24 @@
+"""Настройки gunicorn; файл читается из рабочего каталога (/app) сам.
+
+Нужен для метрик Prometheus с несколькими воркерами (catalog.metrics):
+счётчики воркеров лежат в PROMETHEUS_MULTIPROC_DIR, и файлы прошлого
+запуска нужно удалить до старта воркеров, иначе они сложатся с новыми.
+"""
+
+import glob
+import os
+
+
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)